@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Paper 3 - Public Release Bundle
+
+Reads:
+- data/, protocol/, output/synthesis/, figures/, manuscript/   (bundle content, see BUNDLE_DIRS)
+- README.md, DATA_DICTIONARY.md, CITATION.cff, .zenodo.json    (record metadata)
+
+Writes:
+- dist/paper3_public_bundle.zip   (default; override with --out)
+  - every bundled file (identical files stored once; later copies are relative symlink entries)
+  - SHA256SUMS                    sha256sum-format checksums of every bundled path
+  - bundle_manifest.json          per path: sha256, bytes, stored path (duplicates point to the
+                                  stored copy), stripped fields
+
+One streaming pass: each file is read once, local-only CSV columns (`pdf_path`) are dropped,
+and the member is hashed (SHA-256 + CRC-32) and deflated in a worker thread (zlib releases the
+GIL). Members are written in sorted path order as their workers finish, with a bounded number
+in flight. Files whose bytes match an earlier member (e.g. figures/FigureN.png and
+output/synthesis/S001_figN_*.png) are stored only once: the later path is written as a ZIP
+symlink entry pointing at the stored copy, so `unzip`/`bsdtar` restore every path the reports
+cite. Members that deflate no smaller are stored raw, re-read from disk rather than kept in
+memory next to their deflated bytes.
+
+The manifest CSV is bundled as its current state (snapshot + journal replay); journal,
+history, lock and temp files are skipped.
+
+Reproducible: fixed member order, fixed timestamps (SOURCE_DATE_EPOCH if set, else
+1980-01-01), fixed permissions and compression level, so the same tree gives the same archive
+bytes. The ZIP is written directly (no ZIP64: members and archive must stay below 4 GiB).
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import posixpath
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Callable, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from manifest_journal import read_manifest_table
+from synthesize_evidence import MANIFEST_PATH, ROOT
+
+
+BUNDLE_DIRS = ["data", "protocol", "output/synthesis", "figures", "manuscript"]
+BUNDLE_FILES = ["README.md", "DATA_DICTIONARY.md", "CITATION.cff", ".zenodo.json"]
+DEFAULT_OUT = ROOT / "dist" / "paper3_public_bundle.zip"
+
+# Columns that only make sense on the curator's machine.
+LOCAL_ONLY_FIELDS = {"pdf_path"}
+SKIP_SUFFIXES = (".journal.jsonl", ".history.jsonl", ".lock", ".tmp")
+
+COMPRESS_LEVEL = 9
+CHUNK = 1 << 20
+_ZIP_LIMIT = 0xFFFFFFFF
+_MODE_FILE = 0o100644
+_MODE_SYMLINK = 0o120777
+
+
+@dataclass
+class Member:
+    path: str
+    data: bytes  # deflated (or stored) bytes
+    method: int  # 8 = deflate, 0 = stored
+    size: int
+    crc: int
+    sha256: str
+    stripped_fields: List[str] = field(default_factory=list)
+    mode: int = _MODE_FILE
+
+
+def symlink_member(path: str, target: str) -> Member:
+    """ZIP symlink entry at `path` whose stored data is the relative path to `target`."""
+    link = posixpath.relpath(target, posixpath.dirname(path) or ".").encode("utf-8")
+    return Member(path, link, 0, len(link), zlib.crc32(link), hashlib.sha256(link).hexdigest(), mode=_MODE_SYMLINK)
+
+
+def iter_bundle_paths(root: Path = ROOT) -> List[str]:
+    out: List[str] = []
+    for d in BUNDLE_DIRS:
+        base = root / d
+        if not base.is_dir():
+            continue
+        for p in base.rglob("*"):
+            rel = p.relative_to(root)
+            if not p.is_file() or any(part.startswith(".") for part in rel.parts):
+                continue
+            if p.name.endswith(SKIP_SUFFIXES) or "__pycache__" in rel.parts:
+                continue
+            out.append(rel.as_posix())
+    out.extend(f for f in BUNDLE_FILES if (root / f).is_file())
+    return sorted(set(out))
+
+
+def _csv_lineterminator(head: bytes) -> str:
+    return "\r\n" if head.split(b"\n", 1)[0].endswith(b"\r") else "\n"
+
+
+def _stripped_csv(fieldnames: List[str], rows: Iterator[Dict[str, str]], lineterminator: str) -> Tuple[bytes, List[str]]:
+    keep = [f for f in fieldnames if f not in LOCAL_ONLY_FIELDS]
+    buf = io.StringIO()
+    w = csv.DictWriter(buf, fieldnames=keep, extrasaction="ignore", lineterminator=lineterminator)
+    w.writeheader()
+    w.writerows(rows)
+    return buf.getvalue().encode("utf-8"), [f for f in fieldnames if f in LOCAL_ONLY_FIELDS]
+
+
+ChunkSource = Callable[[], Iterator[bytes]]
+
+
+def _read_chunks(path: Path, root: Path) -> Tuple[ChunkSource, List[str]]:
+    """Re-iterable content of one bundled file as chunks, with local-only CSV columns removed."""
+    if path == root / MANIFEST_PATH.relative_to(ROOT):
+        fieldnames, rows = read_manifest_table(path)
+        with open(path, "rb") as f:
+            lt = _csv_lineterminator(f.read(4096))
+        data, stripped = _stripped_csv(fieldnames, iter(rows), lt)
+        return lambda: iter([data]), stripped
+    if path.suffix == ".csv":
+        with open(path, "rb") as fb:
+            head = fb.read(4096)
+        with open(path, newline="", encoding="utf-8") as f:
+            fieldnames = next(csv.reader(f), [])
+        if LOCAL_ONLY_FIELDS & set(fieldnames):
+            with open(path, newline="", encoding="utf-8") as f:
+                data, stripped = _stripped_csv(fieldnames, csv.DictReader(f), _csv_lineterminator(head))
+            return lambda: iter([data]), stripped
+
+    def chunks() -> Iterator[bytes]:
+        with open(path, "rb") as f:
+            while True:
+                b = f.read(CHUNK)
+                if not b:
+                    return
+                yield b
+
+    return chunks, []
+
+
+def _pack(rel: str, source: ChunkSource, stripped: List[str], level: int) -> Member:
+    sha = hashlib.sha256()
+    crc = 0
+    size = 0
+    comp = zlib.compressobj(level, zlib.DEFLATED, -15)
+    parts: List[bytes] = []
+    for b in source():
+        sha.update(b)
+        crc = zlib.crc32(b, crc)
+        size += len(b)
+        parts.append(comp.compress(b))
+    parts.append(comp.flush())
+    deflated = b"".join(parts)
+    del parts
+    if len(deflated) < size:
+        return Member(rel, deflated, 8, size, crc, sha.hexdigest(), stripped)
+    # Already-compressed files (PNG) are stored, not deflated again: drop the deflated copy
+    # and read the raw bytes a second time instead of having kept them alongside.
+    del deflated
+    raw = b"".join(source())
+    if zlib.crc32(raw) != crc or len(raw) != size:
+        raise RuntimeError(f"{rel}: changed while bundling")
+    return Member(rel, raw, 0, size, crc, sha.hexdigest(), stripped)
+
+
+def pack_file(root: Path, rel: str, level: int = COMPRESS_LEVEL) -> Member:
+    source, stripped = _read_chunks(root / rel, root)
+    return _pack(rel, source, stripped, level)
+
+
+def pack_bytes(rel: str, data: bytes, level: int = COMPRESS_LEVEL) -> Member:
+    return _pack(rel, lambda: iter([data]), [], level)
+
+
+def _dos_datetime(epoch: int) -> Tuple[int, int]:
+    t = time.gmtime(max(epoch, 315532800))  # ZIP cannot represent times before 1980
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+class ZipStreamWriter:
+    """Minimal deterministic ZIP writer for members that are already compressed."""
+
+    def __init__(self, f: BinaryIO, epoch: int) -> None:
+        self.f = f
+        self.offset = 0
+        self.central: List[bytes] = []
+        self.dostime, self.dosdate = _dos_datetime(epoch)
+
+    def add(self, m: Member) -> None:
+        name = m.path.encode("utf-8")
+        if max(m.size, len(m.data), self.offset) > _ZIP_LIMIT:
+            raise ValueError(f"{m.path}: archive exceeds 4 GiB (ZIP64 not supported)")
+        flags = 0x800  # UTF-8 names
+        header = struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, 20, flags, m.method, self.dostime, self.dosdate,
+            m.crc, len(m.data), m.size, len(name), 0,
+        )
+        self.central.append(
+            struct.pack(
+                "<IHHHHHHIIIHHHHHII", 0x02014B50, (3 << 8) | 20, 20, flags, m.method, self.dostime, self.dosdate,
+                m.crc, len(m.data), m.size, len(name), 0, 0, 0, 0, m.mode << 16, self.offset,
+            )
+            + name
+        )
+        self.f.write(header)
+        self.f.write(name)
+        self.f.write(m.data)
+        self.offset += len(header) + len(name) + len(m.data)
+
+    def close(self) -> None:
+        cd_offset = self.offset
+        cd = b"".join(self.central)
+        self.f.write(cd)
+        n = len(self.central)
+        if n >= 0xFFFF:
+            raise ValueError("too many members (ZIP64 not supported)")
+        self.f.write(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, n, n, len(cd), cd_offset, 0))
+
+
+@dataclass
+class BundleReport:
+    n_paths: int = 0
+    n_stored: int = 0
+    n_duplicates: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    stripped: Dict[str, List[str]] = field(default_factory=dict)
+    archive_sha256: str = ""
+
+
+def build_bundle(
+    out: Path,
+    root: Path = ROOT,
+    workers: Optional[int] = None,
+    level: int = COMPRESS_LEVEL,
+    epoch: Optional[int] = None,
+) -> BundleReport:
+    if epoch is None:
+        epoch = int(os.environ.get("SOURCE_DATE_EPOCH", "315532800"))
+    paths = iter_bundle_paths(root)
+    workers = workers or min(8, os.cpu_count() or 1)
+    report = BundleReport(n_paths=len(paths))
+    entries: List[Dict[str, object]] = []
+    stored_by_sha: Dict[str, str] = {}
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(out.suffix + ".tmp")
+    with open(tmp, "wb") as f, ThreadPoolExecutor(max_workers=workers) as pool:
+        zw = ZipStreamWriter(f, epoch)
+        pending: Deque[Future[Member]] = deque()
+        it = iter(paths)
+
+        def fill() -> None:
+            for rel in it:
+                pending.append(pool.submit(pack_file, root, rel, level))
+                if len(pending) >= 2 * workers:
+                    return
+
+        fill()
+        while pending:
+            m = pending.popleft().result()
+            fill()
+            report.bytes_in += m.size
+            entry: Dict[str, object] = {"path": m.path, "sha256": m.sha256, "bytes": m.size}
+            if m.stripped_fields:
+                entry["stripped_fields"] = m.stripped_fields
+                report.stripped[m.path] = m.stripped_fields
+            first = stored_by_sha.get(m.sha256)
+            if first is not None:
+                entry["stored_as"] = first
+                zw.add(symlink_member(m.path, first))
+                report.n_duplicates += 1
+            else:
+                stored_by_sha[m.sha256] = m.path
+                entry["stored_as"] = m.path
+                zw.add(m)
+                report.n_stored += 1
+            entries.append(entry)
+
+        sums = "".join(f"{e['sha256']}  {e['path']}\n" for e in entries).encode("utf-8")
+        manifest = json.dumps(
+            {
+                "bundle_dirs": BUNDLE_DIRS,
+                "local_only_fields_removed": sorted(LOCAL_ONLY_FIELDS),
+                "files": entries,
+            },
+            indent=2,
+            sort_keys=True,
+        ).encode("utf-8") + b"\n"
+        zw.add(pack_bytes("SHA256SUMS", sums, level))
+        zw.add(pack_bytes("bundle_manifest.json", manifest, level))
+        zw.close()
+        report.bytes_out = zw.offset
+
+    digest = hashlib.sha256()
+    with open(tmp, "rb") as f:
+        for b in iter(lambda: f.read(CHUNK), b""):
+            digest.update(b)
+    report.archive_sha256 = digest.hexdigest()
+    tmp.replace(out)
+    return report
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Build the public reproducibility bundle (deterministic ZIP).")
+    ap.add_argument("--out", type=Path, default=DEFAULT_OUT)
+    ap.add_argument("--workers", type=int, default=None, help="compression threads (default: min(8, CPUs))")
+    ap.add_argument("--level", type=int, default=COMPRESS_LEVEL, help="deflate level 1-9")
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    report = build_bundle(args.out, workers=args.workers, level=args.level)
+    for path, fields in sorted(report.stripped.items()):
+        print(f"stripped {', '.join(fields)} from {path}")
+    print(
+        f"files={report.n_paths} stored={report.n_stored} duplicates={report.n_duplicates} "
+        f"bytes_in={report.bytes_in} bytes_out={report.bytes_out} ({time.perf_counter() - t0:.2f}s)"
+    )
+    print(f"sha256={report.archive_sha256}  {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
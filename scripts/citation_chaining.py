@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Paper 3 - Citation Chaining Engine
+
+Reads:
+- data/citation_network_edges.csv   (citing_id, cited_id; one row per citation edge)
+- data/all_candidates_screened.csv  (short_id, stage, decision, score, is_review, cited_by_count)
+
+Writes:
+- data/prisma_counts.json           (records_identified_hopN_raw + per-hop chaining detail)
+- .cache/citation_graph_<key>.pkl   (compact adjacency snapshot of the edge table)
+
+The protocol (protocol/02_exact_search_strategy_log.md) describes two hops:
+- hop 1: top 10 seed includes, 12 backward + 12 forward per parent
+- hop 2: top 6 hop-1 includes, 6 backward + 6 forward per parent
+
+Hops are plain parameters here (`--hop PARENTS:BACKWARD:FORWARD`, repeatable), so
+deeper chaining or bigger caps is a rerun against the cached graph snapshot.
+
+Design goals:
+- Stdlib only; the graph is held as CSR-style offset/target arrays in both directions
+- Deterministic: parents are expanded concurrently but merged in priority order
+- Raw counts (edges retrieved, pre-dedup) match the PRISMA "identified" semantics
+"""
+
+from __future__ import annotations
+
+import argparse
+import heapq
+import json
+import pickle
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from synthesize_evidence import CACHE, DATA, PRISMA_COUNTS_PATH, _read_csv_dicts, _safe_float
+
+
+EDGES_PATH = DATA / "citation_network_edges.csv"
+CANDIDATES_PATH = DATA / "all_candidates_screened.csv"
+
+# Decision precedence used for parent selection ("by decision, score, review flag, cited_by_count").
+DECISION_RANK = {"core_include": 0, "support_include": 1}
+INCLUDE_DECISIONS = set(DECISION_RANK)
+
+DEFAULT_HOPS: Tuple[Tuple[int, int, int], ...] = ((10, 12, 12), (6, 6, 6))
+
+
+@dataclass(frozen=True)
+class HopSpec:
+    n_parents: int
+    backward_cap: int
+    forward_cap: int
+
+
+@dataclass(frozen=True)
+class HopResult:
+    hop: int
+    parents: List[str]
+    raw_records: int
+    unique_new_records: int
+    new_ids: List[str]
+
+
+class CitationGraph:
+    """
+    Immutable citation graph in compressed sparse row form.
+
+    Node ids are interned to ints. `out_*` holds references (citing -> cited, i.e. backward
+    chaining); `in_*` holds citing works (forward chaining). Neighbor order follows the edge
+    table so caps select the same records the API pages returned.
+    """
+
+    __slots__ = ("ids", "index", "out_offsets", "out_targets", "in_offsets", "in_targets")
+
+    def __init__(self, ids: List[str], out_adj: List[List[int]], in_adj: List[List[int]]) -> None:
+        self.ids = ids
+        self.index = {sid: i for i, sid in enumerate(ids)}
+        self.out_offsets, self.out_targets = _to_csr(out_adj)
+        self.in_offsets, self.in_targets = _to_csr(in_adj)
+
+    @classmethod
+    def from_edges(cls, edges: Iterable[Tuple[str, str]]) -> "CitationGraph":
+        index: Dict[str, int] = {}
+        ids: List[str] = []
+        out_adj: List[List[int]] = []
+        in_adj: List[List[int]] = []
+
+        def intern(sid: str) -> int:
+            i = index.get(sid)
+            if i is None:
+                i = len(ids)
+                index[sid] = i
+                ids.append(sid)
+                out_adj.append([])
+                in_adj.append([])
+            return i
+
+        for citing, cited in edges:
+            a = intern(citing)
+            b = intern(cited)
+            out_adj[a].append(b)
+            in_adj[b].append(a)
+        return cls(ids, out_adj, in_adj)
+
+    def references(self, sid: str, cap: int) -> List[str]:
+        return self._neighbors(sid, cap, self.out_offsets, self.out_targets)
+
+    def cited_by(self, sid: str, cap: int) -> List[str]:
+        return self._neighbors(sid, cap, self.in_offsets, self.in_targets)
+
+    def _neighbors(self, sid: str, cap: int, offsets: array, targets: array) -> List[str]:
+        i = self.index.get(sid)
+        if i is None or cap <= 0:
+            return []
+        lo = offsets[i]
+        hi = min(offsets[i + 1], lo + cap)
+        return [self.ids[j] for j in targets[lo:hi]]
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {
+            "ids": self.ids,
+            "out": (self.out_offsets.tobytes(), self.out_targets.tobytes()),
+            "in": (self.in_offsets.tobytes(), self.in_targets.tobytes()),
+        }
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.ids = state["ids"]
+        self.index = {sid: i for i, sid in enumerate(self.ids)}
+        self.out_offsets, self.out_targets = (_array_from(b) for b in state["out"])
+        self.in_offsets, self.in_targets = (_array_from(b) for b in state["in"])
+
+
+def _to_csr(adj: List[List[int]]) -> Tuple[array, array]:
+    offsets = array("I", [0])
+    targets = array("I")
+    for nbrs in adj:
+        targets.extend(nbrs)
+        offsets.append(len(targets))
+    return offsets, targets
+
+
+def _array_from(raw: bytes) -> array:
+    a = array("I")
+    a.frombytes(raw)
+    return a
+
+
+def _read_edges(path: Path) -> Iterable[Tuple[str, str]]:
+    for r in _read_csv_dicts(path):
+        citing = (r.get("citing_id") or "").strip()
+        cited = (r.get("cited_id") or "").strip()
+        if citing and cited:
+            yield citing, cited
+
+
+def load_graph(edges_path: Path = EDGES_PATH, cache_dir: Path = CACHE) -> CitationGraph:
+    """Load the citation graph, reusing a pickled snapshot while the edge file is unchanged."""
+    st = edges_path.stat()
+    snap = cache_dir / f"citation_graph_{st.st_size}_{st.st_mtime_ns}.pkl"
+    if snap.exists():
+        with open(snap, "rb") as f:
+            return pickle.load(f)
+
+    graph = CitationGraph.from_edges(_read_edges(edges_path))
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    for old in cache_dir.glob("citation_graph_*.pkl"):
+        old.unlink()
+    tmp = snap.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump(graph, f, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp.replace(snap)
+    return graph
+
+
+def _parent_key(r: Dict[str, str]) -> Tuple[int, float, int, float, str]:
+    decision = (r.get("decision") or "").strip()
+    is_review = (r.get("is_review") or "").strip().lower() in {"1", "true", "yes"}
+    return (
+        DECISION_RANK.get(decision, len(DECISION_RANK)),
+        -(_safe_float(r.get("score", "")) or 0.0),
+        0 if is_review else 1,
+        -(_safe_float(r.get("cited_by_count", "")) or 0.0),
+        (r.get("short_id") or "").strip(),
+    )
+
+
+def _top_parents(pool: Sequence[str], candidates: Dict[str, Dict[str, str]], n: int) -> List[str]:
+    """Priority frontier: the n best *included* records of `pool`, by the protocol's ordering."""
+    ranked = (
+        (_parent_key(candidates[sid]), sid)
+        for sid in pool
+        if (candidates.get(sid, {}).get("decision") or "").strip() in INCLUDE_DECISIONS
+    )
+    return [sid for _, sid in heapq.nsmallest(n, ranked)]
+
+
+def expand(
+    graph: CitationGraph,
+    candidates: Dict[str, Dict[str, str]],
+    seed_ids: Sequence[str],
+    hops: Sequence[HopSpec],
+    max_workers: Optional[int] = None,
+) -> List[HopResult]:
+    """
+    Run chained hops. Each hop picks parents from the previous hop's new records (seeds for hop 1),
+    fetches capped backward + forward neighbors concurrently, and dedupes against everything seen.
+    """
+    seen = set(seed_ids)
+    frontier: List[str] = list(seed_ids)
+    results: List[HopResult] = []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for hop_no, spec in enumerate(hops, start=1):
+            parents = _top_parents(frontier, candidates, spec.n_parents)
+
+            def fetch(sid: str, spec: HopSpec = spec) -> List[str]:
+                return graph.references(sid, spec.backward_cap) + graph.cited_by(sid, spec.forward_cap)
+
+            raw = 0
+            new_ids: List[str] = []
+            # map() yields in parent priority order, so dedupe is deterministic.
+            for nbrs in pool.map(fetch, parents):
+                raw += len(nbrs)
+                for sid in nbrs:
+                    if sid not in seen:
+                        seen.add(sid)
+                        new_ids.append(sid)
+
+            results.append(
+                HopResult(hop=hop_no, parents=parents, raw_records=raw, unique_new_records=len(new_ids), new_ids=new_ids)
+            )
+            frontier = new_ids
+
+    return results
+
+
+def update_prisma_counts(path: Path, hops: Sequence[HopSpec], results: Sequence[HopResult]) -> Dict[str, Any]:
+    """
+    Write the per-hop counts into prisma_counts.json, keeping its key order.
+
+    Hop keys are updated where they already sit (new hops follow the last existing one, or
+    the seed count); hops that were not run are dropped. `timestamp_utc` is refreshed only
+    when a count actually changes, so a rerun with the same result leaves the file as is.
+    """
+    old: Dict[str, Any] = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+    hop_counts = {f"records_identified_hop{res.hop}_raw": res.raw_records for res in results}
+    chaining = [
+        {
+            "hop": res.hop,
+            "n_parents": spec.n_parents,
+            "backward_cap": spec.backward_cap,
+            "forward_cap": spec.forward_cap,
+            "parents": res.parents,
+            "raw_records": res.raw_records,
+            "unique_new_records": res.unique_new_records,
+        }
+        for spec, res in zip(hops, results)
+    ]
+
+    def is_hop(k: str) -> bool:
+        return k.startswith("records_identified_hop")
+
+    keys = list(old)
+    hop_keys = [k for k in keys if is_hop(k)]
+    anchor = hop_keys[-1] if hop_keys else ("records_identified_seed_raw" if "records_identified_seed_raw" in old else None)
+    counts: Dict[str, Any] = {}
+    for k in keys:
+        if is_hop(k):
+            if k in hop_counts:
+                counts[k] = hop_counts[k]
+        else:
+            counts[k] = old[k]
+        if k == anchor:
+            counts.update((h, v) for h, v in hop_counts.items() if h not in old)
+    counts.update((h, v) for h, v in hop_counts.items() if h not in counts)
+    counts["citation_chaining"] = chaining
+
+    if counts != old:
+        if "timestamp_utc" in counts:
+            counts["timestamp_utc"] = datetime.now(timezone.utc).isoformat()
+        path.write_text(json.dumps(counts, indent=2) + "\n", encoding="utf-8")
+    return counts
+
+
+def _parse_hop(spec: str) -> HopSpec:
+    try:
+        n, back, fwd = (int(x) for x in spec.split(":"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected PARENTS:BACKWARD:FORWARD, got {spec!r}")
+    return HopSpec(n, back, fwd)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    ap.add_argument("--hop", action="append", type=_parse_hop, metavar="PARENTS:BACKWARD:FORWARD",
+                    help="hop parameters, repeat once per hop (default: 10:12:12 then 6:6:6)")
+    ap.add_argument("--edges", type=Path, default=EDGES_PATH)
+    ap.add_argument("--candidates", type=Path, default=CANDIDATES_PATH)
+    ap.add_argument("--prisma-counts", type=Path, default=PRISMA_COUNTS_PATH)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--dry-run", action="store_true", help="print hop counts without updating prisma_counts.json")
+    args = ap.parse_args(argv)
+
+    hops = args.hop or [HopSpec(*h) for h in DEFAULT_HOPS]
+    candidates = {(r.get("short_id") or "").strip(): r for r in _read_csv_dicts(args.candidates)}
+    seed_ids = sorted(sid for sid, r in candidates.items() if sid and (r.get("stage") or "").strip() == "seed")
+
+    graph = load_graph(args.edges)
+    results = expand(graph, candidates, seed_ids, hops, max_workers=args.workers)
+
+    for spec, res in zip(hops, results):
+        print(
+            f"hop {res.hop}: parents={len(res.parents)}/{spec.n_parents} caps={spec.backward_cap}+{spec.forward_cap} "
+            f"raw={res.raw_records} unique_new={res.unique_new_records}"
+        )
+    if not args.dry_run:
+        update_prisma_counts(args.prisma_counts, hops, results)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
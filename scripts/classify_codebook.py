@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+Paper 3 - Codebook Class Suggestions from Cached Full Text
+
+Reads:
+- protocol/06_fulltext_screening_codebook.md   (class codes per manifest column, duration thresholds)
+- data/fulltext_processing_manifest.csv        (current codes, type, pdf_status; local `pdf_path` if present)
+- .cache/pages/<pdf_sha256_16>.pages            (page text cache built by triage_fulltext.py)
+
+Writes (under output/screening/):
+- codebook_classification.csv   one row per manifest report: current / suggested code, confidence
+                                and evidence snippet for each codebook column
+- codebook_disagreements.csv    review queue: one row per (report, column) where a hand-assigned
+                                code differs from the suggestion
+
+Suggestions only; the manifest is never modified. Reviewers confirm or correct the
+disagreements by hand.
+
+Rules:
+- low_baseline_arousal_class: weighted phrase matchers per class (RULES below); highest score
+  wins, manifest `type=review` adds weight to AX_review_or_mixed_population.
+- repeated_use_class: the longest repeated-use duration stated in the text ("for 4 weeks",
+  "14 consecutive days", "8-week intervention"), binned with the `>= N days` thresholds read
+  from the codebook's D-class definitions; acute-only wording or no duration gives D0.
+- habituation_class: waning/tolerance phrases (H2) vs maintenance phrases (H1); both -> H3,
+  neither, or no repeated-day protocol (codebook's minimum evidence to mark "tested") -> H0.
+  A waning/tolerance match with a negation word a few tokens before or after it in the same
+  clause ("no significant habituation", "habituation was not observed") counts as H1;
+  `--check-rules` verifies this on HABITUATION_CHECKS.
+
+The codebook is parsed on every run and every rule must name a class code it defines, so a
+renamed or removed class fails loudly instead of silently never matching. Pages are scanned
+on a process pool (matchers compiled once per worker); each report's pages are memory-mapped.
+Confidence is top / (top + runner-up + 1), so single weak hits stay well below 0.5.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Pattern, Sequence, Tuple
+
+from manifest_journal import read_manifest
+from page_store import PAGES_DIR, MappedPages, PageStore
+from screen_title_abstract import SCREEN_OUT
+from synthesize_evidence import MANIFEST_PATH, PROTOCOL
+from triage_fulltext import PDF_DIR, _pdf_path_for
+
+
+CODEBOOK_PATH = PROTOCOL / "06_fulltext_screening_codebook.md"
+CLASS_COLUMNS = ["low_baseline_arousal_class", "repeated_use_class", "habituation_class"]
+
+SNIPPET_CHARS = 90
+
+# (regex, weight) per low_baseline_arousal_class code; matched case-insensitively.
+AROUSAL_RULES: Dict[str, List[Tuple[str, float]]] = {
+    "A1_explicit_low_arousal": [
+        (r"excessive daytime sleepiness", 2.0),
+        (r"\bess\s*(?:>=|≥|>|of at least)\s*\d+", 3.0),
+        (r"epworth sleepiness scale", 1.0),
+        (r"shift work (?:sleep )?disorder", 2.0),
+        (r"hypersomnia|narcolepsy", 2.0),
+        (r"fatigue severity scale|chronic fatigue", 1.5),
+        (r"(?:inclusion criteri|were eligible if|cut-?off)[^.]{0,120}(?:sleepiness|fatigue|alertness)", 3.0),
+        (r"(?:mslt|multiple sleep latency)", 1.0),
+    ],
+    "A2_structural_proxy_low_arousal": [
+        (r"night[- ]shift (?:workers?|nurses?)", 2.5),
+        (r"\bshift workers?\b", 2.0),
+        (r"rotating shifts?|night work", 1.5),
+        (r"habitual (?:short sleep|sleep restriction)|short sleepers?", 2.0),
+        (r"chronic (?:sleep restriction|circadian misalignment)", 2.0),
+    ],
+    "A3_experimentally_induced_low_arousal": [
+        (r"(?:total |partial )?sleep deprivation", 2.0),
+        (r"sleep restriction (?:protocol|condition|paradigm)", 2.0),
+        (r"\d+\s*(?:h|hours?) (?:of )?(?:continuous )?wakefulness|hours awake", 2.0),
+        (r"constant routine|forced desynchrony", 2.0),
+    ],
+    "A4_general_adults_unscreened": [
+        (r"healthy (?:young |older )?(?:adults|volunteers|participants|subjects)", 2.0),
+        (r"(?:university|college) students", 1.5),
+        (r"general population", 1.0),
+    ],
+    "AX_review_or_mixed_population": [
+        (r"systematic review|meta-analy", 3.0),
+        (r"narrative review|scoping review|literature review", 2.5),
+        (r"\bwe reviewed\b|this review", 1.5),
+    ],
+}
+REVIEW_TYPE_WEIGHT = 3.0
+DEFAULT_AROUSAL = "A4_general_adults_unscreened"
+
+_UNIT_DAYS = {"day": 1, "night": 1, "week": 7, "month": 30}
+DURATION_PATTERNS = [
+    r"\b(?:for|over|during|across)\s+(\d{1,3})\s+(?:consecutive\s+)?(day|night|week|month)s?\b",
+    r"\b(\d{1,3})\s+consecutive\s+(day|night|week)s?\b",
+    r"\b(\d{1,3})[- ](day|week|month)\s+(?:intervention|protocol|program|programme|treatment|trial|period|supplementation|exposure|training)\b",
+]
+ACUTE_PATTERNS = [r"single (?:session|dose|exposure)", r"\bacute(?:ly)?\b", r"one[- ]off"]
+# D-class code -> minimum days, read from the codebook; codes without a ">= N days" rule are the default.
+DEFAULT_REPEATED = "D0_acute_only"
+
+HABITUATION_RULES: Dict[str, List[Tuple[str, float]]] = {
+    "H2_tested_habituation": [
+        (r"\bhabituat\w*", 2.0),
+        (r"\btoleran(?:ce|t) (?:developed|to the)|developed tolerance", 2.5),
+        (r"attenuat\w* (?:over|across|with) (?:time|days|weeks|repeated)", 2.5),
+        (r"(?:diminish|declin|wan)\w* (?:over|across) (?:the )?(?:days|weeks|sessions|study)", 2.5),
+    ],
+    "H1_tested_no_habituation": [
+        (r"no (?:evidence of )?(?:habituation|tolerance)", 3.0),
+        (r"(?:maintained|sustained|persisted) (?:over|across|throughout) (?:the )?(?:\d+ )?(?:days|weeks|months|study|intervention)", 2.5),
+        (r"did not (?:diminish|decline|attenuate|wane)", 2.5),
+    ],
+}
+# A waning/tolerance match with a negation word within NEGATION_WINDOW tokens before or after it,
+# in the same clause ("no significant habituation", "did not habituate", "habituation was not
+# observed"), is a maintenance statement: it scores for H1 instead of H2.
+NEGATED_HABITUATION = {"H2_tested_habituation": "H1_tested_no_habituation"}
+NEGATION_WORDS = {"no", "not", "never", "without", "absence", "absent", "lack", "lacked", "lacking", "neither", "nor"}
+NEGATION_WINDOW = 4
+_CLAUSE_BREAK = re.compile(r"[.;:!?,()]")
+_WORD = re.compile(r"[a-z']+")
+DEFAULT_HABITUATION = "H0_not_tested"
+MIXED_HABITUATION = "H3_unclear_or_mixed"
+
+OUTPUT_FIELDS = ["short_id", "pdf_sha256_16", "status"] + [
+    f"{col}_{part}" for col in CLASS_COLUMNS for part in ("current", "suggested", "confidence", "agrees", "evidence")
+] + ["n_disagreements"]
+DISAGREEMENT_FIELDS = ["short_id", "column", "current", "suggested", "confidence", "evidence"]
+
+
+# ---- codebook -----------------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class Codebook:
+    version: str
+    classes: Dict[str, Dict[str, str]]  # manifest column -> code -> definition text
+    min_days: Dict[str, int]  # repeated_use_class code -> ">= N days" threshold
+
+
+_COLUMN_RE = re.compile(r"manifest column `([a-z_]+)`")
+_CODE_RE = re.compile(r"^- `([A-Z][A-Za-z0-9]*_[a-z_]+)`")
+_MIN_DAYS_RE = re.compile(r">=\s*(\d+)\s*(?:separate\s+)?days")
+
+
+def parse_codebook(text: str) -> Codebook:
+    m = re.search(r"\(v(\d+)\)", text.splitlines()[0] if text else "")
+    classes: Dict[str, Dict[str, str]] = {}
+    column: Optional[str] = None
+    code: Optional[str] = None
+    for ln in text.splitlines():
+        if ln.startswith("#"):
+            column = code = None
+            continue
+        cm = _COLUMN_RE.search(ln)
+        if cm:
+            column, code = cm.group(1), None
+            continue
+        if column is None:
+            continue
+        km = _CODE_RE.match(ln)
+        if km:
+            code = km.group(1)
+            classes.setdefault(column, {})[code] = ln
+        elif code and ln.startswith("  "):
+            classes[column][code] += "\n" + ln.strip()
+        elif ln.strip() and not ln.startswith("  "):
+            column = code = None
+    min_days: Dict[str, int] = {}
+    for c, definition in classes.get("repeated_use_class", {}).items():
+        dm = _MIN_DAYS_RE.search(definition)
+        if dm:
+            min_days[c] = int(dm.group(1))
+    return Codebook(version=f"v{m.group(1)}" if m else "", classes=classes, min_days=min_days)
+
+
+def _check_rules(codebook: Codebook) -> None:
+    expected = {
+        "low_baseline_arousal_class": set(AROUSAL_RULES) | {DEFAULT_AROUSAL},
+        "repeated_use_class": {DEFAULT_REPEATED},
+        "habituation_class": set(HABITUATION_RULES) | {DEFAULT_HABITUATION, MIXED_HABITUATION},
+    }
+    for col, codes in expected.items():
+        missing = codes - set(codebook.classes.get(col, {}))
+        if missing:
+            raise ValueError(f"{CODEBOOK_PATH.name}: rules name codes not defined for `{col}`: {sorted(missing)}")
+    if not codebook.min_days:
+        raise ValueError(f"{CODEBOOK_PATH.name}: no '>= N days' thresholds found in repeated_use_class")
+
+
+# ---- matchers ------------------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class Suggestion:
+    code: str
+    confidence: float
+    evidence: str
+
+
+class Classifier:
+    """Codebook rules compiled into regex matchers; one instance per worker process."""
+
+    def __init__(self, codebook: Codebook) -> None:
+        _check_rules(codebook)
+        self.codebook = codebook
+        self.arousal = self._compile(AROUSAL_RULES)
+        self.habituation = self._compile(HABITUATION_RULES)
+        self.durations = [re.compile(p) for p in DURATION_PATTERNS]
+        self.acute = [re.compile(p) for p in ACUTE_PATTERNS]
+        # Highest threshold first.
+        self.thresholds = sorted(codebook.min_days.items(), key=lambda kv: -kv[1])
+
+    @staticmethod
+    def _compile(rules: Dict[str, List[Tuple[str, float]]]) -> Dict[str, List[Tuple[Pattern[str], float]]]:
+        return {code: [(re.compile(p), w) for p, w in pats] for code, pats in rules.items()}
+
+    @staticmethod
+    def _snippet(pages: Sequence[str], page_idx: int, m: "re.Match[str]") -> str:
+        text = pages[page_idx]
+        a, b = max(0, m.start() - SNIPPET_CHARS // 2), min(len(text), m.end() + SNIPPET_CHARS // 2)
+        return f"p{page_idx + 1}: ..." + " ".join(text[a:b].split()) + "..."
+
+    @staticmethod
+    def _negated(page: str, m: "re.Match[str]") -> bool:
+        before = _CLAUSE_BREAK.split(page[max(0, m.start() - 120) : m.start()])[-1]
+        after = _CLAUSE_BREAK.split(page[m.end() : m.end() + 120])[0]
+        words = _WORD.findall(before)[-NEGATION_WINDOW:] + _WORD.findall(after)[:NEGATION_WINDOW]
+        return any(w in NEGATION_WORDS or w.endswith("n't") for w in words)
+
+    def _score(
+        self,
+        lower: Sequence[str],
+        pages: Sequence[str],
+        rules: Dict[str, List[Tuple[Pattern[str], float]]],
+        negated: Optional[Dict[str, str]] = None,
+    ) -> Tuple[Dict[str, float], Dict[str, str]]:
+        """Each pattern scores once per code; with `negated`, negated matches score for the mapped code."""
+        scores: Dict[str, float] = {}
+        evidence: Dict[str, str] = {}
+        for code, pats in rules.items():
+            flip = (negated or {}).get(code)
+            for pat, w in pats:
+                n_targets = 2 if flip else 1
+                hits: Dict[str, str] = {}
+                for i, page in enumerate(lower):
+                    for m in pat.finditer(page):
+                        target = flip if flip and self._negated(page, m) else code
+                        hits.setdefault(target, self._snippet(pages, i, m))
+                        if len(hits) == n_targets:
+                            break
+                    if len(hits) == n_targets:
+                        break
+                for target, snippet in hits.items():
+                    scores[target] = scores.get(target, 0.0) + w
+                    evidence.setdefault(target, snippet)
+        return scores, evidence
+
+    @staticmethod
+    def _pick(scores: Dict[str, float], default: str) -> Tuple[str, float]:
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
+        if not ranked:
+            return default, 0.0
+        top = ranked[0][1]
+        second = ranked[1][1] if len(ranked) > 1 else 0.0
+        return ranked[0][0], round(top / (top + second + 1.0), 2)
+
+    def classify(self, pages: Sequence[str], record_type: str = "") -> Dict[str, Suggestion]:
+        lower = [p.lower() for p in pages]
+
+        scores, evidence = self._score(lower, pages, self.arousal)
+        if record_type == "review":
+            scores["AX_review_or_mixed_population"] = scores.get("AX_review_or_mixed_population", 0.0) + REVIEW_TYPE_WEIGHT
+            evidence.setdefault("AX_review_or_mixed_population", "manifest type=review")
+        a_code, a_conf = self._pick(scores, DEFAULT_AROUSAL)
+
+        best_days, best_ev, n_mentions = 0, "", 0
+        for i, page in enumerate(lower):
+            for pat in self.durations:
+                for m in pat.finditer(page):
+                    days = int(m.group(1)) * _UNIT_DAYS[m.group(2)]
+                    n_mentions += 1
+                    if days > best_days:
+                        best_days, best_ev = days, self._snippet(pages, i, m)
+        d_code = DEFAULT_REPEATED
+        for code, min_days in self.thresholds:
+            if best_days >= min_days:
+                d_code = code
+                break
+        if d_code == DEFAULT_REPEATED:
+            acute = next(((i, m) for i, page in enumerate(lower) for pat in self.acute for m in [pat.search(page)] if m), None)
+            d_ev = self._snippet(pages, acute[0], acute[1]) if acute else (best_ev or "no repeated-use duration stated")
+            d_conf = 0.5 if acute else 0.25
+        else:
+            d_ev, d_conf = best_ev, round(n_mentions / (n_mentions + 1.0), 2)
+
+        h_scores, h_evidence = self._score(lower, pages, self.habituation, NEGATED_HABITUATION)
+        if d_code == DEFAULT_REPEATED:
+            h_code, h_conf, h_ev = DEFAULT_HABITUATION, 0.5, "no repeated-day protocol"
+        elif len(h_scores) > 1:
+            h_code = MIXED_HABITUATION
+            h_conf = round(min(h_scores.values()) / (max(h_scores.values()) + 1.0), 2)
+            h_ev = " | ".join(h_evidence[c] for c in sorted(h_evidence))
+        else:
+            h_code, h_conf = self._pick(h_scores, DEFAULT_HABITUATION)
+            h_ev = h_evidence.get(h_code, "no waning or maintenance statement")
+
+        return {
+            "low_baseline_arousal_class": Suggestion(a_code, a_conf, evidence.get(a_code, "")),
+            "repeated_use_class": Suggestion(d_code, d_conf, d_ev),
+            "habituation_class": Suggestion(h_code, h_conf, h_ev),
+        }
+
+
+# Phrasings the habituation rules must keep apart: (text, expected habituation_class).
+HABITUATION_CHECKS = [
+    ("Participants drank the beverage daily for 4 weeks. The effect was maintained over the 4 weeks "
+     "with no evidence of habituation.", "H1_tested_no_habituation"),
+    ("Over 14 consecutive days of use the groups did not show habituation of the alerting response.",
+     "H1_tested_no_habituation"),
+    ("Across the 21 consecutive days of exposure there was no significant habituation of reaction times.",
+     "H1_tested_no_habituation"),
+    ("Light was delivered each morning for 3 weeks and participants did not habituate to it.",
+     "H1_tested_no_habituation"),
+    ("After the 6-week training period, habituation was not observed in either group.",
+     "H1_tested_no_habituation"),
+    ("During the 8-week intervention the alerting effect diminished over the weeks, consistent with "
+     "habituation.", "H2_tested_habituation"),
+]
+
+
+def check_habituation_rules(classifier: Classifier) -> List[str]:
+    """Failures (empty if none) of the habituation rules on HABITUATION_CHECKS."""
+    failures = []
+    for text, expected in HABITUATION_CHECKS:
+        got = classifier.classify([text])["habituation_class"].code
+        if got != expected:
+            failures.append(f"expected {expected}, got {got}: {text!r}")
+    return failures
+
+
+# ---- corpus run -------------------------------------------------------------------------------
+
+
+_WORKER: Optional[Classifier] = None
+
+
+def _init_worker(codebook_text: str) -> None:
+    global _WORKER
+    _WORKER = Classifier(parse_codebook(codebook_text))
+
+
+def _classify_job(job: Tuple[str, str, str]) -> Tuple[str, Dict[str, Suggestion]]:
+    assert _WORKER is not None
+    sid, pages_path, record_type = job
+    with MappedPages(Path(pages_path)) as mp:
+        pages = [mp.page(i) or "" for i in range(1, mp.n_pages + 1)]
+    return sid, _WORKER.classify(pages, record_type)
+
+
+def _resolve_pages(rows: Sequence[Dict[str, str]], store: PageStore, pdf_dir: Path) -> Dict[str, str]:
+    """short_id -> cached pdf_sha256_16 for downloaded reports whose text is in the page store."""
+    index = store.load_index()
+    out: Dict[str, str] = {}
+    for r in rows:
+        if (r.get("pdf_status") or "").strip() != "downloaded":
+            continue
+        sha16 = store.indexed_sha16(_pdf_path_for(r, pdf_dir), index)
+        if sha16 and store.has(sha16):
+            out[r["short_id"]] = sha16
+    return out
+
+
+def classify_corpus(
+    rows: Sequence[Dict[str, str]],
+    codebook_text: str,
+    store: PageStore,
+    pdf_dir: Path = PDF_DIR,
+    workers: Optional[int] = None,
+) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """Returns (classification rows in manifest order, disagreement rows)."""
+    Classifier(parse_codebook(codebook_text))  # fail fast on a codebook/rules mismatch
+    resolved = _resolve_pages(rows, store, pdf_dir)
+    types = {r["short_id"]: (r.get("type") or "").strip().lower() for r in rows}
+    jobs = [(sid, str(store.path_for(sha16)), types[sid]) for sid, sha16 in resolved.items()]
+
+    results: Dict[str, Dict[str, Suggestion]] = {}
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(codebook_text,)) as pool:
+            for sid, sugg in pool.map(_classify_job, jobs, chunksize=8):
+                results[sid] = sugg
+
+    out: List[Dict[str, str]] = []
+    disagreements: List[Dict[str, str]] = []
+    for r in rows:
+        sid = r["short_id"]
+        row: Dict[str, str] = {"short_id": sid, "pdf_sha256_16": resolved.get(sid, "")}
+        if (r.get("pdf_status") or "").strip() != "downloaded":
+            row["status"] = "not_downloaded"
+        else:
+            row["status"] = "classified" if sid in results else "not_cached"
+        n_dis = 0
+        for col in CLASS_COLUMNS:
+            current = (r.get(col) or "").strip()
+            row[f"{col}_current"] = current
+            s = results.get(sid, {}).get(col)
+            if s is None:
+                continue
+            agrees = "" if not current else ("yes" if current == s.code else "no")
+            row.update(
+                {
+                    f"{col}_suggested": s.code,
+                    f"{col}_confidence": f"{s.confidence:.2f}",
+                    f"{col}_agrees": agrees,
+                    f"{col}_evidence": s.evidence,
+                }
+            )
+            if agrees == "no":
+                n_dis += 1
+                disagreements.append(
+                    {
+                        "short_id": sid,
+                        "column": col,
+                        "current": current,
+                        "suggested": s.code,
+                        "confidence": f"{s.confidence:.2f}",
+                        "evidence": s.evidence,
+                    }
+                )
+        row["n_disagreements"] = str(n_dis)
+        out.append(row)
+    disagreements.sort(key=lambda d: (-float(d["confidence"]), d["short_id"], d["column"]))
+    return out, disagreements
+
+
+def _write_csv(path: Path, fields: Sequence[str], rows: Iterable[Dict[str, str]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(fields))
+        w.writeheader()
+        w.writerows(rows)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Suggest codebook classes for every manifest report from cached full text.")
+    ap.add_argument("--manifest", type=Path, default=MANIFEST_PATH)
+    ap.add_argument("--codebook", type=Path, default=CODEBOOK_PATH)
+    ap.add_argument("--store", type=Path, default=PAGES_DIR)
+    ap.add_argument("--pdf-dir", type=Path, default=PDF_DIR)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument(
+        "--check-rules",
+        action="store_true",
+        help="only check the habituation rules on negated and waning phrasings, then exit",
+    )
+    args = ap.parse_args(argv)
+
+    codebook_text = args.codebook.read_text(encoding="utf-8")
+    if args.check_rules:
+        failures = check_habituation_rules(Classifier(parse_codebook(codebook_text)))
+        for f in failures:
+            print(f"habituation rule check FAILED: {f}")
+        if failures:
+            return 1
+        print(f"habituation rule check OK ({len(HABITUATION_CHECKS)} phrasings)")
+        return 0
+    rows, disagreements = classify_corpus(
+        read_manifest(args.manifest), codebook_text, PageStore(args.store), pdf_dir=args.pdf_dir, workers=args.workers
+    )
+    _write_csv(SCREEN_OUT / "codebook_classification.csv", OUTPUT_FIELDS, rows)
+    _write_csv(SCREEN_OUT / "codebook_disagreements.csv", DISAGREEMENT_FIELDS, disagreements)
+
+    status = Counter(r["status"] for r in rows)
+    print(f"codebook {parse_codebook(codebook_text).version or '(unversioned)'}: {dict(status)}")
+    for col in CLASS_COLUMNS:
+        judged = [r for r in rows if r.get(f"{col}_agrees")]
+        agree = sum(1 for r in judged if r[f"{col}_agrees"] == "yes")
+        print(f"  {col}: agree {agree}/{len(judged)}")
+    print(f"disagreements to review: {len(disagreements)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Paper 3 - Columnar Table Format (.cols)
+
+Compact binary copy of a synthesis table (S001_evidence_map_worklevel.csv,
+S001_vigilance_outcomes.csv) for analysis notebooks: low-cardinality text columns (tier,
+category, vigilance summary, RoB, flags) are dictionary-encoded, numeric columns are typed, and
+`ColumnarTable` memory-maps the file so a consumer decodes only the columns it asks for.
+
+On-disk layout (all integers little-endian):
+- magic b"SCL1", uint32 row count, uint32 column count, uint32 schema length S
+- S bytes of UTF-8 JSON schema: per column {name, kind, offset, nbytes, ...}
+- column blocks, each 8-byte aligned, at `offset` from the start of the file:
+  - "dict":  uint8/uint16/uint32 codes (`width`); values in the schema's `dictionary`
+  - "int":   int64 per row, INT_NULL for missing
+  - "float": float64 per row, NaN for missing
+  - "str":   uint32 offsets (rows + 1), then the concatenated UTF-8 values
+
+Kinds are inferred from the CSV text when writing: a column is "int" if every non-empty value
+is a canonical integer, "float" if every non-empty value parses as a float, "dict" if values
+repeat (at most DICT_MAX_RATIO distinct values per row), else "str". Missing numerics read
+back as None. `write_table_streamed` produces the same file from a re-iterable row source in
+bounded memory (column blocks are spilled to temporary files). Stdlib only, so
+synthesize_evidence.py can import it.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import mmap
+import shutil
+import struct
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence
+
+_MAGIC = b"SCL1"
+_HEADER = struct.Struct("<4sIII")
+_ALIGN = 8
+
+INT_NULL = -(2**63)
+# Distinct values per row at or below which a text column is dictionary-encoded.
+DICT_MAX_RATIO = 0.5
+# Distinct values per column tracked by the streamed writer; beyond this a text column is "str".
+STREAM_DICT_MAX = 1 << 16
+
+
+def _is_int(v: str) -> bool:
+    try:
+        return str(int(v)) == v and -(2**63) < int(v) < 2**63
+    except ValueError:
+        return False
+
+
+def _is_float(v: str) -> bool:
+    try:
+        return math.isfinite(float(v))
+    except ValueError:
+        return False
+
+
+def infer_kind(values: Sequence[str]) -> str:
+    present = [v for v in values if v != ""]
+    if present and all(_is_int(v) for v in present):
+        return "int"
+    if present and all(_is_float(v) for v in present):
+        return "float"
+    if len(set(values)) <= DICT_MAX_RATIO * len(values):
+        return "dict"
+    return "str"
+
+
+def _encode_column(kind: str, values: Sequence[str]) -> tuple:
+    """(block bytes, extra schema fields) for one column."""
+    n = len(values)
+    if kind == "int":
+        return struct.pack(f"<{n}q", *(int(v) if v != "" else INT_NULL for v in values)), {}
+    if kind == "float":
+        return struct.pack(f"<{n}d", *(float(v) if v != "" else math.nan for v in values)), {}
+    if kind == "dict":
+        dictionary = sorted(set(values))
+        code = {v: i for i, v in enumerate(dictionary)}
+        width = 1 if len(dictionary) <= 0xFF else 2 if len(dictionary) <= 0xFFFF else 4
+        fmt = {1: "B", 2: "H", 4: "I"}[width]
+        return struct.pack(f"<{n}{fmt}", *(code[v] for v in values)), {"dictionary": dictionary, "width": width}
+    blobs = [v.encode("utf-8") for v in values]
+    offsets = [0]
+    for b in blobs:
+        offsets.append(offsets[-1] + len(b))
+    return struct.pack(f"<{n + 1}I", *offsets) + b"".join(blobs), {}
+
+
+def encode_table(fieldnames: Sequence[str], rows: Sequence[Mapping[str, Any]]) -> bytes:
+    """Encode CSV-shaped rows (values as text; None/"" = missing) into the .cols format."""
+    columns: List[Dict[str, Any]] = []
+    blocks: List[bytes] = []
+    for name in fieldnames:
+        values = ["" if r.get(name) is None else str(r.get(name)) for r in rows]
+        kind = infer_kind(values)
+        block, extra = _encode_column(kind, values)
+        columns.append({"name": name, "kind": kind, "nbytes": len(block), **extra})
+        blocks.append(block)
+
+    schema, base = _layout(columns, [len(b) for b in blocks])
+    out = bytearray(_HEADER.pack(_MAGIC, len(rows), len(columns), len(schema)))
+    out += schema
+    out += b"\0" * (base - len(out))
+    for block in blocks:
+        out += block
+        out += b"\0" * (-len(block) % _ALIGN)
+    return bytes(out)
+
+
+def _layout(columns: List[Dict[str, Any]], sizes: Sequence[int]) -> tuple:
+    """(schema bytes, offset of the first block); sets each column's `offset`."""
+
+    # Offsets depend on the schema length, which depends on the offsets: fix the schema size first.
+    def schema_bytes(base: int) -> bytes:
+        off = base
+        for col, size in zip(columns, sizes):
+            col["offset"] = off
+            off += size + (-size % _ALIGN)
+        return json.dumps({"columns": columns}, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+    base = 0
+    while True:
+        schema = schema_bytes(base)
+        head = _HEADER.size + len(schema)
+        want = head + (-head % _ALIGN)
+        if want == base:
+            return schema, base
+        base = want
+
+
+def write_table(path: Path, fieldnames: Sequence[str], rows: Sequence[Mapping[str, Any]]) -> None:
+    tmp = path.with_suffix(".tmp")
+    tmp.write_bytes(encode_table(fieldnames, rows))
+    tmp.replace(path)
+
+
+def write_table_streamed(
+    path: Path,
+    fieldnames: Sequence[str],
+    rows: Callable[[], Iterable[Mapping[str, Any]]],
+    max_rows_in_memory: int,
+    max_dictionary: int = STREAM_DICT_MAX,
+) -> None:
+    """
+    Encode a table without holding it in memory; `rows()` must yield the same rows each call.
+
+    Two passes: the first infers each column's kind, the second encodes the columns in chunks
+    of `max_rows_in_memory` values into one temporary block file per column, which are then
+    concatenated behind the schema. The output is byte-identical to `write_table` except that
+    a text column with more than `max_dictionary` distinct values is stored as "str" rather
+    than "dict", so inference never holds more than that many values per column.
+    """
+    if max_rows_in_memory < 1:
+        raise ValueError("max_rows_in_memory must be >= 1")
+    n = 0
+    int_ok = {name: True for name in fieldnames}
+    float_ok = {name: True for name in fieldnames}
+    present = {name: False for name in fieldnames}
+    distinct: Dict[str, Optional[set]] = {name: set() for name in fieldnames}
+    for r in rows():
+        n += 1
+        for name in fieldnames:
+            v = "" if r.get(name) is None else str(r.get(name))
+            if v != "":
+                present[name] = True
+                if int_ok[name] and not _is_int(v):
+                    int_ok[name] = False
+                if float_ok[name] and not _is_float(v):
+                    float_ok[name] = False
+            seen = distinct[name]
+            if seen is not None:
+                seen.add(v)
+                if len(seen) > max_dictionary:
+                    distinct[name] = None
+
+    columns: List[Dict[str, Any]] = []
+    codes: Dict[str, Dict[str, int]] = {}
+    for name in fieldnames:
+        seen = distinct[name]
+        if present[name] and int_ok[name]:
+            kind = "int"
+        elif present[name] and float_ok[name]:
+            kind = "float"
+        elif seen is not None and len(seen) <= DICT_MAX_RATIO * n:
+            kind = "dict"
+        else:
+            kind = "str"
+        col: Dict[str, Any] = {"name": name, "kind": kind}
+        if kind == "dict":
+            dictionary = sorted(seen)
+            codes[name] = {v: i for i, v in enumerate(dictionary)}
+            col["dictionary"] = dictionary
+            col["width"] = 1 if len(dictionary) <= 0xFF else 2 if len(dictionary) <= 0xFFFF else 4
+        columns.append(col)
+        distinct[name] = None
+
+    with tempfile.TemporaryDirectory(prefix=".cols_", dir=path.parent) as td:
+        # str columns spill offsets and values separately; the offsets block comes first.
+        files: Dict[str, List[Any]] = {}
+        for i, col in enumerate(columns):
+            parts = ("offsets", "values") if col["kind"] == "str" else ("block",)
+            files[col["name"]] = [open(Path(td) / f"{i}_{part}", "w+b") for part in parts]
+        str_total = {c["name"]: 0 for c in columns if c["kind"] == "str"}
+        for name in str_total:
+            files[name][0].write(struct.pack("<I", 0))
+
+        def flush(buf: Dict[str, List[str]]) -> None:
+            for col in columns:
+                name, kind, values = col["name"], col["kind"], buf[col["name"]]
+                if kind == "str":
+                    blobs = [v.encode("utf-8") for v in values]
+                    offsets = []
+                    for b in blobs:
+                        str_total[name] += len(b)
+                        offsets.append(str_total[name])
+                    files[name][0].write(struct.pack(f"<{len(offsets)}I", *offsets))
+                    files[name][1].write(b"".join(blobs))
+                elif kind == "dict":
+                    fmt = {1: "B", 2: "H", 4: "I"}[col["width"]]
+                    files[name][0].write(struct.pack(f"<{len(values)}{fmt}", *(codes[name][v] for v in values)))
+                else:
+                    files[name][0].write(_encode_column(kind, values)[0])
+                values.clear()
+
+        buf: Dict[str, List[str]] = {name: [] for name in fieldnames}
+        pending = 0
+        for r in rows():
+            for name in fieldnames:
+                buf[name].append("" if r.get(name) is None else str(r.get(name)))
+            pending += 1
+            if pending >= max_rows_in_memory:
+                flush(buf)
+                pending = 0
+        flush(buf)
+
+        for col in columns:
+            col["nbytes"] = sum(f.tell() for f in files[col["name"]])
+        schema, base = _layout(columns, [c["nbytes"] for c in columns])
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as out:
+            out.write(_HEADER.pack(_MAGIC, n, len(columns), len(schema)))
+            out.write(schema)
+            out.write(b"\0" * (base - out.tell()))
+            for col in columns:
+                for f in files[col["name"]]:
+                    f.seek(0)
+                    shutil.copyfileobj(f, out)
+                    f.close()
+                out.write(b"\0" * (-col["nbytes"] % _ALIGN))
+        tmp.replace(path)
+
+
+class ColumnarTable:
+    """Read-only memory-mapped .cols file; columns are decoded on access only."""
+
+    def __init__(self, path: Path) -> None:
+        self._f = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._f.close()
+            raise ValueError(f"{path}: not a columnar table file")
+        magic, n_rows, _, schema_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            self.close()
+            raise ValueError(f"{path}: not a columnar table file")
+        self.n_rows = n_rows
+        schema = json.loads(self._mm[_HEADER.size : _HEADER.size + schema_len].decode("utf-8"))
+        self.schema: Dict[str, Dict[str, Any]] = {c["name"]: c for c in schema["columns"]}
+        self.columns: List[str] = [c["name"] for c in schema["columns"]]
+
+    def _col(self, name: str) -> Dict[str, Any]:
+        try:
+            return self.schema[name]
+        except KeyError:
+            raise KeyError(f"no column {name!r}") from None
+
+    def kind(self, name: str) -> str:
+        return self._col(name)["kind"]
+
+    def raw(self, name: str) -> memoryview:
+        """
+        The column's bytes in place (little-endian; e.g. for numpy.frombuffer).
+
+        Release the view before `close()`; an mmap with live views cannot be closed.
+        """
+        c = self._col(name)
+        return memoryview(self._mm)[c["offset"] : c["offset"] + c["nbytes"]]
+
+    def dictionary(self, name: str) -> List[str]:
+        return list(self._col(name).get("dictionary", []))
+
+    def codes(self, name: str) -> List[int]:
+        c = self._col(name)
+        if c["kind"] != "dict":
+            raise ValueError(f"column {name!r} is {c['kind']}, not dictionary-encoded")
+        fmt = {1: "B", 2: "H", 4: "I"}[c["width"]]
+        return list(struct.unpack_from(f"<{self.n_rows}{fmt}", self._mm, c["offset"]))
+
+    def column(self, name: str) -> List[Any]:
+        """Decoded values: str for dict/str columns, int/float (None if missing) for numerics."""
+        c = self._col(name)
+        n, off = self.n_rows, c["offset"]
+        if c["kind"] == "int":
+            return [None if v == INT_NULL else v for v in struct.unpack_from(f"<{n}q", self._mm, off)]
+        if c["kind"] == "float":
+            return [None if math.isnan(v) else v for v in struct.unpack_from(f"<{n}d", self._mm, off)]
+        if c["kind"] == "dict":
+            d = c["dictionary"]
+            return [d[i] for i in self.codes(name)]
+        offsets = struct.unpack_from(f"<{n + 1}I", self._mm, off)
+        base = off + 4 * (n + 1)
+        return [self._mm[base + offsets[i] : base + offsets[i + 1]].decode("utf-8") for i in range(n)]
+
+    def read(self, columns: Optional[Sequence[str]] = None) -> Dict[str, List[Any]]:
+        return {name: self.column(name) for name in (columns or self.columns)}
+
+    def rows(self, columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+        cols = self.read(columns)
+        names = list(cols)
+        for i in range(self.n_rows):
+            yield {name: cols[name][i] for name in names}
+
+    def close(self) -> None:
+        self._mm.close()
+        self._f.close()
+
+    def __enter__(self) -> "ColumnarTable":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+def read_columns(path: Path, columns: Optional[Sequence[str]] = None) -> Dict[str, List[Any]]:
+    """Load selected columns of a .cols file (all if None) as lists."""
+    with ColumnarTable(path) as t:
+        return t.read(columns)
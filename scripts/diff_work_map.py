@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Paper 3 - Run-to-Run Diff of the Work-Level Evidence Map
+
+Reads:
+- data/evidence_table.csv, data/risk_of_bias.csv, data/fulltext_processing_manifest.csv
+- output/synthesis/S001_row_hashes.json  (snapshot from the previous run, if any)
+
+Writes (under output/synthesis/):
+- S001_changes.json       structured change report (per work: fields changed, outcome rows added/removed)
+- S001_changes.md         "What changed" section for the synthesis report / batch notes
+- S001_row_hashes.json    snapshot for the next run (unless --no-update)
+
+Every `WorkRow` and every evidence (outcome) row is hashed; works are compared by hash
+first, so a run costs one pass over each side and only changed works are inspected field
+by field. `affected_short_ids()` gives downstream stages the set of works to recompute;
+`verify_anchors.py --changed-only` re-verifies only those works.
+
+Tracked fields (listed first in the report): eligibility tier, vigilance effect summary,
+RoB overall, exposure duration range.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+from manifest_journal import read_manifest
+from synthesize_evidence import (
+    EVIDENCE_PATH,
+    MANIFEST_PATH,
+    OUT,
+    ROB_PATH,
+    WORK_MAP_FIELDS,
+    WorkRow,
+    _now_utc_iso,
+    _read_csv_dicts,
+    build_work_level_map,
+    render_json,
+)
+
+
+SNAPSHOT_PATH = OUT / "S001_row_hashes.json"
+CHANGES_JSON_PATH = OUT / "S001_changes.json"
+CHANGES_MD_PATH = OUT / "S001_changes.md"
+
+WORK_FIELDS = WORK_MAP_FIELDS
+TRACKED_FIELDS = ["eligibility_tier", "vigilance_effect_summary", "rob_overall", "exposure_days_min", "exposure_days_max"]
+
+_SEP = "\x1f"
+
+
+def row_hash(values: Iterable[str]) -> str:
+    """16-hex SHA-256 of the field values (unit-separator joined, so field boundaries count)."""
+    return hashlib.sha256(_SEP.join(values).encode("utf-8")).hexdigest()[:16]
+
+
+def outcome_row_hashes(evidence_rows: Sequence[Dict[str, str]]) -> Dict[str, List[str]]:
+    """short_id -> sorted hashes of its evidence rows."""
+    outcomes: Dict[str, List[str]] = defaultdict(list)
+    if evidence_rows:
+        cols = list(evidence_rows[0].keys())
+        for r in evidence_rows:
+            sid = (r.get("short_id") or "").strip()
+            outcomes[sid].append(row_hash((r.get(c) or "") for c in cols))
+    return {sid: sorted(hs) for sid, hs in sorted(outcomes.items())}
+
+
+def build_snapshot(works: Sequence[WorkRow], evidence_rows: Sequence[Dict[str, str]]) -> Dict[str, Any]:
+    snap_works: Dict[str, Any] = {}
+    for w in works:
+        values = w.as_csv_row()
+        snap_works[w.short_id] = {"hash": row_hash(values[f] for f in WORK_FIELDS), "row": values}
+    return {
+        "generated_utc": _now_utc_iso(),
+        "work_fields": WORK_FIELDS,
+        "works": snap_works,
+        "outcome_row_hashes": outcome_row_hashes(evidence_rows),
+    }
+
+
+def load_snapshot(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+def _field_order(fields: Iterable[str]) -> List[str]:
+    fields = set(fields)
+    return [f for f in TRACKED_FIELDS if f in fields] + sorted(fields - set(TRACKED_FIELDS))
+
+
+def diff_snapshots(prev: Optional[Dict[str, Any]], cur: Dict[str, Any]) -> Dict[str, Any]:
+    prev_works: Dict[str, Any] = (prev or {}).get("works", {})
+    prev_out: Dict[str, List[str]] = (prev or {}).get("outcome_row_hashes", {})
+    cur_works: Dict[str, Any] = cur["works"]
+    cur_out: Dict[str, List[str]] = cur["outcome_row_hashes"]
+
+    changes: List[Dict[str, Any]] = []
+    for sid in sorted(set(prev_works) | set(cur_works)):
+        old, new = prev_works.get(sid), cur_works.get(sid)
+        old_out, new_out = Counter(prev_out.get(sid, [])), Counter(cur_out.get(sid, []))
+        work_same = old is not None and new is not None and old["hash"] == new["hash"]
+        if work_same and old_out == new_out:
+            continue
+
+        entry: Dict[str, Any] = {"short_id": sid}
+        if old is None:
+            entry["status"] = "added"
+        elif new is None:
+            entry["status"] = "removed"
+        else:
+            entry["status"] = "changed"
+        if old is not None and new is not None and not work_same:
+            diffs = [f for f in set(old["row"]) | set(new["row"]) if old["row"].get(f) != new["row"].get(f)]
+            entry["fields"] = {f: [old["row"].get(f, ""), new["row"].get(f, "")] for f in _field_order(diffs)}
+        entry["outcome_rows_added"] = sum((new_out - old_out).values())
+        entry["outcome_rows_removed"] = sum((old_out - new_out).values())
+        ref = new or old
+        entry["eligibility_tier"] = ref["row"].get("eligibility_tier", "")
+        changes.append(entry)
+
+    status_counts = Counter(c["status"] for c in changes)
+    tracked_counts = Counter(f for c in changes for f in c.get("fields", {}) if f in TRACKED_FIELDS)
+    return {
+        "previous_snapshot_utc": (prev or {}).get("generated_utc", ""),
+        "current_snapshot_utc": cur["generated_utc"],
+        "n_works_previous": len(prev_works),
+        "n_works_current": len(cur_works),
+        "status_counts": dict(sorted(status_counts.items())),
+        "tracked_field_change_counts": {f: tracked_counts[f] for f in TRACKED_FIELDS if tracked_counts[f]},
+        "changes": changes,
+    }
+
+
+def affected_short_ids(report: Dict[str, Any]) -> Set[str]:
+    """Works whose work-level row or outcome rows changed (what downstream stages must recompute)."""
+    return {c["short_id"] for c in report["changes"]}
+
+
+def render_changes_md(report: Dict[str, Any]) -> str:
+    lines: List[str] = []
+    lines.append("## What changed since the previous run")
+    lines.append("")
+    if not report["previous_snapshot_utc"]:
+        lines.append(f"- No previous snapshot; all {report['n_works_current']} works are new.")
+        lines.append("")
+        return "\n".join(lines)
+    lines.append(f"- Previous snapshot: {report['previous_snapshot_utc']}")
+    lines.append(f"- Works: {report['n_works_previous']} -> {report['n_works_current']}")
+    if not report["changes"]:
+        lines.append("- No work-level or outcome-row changes.")
+        lines.append("")
+        return "\n".join(lines)
+    sc = report["status_counts"]
+    lines.append(f"- Added: {sc.get('added', 0)}; removed: {sc.get('removed', 0)}; changed: {sc.get('changed', 0)}")
+    for f, n in report["tracked_field_change_counts"].items():
+        lines.append(f"- `{f}` changed for {n} works")
+    lines.append("")
+
+    lines.append("| short_id | tier | status | fields changed | outcome rows +/- |")
+    lines.append("|---|---|---|---|---|")
+    for c in report["changes"]:
+        fields = c.get("fields", {})
+        shown = []
+        for f, (old, new) in fields.items():
+            shown.append(f"`{f}`: {old or '(blank)'} -> {new or '(blank)'}" if f in TRACKED_FIELDS else f"`{f}`")
+        lines.append(
+            f"| {c['short_id']} | {c['eligibility_tier']} | {c['status']} | {'; '.join(shown)} | "
+            f"+{c['outcome_rows_added']}/-{c['outcome_rows_removed']} |"
+        )
+    lines.append("")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Diff the work-level evidence map against the previous run.")
+    ap.add_argument("--snapshot", type=Path, default=SNAPSHOT_PATH)
+    ap.add_argument("--no-update", action="store_true", help="report only; keep the previous snapshot")
+    args = ap.parse_args(argv)
+
+    evidence_rows = _read_csv_dicts(EVIDENCE_PATH)
+    works, _ = build_work_level_map(evidence_rows, _read_csv_dicts(ROB_PATH), read_manifest(MANIFEST_PATH))
+    cur = build_snapshot(works, evidence_rows)
+    report = diff_snapshots(load_snapshot(args.snapshot), cur)
+
+    OUT.mkdir(parents=True, exist_ok=True)
+    CHANGES_JSON_PATH.write_text(render_json(report), encoding="utf-8")
+    CHANGES_MD_PATH.write_text(render_changes_md(report), encoding="utf-8")
+    if not args.no_update:
+        args.snapshot.write_text(render_json(cur), encoding="utf-8")
+
+    print(f"changes: {report['status_counts'] or 'none'}; affected works: {len(affected_short_ids(report))}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
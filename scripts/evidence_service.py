@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Paper 3 - Local Evidence Service
+
+Serves the S001 synthesis from memory over HTTP (stdlib asyncio only), so dashboards and
+manuscript tooling stop re-parsing CSVs on every poll.
+
+Reads:
+- data/evidence_table.csv, data/risk_of_bias.csv, data/fulltext_processing_manifest.csv
+  (via `synthesize()`; rebuilt automatically when any file under data/ changes)
+
+Endpoints (GET, JSON unless noted):
+- /works                 work-level map; any WorkRow field is a filter (?eligibility_tier=T1_core)
+- /vigilance             vigilance outcome ledger; filters on its columns
+- /stats                 S001_stats.json content
+- /stats/cube?dims=a,b   work counts over the given WorkRow fields
+- /figures/<name>.png    figure PNG (rendered with the corpus build, off the event loop on reload)
+- /health                corpus version and build time
+
+Responses carry an ETag (content hash, with a `-gz` suffix on the gzip representation so the
+two encodings never share a strong validator); `If-None-Match` yields 304, `Accept-Encoding: gzip`
+yields a pre-compressed body for 200 text responses (errors are sent uncompressed). HEAD sends
+the headers of the matching GET, Content-Length included, without the body. Encoded
+responses are cached per data version in an LRU of RESPONSE_CACHE_ENTRIES entries, since
+arbitrary query strings would otherwise grow the cache without bound.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from synthesize_evidence import (
+    DATA,
+    EVIDENCE_PATH,
+    MANIFEST_PATH,
+    ROB_PATH,
+    SynthesisResult,
+    WORK_MAP_FIELDS,
+    _now_utc_iso,
+    synthesize,
+)
+
+
+WORK_FIELDS = WORK_MAP_FIELDS
+RESPONSE_CACHE_ENTRIES = 512
+_REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+# (status, content type, body bytes)
+Payload = Tuple[int, str, bytes]
+# (status, content type, body bytes, etag, body is gzip-compressed)
+Response = Tuple[int, str, bytes, str, bool]
+
+
+def _data_signature(data_dir: Path) -> Tuple[Tuple[str, int, int], ...]:
+    return tuple(sorted((p.name, p.stat().st_size, p.stat().st_mtime_ns) for p in data_dir.glob("*") if p.is_file()))
+
+
+def _filter_rows(rows: List[Dict[str, Any]], query: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+    # Repeated parameters are OR-ed (?tier=a&tier=b); different parameters are AND-ed.
+    filters = {k: set(v) for k, v in query.items() if rows and k in rows[0]}
+    if not filters:
+        return rows
+    return [r for r in rows if all(str(r.get(k, "")) in vals for k, vals in filters.items())]
+
+
+def _json_payload(obj: Any) -> Payload:
+    return 200, "application/json", json.dumps(obj, indent=1, sort_keys=True).encode("utf-8")
+
+
+class EvidenceCorpus:
+    """One built synthesis plus its response cache; replaced wholesale on reload."""
+
+    def __init__(self, result: SynthesisResult, version: str) -> None:
+        self.result = result
+        self.version = version
+        self.built_utc = _now_utc_iso()
+        self.work_dicts = [w.as_csv_row() for w in result.works]
+        self.responses: "OrderedDict[Tuple[str, str, bool], Response]" = OrderedDict()
+
+    def figures(self) -> Dict[str, bytes]:
+        # Rendered by synthesize() during the build, never on the event loop.
+        return self.result.figures
+
+    def route(self, path: str, query: Dict[str, List[str]]) -> Payload:
+        if path == "/works":
+            return _json_payload(_filter_rows(self.work_dicts, query))
+        if path == "/vigilance":
+            return _json_payload(_filter_rows(self.result.vigilance_rows, query))
+        if path == "/stats":
+            return _json_payload(self.result.stats)
+        if path == "/stats/cube":
+            dims = [d for d in ",".join(query.get("dims", [])).split(",") if d]
+            bad = [d for d in dims if d not in WORK_FIELDS]
+            if not dims or bad:
+                return 400, "application/json", json.dumps({"error": "dims must name WorkRow fields", "invalid": bad}).encode()
+            rows = _filter_rows(self.work_dicts, {k: v for k, v in query.items() if k != "dims"})
+            cube = Counter(tuple(r[d] or "(missing)" for d in dims) for r in rows)
+            return _json_payload({"dims": dims, "cells": [{"key": list(k), "n_works": n} for k, n in sorted(cube.items())]})
+        if path.startswith("/figures/"):
+            png = self.figures().get(path[len("/figures/") :])
+            if png is None:
+                return 404, "application/json", b'{"error": "unknown figure"}'
+            return 200, "image/png", png
+        if path == "/health":
+            return _json_payload({"version": self.version, "built_utc": self.built_utc, "n_works": len(self.work_dicts)})
+        return 404, "application/json", b'{"error": "not found"}'
+
+    def respond(self, path: str, raw_query: str, want_gzip: bool) -> Response:
+        # PNGs are already compressed; gzip only text payloads.
+        key = (path, raw_query, want_gzip and not path.startswith("/figures/"))
+        hit = self.responses.get(key)
+        if hit is not None:
+            self.responses.move_to_end(key)
+            return hit
+        status, ctype, body = self.route(path, parse_qs(raw_query))
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        gzipped = key[2] and status == 200
+        if gzipped:
+            body = gzip.compress(body, mtime=0)
+        etag = f'"{digest}-gz"' if gzipped else f'"{digest}"'
+        entry = (status, ctype, body, etag, gzipped)
+        if status == 200:
+            self.responses[key] = entry
+            if len(self.responses) > RESPONSE_CACHE_ENTRIES:
+                self.responses.popitem(last=False)
+        return entry
+
+
+class EvidenceService:
+    def __init__(self, data_dir: Path = DATA, reload_interval: float = 2.0) -> None:
+        self.data_dir = data_dir
+        self.reload_interval = reload_interval
+        self._signature = _data_signature(data_dir)
+        self.corpus = self._build()
+
+    def _build(self) -> EvidenceCorpus:
+        result = synthesize(
+            self.data_dir / EVIDENCE_PATH.name,
+            self.data_dir / ROB_PATH.name,
+            self.data_dir / MANIFEST_PATH.name,
+            figures=True,
+        )
+        version = hashlib.sha256(repr(self._signature).encode()).hexdigest()[:12]
+        return EvidenceCorpus(result, version)
+
+    async def watch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            sig = _data_signature(self.data_dir)
+            if sig == self._signature:
+                continue
+            self._signature = sig
+            try:
+                # Build off the event loop; swap in one assignment so in-flight requests see one version.
+                self.corpus = await loop.run_in_executor(None, self._build)
+                print(f"reloaded corpus version={self.corpus.version}")
+            except Exception as e:  # Keep serving the previous corpus on a bad edit.
+                print(f"reload failed, keeping version={self.corpus.version}: {e}")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers: Dict[str, str] = {}
+                while True:
+                    ln = await reader.readline()
+                    if ln in (b"\r\n", b"\n", b""):
+                        break
+                    k, _, v = ln.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3 or parts[0] not in {"GET", "HEAD"}:
+                    await self._send(writer, 405, "text/plain", b"", "", False, True)
+                    break
+                method, target, _ = parts
+                url = urlsplit(target)
+                want_gzip = "gzip" in headers.get("accept-encoding", "")
+                status, ctype, body, etag, gz = self.corpus.respond(unquote(url.path), url.query, want_gzip)
+
+                keep_alive = headers.get("connection", "").lower() != "close"
+                if status == 200 and etag in {t.strip() for t in headers.get("if-none-match", "").split(",")}:
+                    await self._send(writer, 304, ctype, b"", etag, False, keep_alive)
+                else:
+                    await self._send(writer, status, ctype, body, etag, gz, keep_alive, head_only=method == "HEAD")
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _send(
+        writer: asyncio.StreamWriter,
+        status: int,
+        ctype: str,
+        body: bytes,
+        etag: str,
+        gz: bool,
+        keep_alive: bool,
+        head_only: bool = False,
+    ) -> None:
+        head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}", f"Content-Type: {ctype}", f"Content-Length: {len(body)}"]
+        if etag:
+            head.append(f"ETag: {etag}")
+            head.append("Cache-Control: no-cache")
+        if gz:
+            head.append("Content-Encoding: gzip")
+        head.append("Vary: Accept-Encoding")
+        head.append("Connection: keep-alive" if keep_alive else "Connection: close")
+        # HEAD: same Content-Length as the GET would carry, no body.
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + (b"" if head_only else body))
+        await writer.drain()
+
+
+async def serve(host: str, port: int, data_dir: Path, reload_interval: float) -> None:
+    service = EvidenceService(data_dir, reload_interval)
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"serving corpus version={service.corpus.version} on http://{host}:{port}")
+    async with server:
+        await asyncio.gather(server.serve_forever(), service.watch())
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Serve the S001 synthesis from memory over local HTTP.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--data-dir", type=Path, default=DATA)
+    ap.add_argument("--reload-interval", type=float, default=2.0, help="seconds between data/ change checks")
+    args = ap.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.data_dir, args.reload_interval))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Paper 3 - Durability Map Tile Export
+
+Reads:
+- output/synthesis/S001_evidence_map_worklevel.csv (written by synthesize_evidence.py)
+
+Writes (under output/synthesis/S001_durability_tiles/):
+- index.json             axis domain, zoom levels, dictionaries (summaries, categories, tiers)
+- z<level>/x<tile>.json  one tile per x-range per zoom level
+
+The tiles are a level-of-detail export of Fig 2 (x = max exposure days on a log axis,
+y = vigilance effect summary, colour = primary intervention category) for an interactive
+viewer. Zoom level z splits the log-duration domain into 2**z tiles of BINS_PER_TILE bins
+each. Coarse levels carry only pre-aggregated cells, so a view costs the same few kilobytes
+whether the corpus has 30 or 30,000 works; per-work points appear only at the finest level.
+
+Tile formats (compact JSON, dictionary-encoded; indices refer to index.json):
+- cells:  [bin, summary_idx, category_idx, n_works, n_T1_core, n_T2_context, x_min, x_max]
+- points: [short_id, x, summary_idx, category_idx, tier_idx, publication_year]  (finest level only)
+
+Design goals:
+- Stdlib only; one pass over works, coarser levels rolled up from the finest cells
+- Stable tile addresses (domain snapped to whole decades)
+- Deterministic output; stale tiles from a previous export are removed
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import shutil
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from synthesize_evidence import OUT, ROOT, _now_utc_iso, _read_csv_dicts, _safe_float
+
+
+WORK_MAP_PATH = OUT / "S001_evidence_map_worklevel.csv"
+TILES_DIR = OUT / "S001_durability_tiles"
+
+# Same y order as Fig 2.
+SUMMARY_ORDER = ["worsens", "null", "unclear", "mixed", "improves"]
+TIER_ORDER = ["T1_core", "T2_context", "(missing)"]
+
+BINS_PER_TILE = 16
+DEFAULT_LEVELS = 4
+
+# n_works, n_T1_core, n_T2_context, x_min, x_max
+Cell = List[float]
+CellKey = Tuple[int, int, int]  # (bin, summary_idx, category_idx)
+
+
+def _json_compact(obj: Any) -> str:
+    return json.dumps(obj, separators=(",", ":"), sort_keys=True)
+
+
+def _decade_domain(xs: Sequence[float]) -> Tuple[float, float]:
+    """log10 domain snapped to whole decades so tile addresses do not shift with the data."""
+    if not xs:
+        return 0.0, 1.0
+    lo = math.floor(math.log10(min(xs)))
+    hi = math.floor(math.log10(max(xs))) + 1
+    return float(lo), float(max(hi, lo + 1))
+
+
+def _points(works: Sequence[Dict[str, str]]) -> List[Dict[str, Any]]:
+    """Works plotted on Fig 2: a vigilance outcome and a positive max exposure duration."""
+    out: List[Dict[str, Any]] = []
+    for w in works:
+        if (w.get("has_vigilance_outcome") or "") != "yes":
+            continue
+        x = _safe_float(w.get("exposure_days_max") or "") or 0.0
+        if x <= 0:
+            continue
+        summary = w.get("vigilance_effect_summary") or ""
+        year = _safe_float(w.get("publication_year") or "")
+        out.append(
+            {
+                "short_id": w.get("short_id") or "",
+                "x": x,
+                "summary": summary if summary in SUMMARY_ORDER else "unclear",
+                "category": w.get("primary_intervention_category") or "(missing)",
+                "tier": w.get("eligibility_tier") if w.get("eligibility_tier") in TIER_ORDER else "(missing)",
+                "year": int(year) if year is not None else None,
+            }
+        )
+    return out
+
+
+def _rel(path: Path) -> str:
+    try:
+        return str(path.resolve().relative_to(ROOT))
+    except ValueError:
+        return str(path)
+
+
+def build_tiles(
+    works: Sequence[Dict[str, str]], levels: int = DEFAULT_LEVELS, source: Path = WORK_MAP_PATH
+) -> Dict[str, Any]:
+    """Return {"index": {...}, "tiles": {"z<z>/x<t>.json": tile}} for the work-map rows read from `source`."""
+    if levels < 1:
+        raise ValueError("levels must be >= 1")
+    pts = _points(works)
+    lo, hi = _decade_domain([p["x"] for p in pts])
+    finest = levels - 1
+    n_fine_bins = BINS_PER_TILE << finest
+
+    cat_counts: Dict[str, int] = defaultdict(int)
+    for p in pts:
+        cat_counts[p["category"]] += 1
+    categories = sorted(cat_counts, key=lambda c: (-cat_counts[c], c))
+    cat_idx = {c: i for i, c in enumerate(categories)}
+    sum_idx = {s: i for i, s in enumerate(SUMMARY_ORDER)}
+    tier_idx = {t: i for i, t in enumerate(TIER_ORDER)}
+
+    # One pass over works: finest-level cells plus per-work points.
+    fine: Dict[CellKey, Cell] = {}
+    fine_points: Dict[int, List[List[Any]]] = defaultdict(list)
+    for p in pts:
+        frac = (math.log10(p["x"]) - lo) / (hi - lo)
+        b = min(n_fine_bins - 1, max(0, int(frac * n_fine_bins)))
+        key = (b, sum_idx[p["summary"]], cat_idx[p["category"]])
+        cell = fine.get(key)
+        if cell is None:
+            cell = fine[key] = [0, 0, 0, p["x"], p["x"]]
+        cell[0] += 1
+        cell[1] += p["tier"] == "T1_core"
+        cell[2] += p["tier"] == "T2_context"
+        cell[3] = min(cell[3], p["x"])
+        cell[4] = max(cell[4], p["x"])
+        fine_points[b // BINS_PER_TILE].append(
+            [p["short_id"], p["x"], key[1], key[2], tier_idx[p["tier"]], p["year"]]
+        )
+
+    tiles: Dict[str, Dict[str, Any]] = {}
+    level_meta: List[Dict[str, Any]] = []
+    cells = fine
+    for z in range(finest, -1, -1):
+        if z != finest:
+            # Roll up: two adjacent bins at level z+1 form one bin at level z.
+            coarse: Dict[CellKey, Cell] = {}
+            for (b, s, c), v in cells.items():
+                key = (b >> 1, s, c)
+                acc = coarse.get(key)
+                if acc is None:
+                    coarse[key] = list(v)
+                else:
+                    acc[0] += v[0]
+                    acc[1] += v[1]
+                    acc[2] += v[2]
+                    acc[3] = min(acc[3], v[3])
+                    acc[4] = max(acc[4], v[4])
+            cells = coarse
+
+        by_tile: Dict[int, List[List[Any]]] = defaultdict(list)
+        for (b, s, c), v in cells.items():
+            by_tile[b // BINS_PER_TILE].append([b, s, c, v[0], v[1], v[2], v[3], v[4]])
+        n_tiles = 1 << z
+        span = (hi - lo) / n_tiles
+        for t, tile_cells in sorted(by_tile.items()):
+            tile: Dict[str, Any] = {
+                "z": z,
+                "x": t,
+                "log10_range": [lo + t * span, lo + (t + 1) * span],
+                "cells": sorted(tile_cells),
+            }
+            if z == finest:
+                tile["points"] = sorted(fine_points.get(t, []), key=lambda r: (r[1], r[0]))
+            tiles[f"z{z}/x{t}.json"] = tile
+        level_meta.append(
+            {
+                "z": z,
+                "n_tiles": n_tiles,
+                "n_bins": BINS_PER_TILE * n_tiles,
+                "tiles_present": sorted(by_tile),
+                "points": z == finest,
+            }
+        )
+
+    index = {
+        "source": _rel(source),
+        "generated_utc": _now_utc_iso(),
+        "x_axis": "log10(exposure_days_max)",
+        "log10_domain": [lo, hi],
+        "bins_per_tile": BINS_PER_TILE,
+        "levels": sorted(level_meta, key=lambda m: m["z"]),
+        "tile_path": "z{z}/x{x}.json",
+        "summaries": SUMMARY_ORDER,
+        "categories": categories,
+        "tiers": TIER_ORDER,
+        "cell_fields": ["bin", "summary_idx", "category_idx", "n_works", "n_T1_core", "n_T2_context", "x_min", "x_max"],
+        "point_fields": ["short_id", "x", "summary_idx", "category_idx", "tier_idx", "publication_year"],
+        "n_works_plotted": len(pts),
+    }
+    return {"index": index, "tiles": tiles}
+
+
+def write_tiles(out_dir: Path, built: Dict[str, Any]) -> int:
+    """Replace `out_dir` with the built export; returns total bytes written."""
+    tmp = out_dir.with_name(out_dir.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+    total = 0
+    for rel, tile in built["tiles"].items():
+        path = tmp / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        text = _json_compact(tile)
+        path.write_text(text, encoding="utf-8")
+        total += len(text)
+    index_text = json.dumps(built["index"], indent=2, sort_keys=True)
+    (tmp / "index.json").write_text(index_text, encoding="utf-8")
+    total += len(index_text)
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    tmp.replace(out_dir)
+    return total
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Export level-of-detail JSON tiles of the durability map (Fig 2).")
+    ap.add_argument("--work-map", type=Path, default=WORK_MAP_PATH)
+    ap.add_argument("--out", type=Path, default=TILES_DIR)
+    ap.add_argument("--levels", type=int, default=DEFAULT_LEVELS, help="number of zoom levels (finest carries points)")
+    args = ap.parse_args(argv)
+
+    built = build_tiles(_read_csv_dicts(args.work_map), levels=args.levels, source=args.work_map)
+    n_bytes = write_tiles(args.out, built)
+    idx = built["index"]
+    print(
+        f"works plotted={idx['n_works_plotted']} levels={len(idx['levels'])} "
+        f"tiles={len(built['tiles'])} bytes={n_bytes} -> {args.out}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Paper 3 - Incremental LaTeX Fragments for manuscript/manuscript.tex
+
+Reads:
+- data/evidence_table.csv, data/risk_of_bias.csv, data/fulltext_processing_manifest.csv
+- data/prisma_counts.json
+
+Writes (under manuscript/generated/, \\input by manuscript.tex):
+- S001_stats.tex                    \\newcommand macros for every count quoted in the text
+- S001_tab_core_works.tex           longtable of T1_core works from the work-level map
+- S001_tab_vigilance_outcomes.tex   longtable of vigilance outcome rows
+- S001_figures.tex                  figure environments for the output/synthesis PNGs
+- fragment_hashes.json              source-data hash per fragment (incremental state)
+
+Each fragment is built from an explicit slice of the synthesis result (e.g. the stat macros
+from counts only, never `generated_utc`), and that slice is hashed. A fragment file is
+rewritten only when its source hash changed or the file is missing, so a TeX build (and
+latexmk's caches) sees new mtimes only for fragments whose numbers actually moved.
+
+Fragments carry no timestamps, so regenerating from unchanged data is a no-op.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from manifest_journal import read_manifest
+from prisma_flow import FlowIndex
+from synthesize_evidence import (
+    EVIDENCE_PATH,
+    MANIFEST_PATH,
+    OUT,
+    PRISMA_COUNTS_PATH,
+    ROB_PATH,
+    ROOT,
+    SynthesisResult,
+    WorkRow,
+    render_figure_captions_md,
+    synthesize,
+)
+
+
+MANUSCRIPT_DIR = ROOT / "manuscript"
+FRAGMENTS_DIR = MANUSCRIPT_DIR / "generated"
+STATE_NAME = "fragment_hashes.json"
+
+# Bump when the LaTeX templates below change, so every fragment is rewritten once.
+FRAGMENT_FORMAT = 1
+
+FIGURES = [
+    ("S001_fig1_study_counts_by_intervention.png", "Fig 1"),
+    ("S001_fig2_vigilance_durability_map.png", "Fig 2"),
+    ("S001_fig3_risk_of_bias_distribution.png", "Fig 3"),
+    ("S001_fig4_durability_trajectories.png", "Fig 4"),
+    ("S001_fig5_gap_heatmap.png", "Fig 5"),
+]
+
+_LATEX_SPECIALS = {
+    "\\": r"\textbackslash{}",
+    "&": r"\&",
+    "%": r"\%",
+    "$": r"\$",
+    "#": r"\#",
+    "_": r"\_",
+    "{": r"\{",
+    "}": r"\}",
+    "~": r"\textasciitilde{}",
+    "^": r"\textasciicircum{}",
+}
+_LATEX_SPECIALS_RE = re.compile("|".join(re.escape(c) for c in _LATEX_SPECIALS))
+
+
+def latex_escape(text: str) -> str:
+    return _LATEX_SPECIALS_RE.sub(lambda m: _LATEX_SPECIALS[m.group(0)], text)
+
+
+def _md_inline_to_latex(text: str) -> str:
+    """Escape text, rendering markdown `code` spans as \\texttt."""
+    parts = text.split("`")
+    return "".join(r"\texttt{" + latex_escape(p) + "}" if i % 2 else latex_escape(p) for i, p in enumerate(parts))
+
+
+def _int_text(n: int) -> str:
+    # Same thousands separator as the prose ("3,116 unique records").
+    return f"{n:,}"
+
+
+def source_hash(source: Any) -> str:
+    blob = json.dumps({"format": FRAGMENT_FORMAT, "source": source}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class Fragment:
+    name: str
+    source: Any
+    render: Callable[[Any], str]
+
+
+# ---- stat macros ----------------------------------------------------------------------
+
+
+def stats_source(stats: Dict[str, Any], prisma: Dict[str, Any], flow: Dict[str, Any]) -> Dict[str, int]:
+    """Counts quoted in the text; full-text stages come from the manifest via prisma_flow.FlowIndex."""
+    tiers = stats.get("works_by_tier", {})
+    included_tiers = flow["studies_included_by_tier"]
+    return {
+        "RecordsScreened": int(prisma.get("records_screened_title_abstract", 0)),
+        "RecordsExcludedTitleAbstract": int(prisma.get("records_excluded_title_abstract", 0)),
+        "ReportsSought": int(prisma.get("reports_sought_for_retrieval", 0)),
+        "FulltextsUsable": flow["reports_assessed_for_eligibility"],
+        "FulltextsUnavailable": flow["reports_not_retrieved"],
+        "ReportsIncluded": flow["studies_included"],
+        # Excluded after full-text assessment; unavailable reports are counted in FulltextsUnavailable.
+        "ReportsExcluded": flow["reports_excluded_fulltext"],
+        "ReportsIncludedCore": included_tiers.get("T1_core", 0),
+        "ReportsIncludedContext": included_tiers.get("T2_context", 0),
+        "WorksExtracted": int(stats.get("n_unique_works", 0)),
+        "WorksExtractedCore": int(tiers.get("T1_core", 0)),
+        "WorksExtractedContext": int(tiers.get("T2_context", 0)),
+        "OutcomeRows": int(stats.get("n_outcome_rows", 0)),
+        "WorksWithVigilance": int(stats.get("works_with_vigilance_outcomes", 0)),
+    }
+
+
+def render_stats_tex(source: Dict[str, int]) -> str:
+    lines = ["% Generated by scripts/export_latex_fragments.py; do not edit.", ""]
+    for name, n in source.items():
+        lines.append(f"\\newcommand{{\\Synth{name}}}{{{_int_text(n)}}}")
+    return "\n".join(lines) + "\n"
+
+
+# ---- tables -----------------------------------------------------------------------------
+
+
+def _longtable(colspec: Sequence[float], header: Sequence[str], caption: str, label: str, rows: List[List[str]]) -> str:
+    cols = " ".join(f">{{\\raggedright\\arraybackslash}}p{{{w:.2f}\\textwidth}}" for w in colspec)
+    head = " & ".join(header) + r" \\"
+    lines = ["% Generated by scripts/export_latex_fragments.py; do not edit.", ""]
+    lines.append(f"\\begin{{longtable}}{{{cols}}}")
+    lines.append(f"\\caption{{{caption}}}\\label{{{label}}}\\\\")
+    lines += [r"\toprule", head, r"\midrule", r"\endfirsthead", r"\toprule", head, r"\midrule", r"\endhead"]
+    for r in rows:
+        lines.append(" & ".join(latex_escape(c) for c in r) + r" \\")
+    lines += [r"\bottomrule", r"\end{longtable}"]
+    return "\n".join(lines) + "\n"
+
+
+CORE_TABLE_FIELDS = [
+    "short_id",
+    "citation",
+    "primary_intervention_category",
+    "exposure_days_max",
+    "vigilance_effect_summary",
+    "habituation_signal_any",
+    "rob_overall",
+]
+
+
+def core_works_source(works: Sequence[WorkRow]) -> List[List[str]]:
+    return [[w.text(f) for f in CORE_TABLE_FIELDS] for w in works if w.eligibility_tier == "T1_core"]
+
+
+def render_core_works_tex(source: List[List[str]]) -> str:
+    rows = [
+        [sid, cit, cat.replace("_", " "), days[:-2] if days.endswith(".0") else days, vig, hab, rob.replace("_", " ")]
+        for sid, cit, cat, days, vig, hab, rob in source
+    ]
+    return _longtable(
+        [0.10, 0.26, 0.14, 0.08, 0.12, 0.12, 0.10],
+        ["ID", "Study", "Primary category", "Max days", "Vigilance", "Habituation signal", "RoB"],
+        f"Core evidence summary (n={len(rows)}; generated from the work-level evidence map).",
+        "tab:gen-core",
+        rows,
+    )
+
+
+VIGILANCE_TABLE_FIELDS = [
+    "short_id",
+    "eligibility_tier",
+    "outcome_measure",
+    "outcome_timepoint",
+    "effect_direction",
+    "habituation_or_tolerance_signal",
+]
+
+
+def vigilance_source(vigilance_rows: Sequence[Dict[str, str]]) -> List[List[str]]:
+    return [[r.get(f) or "" for f in VIGILANCE_TABLE_FIELDS] for r in vigilance_rows]
+
+
+def render_vigilance_tex(source: List[List[str]]) -> str:
+    return _longtable(
+        [0.12, 0.10, 0.30, 0.22, 0.10, 0.10],
+        ["ID", "Tier", "Measure", "Timepoint", "Direction", "Habituation"],
+        f"Extracted vigilance outcome rows (n={len(source)}).",
+        "tab:gen-vigilance",
+        source,
+    )
+
+
+# ---- figures ----------------------------------------------------------------------------
+
+
+def _caption_sections(captions_md: str) -> Dict[str, str]:
+    """"## Fig N" heading -> caption paragraph, from S001_figure_captions.md."""
+    out: Dict[str, str] = {}
+    key: Optional[str] = None
+    for ln in captions_md.splitlines():
+        if ln.startswith("## "):
+            key = ln[3:].strip()
+        elif key and ln.strip():
+            out[key] = (out.get(key, "") + " " + ln.strip()).strip()
+    return out
+
+
+def figures_source(stats: Dict[str, Any], available: Sequence[str]) -> List[List[str]]:
+    captions = _caption_sections(render_figure_captions_md(stats))
+    return [[name, key, captions.get(key, "")] for name, key in FIGURES if name in available]
+
+
+def render_figures_tex(source: List[List[str]]) -> str:
+    lines = ["% Generated by scripts/export_latex_fragments.py; do not edit.", ""]
+    lines.append(r"\providecommand{\SynthesisFigureDir}{../output/synthesis}")
+    for name, key, caption in source:
+        stem = name[: -len(".png")]
+        lines.append("")
+        lines.append(r"\begin{figure}[p]")
+        lines.append(r"\centering")
+        lines.append(f"\\includegraphics[width=\\textwidth]{{\\SynthesisFigureDir/{stem}}}")
+        lines.append(f"\\caption{{{_md_inline_to_latex(caption)}}}\\label{{fig:gen-{key.split()[-1]}}}")
+        lines.append(r"\end{figure}")
+    return "\n".join(lines) + "\n"
+
+
+# ---- incremental write ------------------------------------------------------------------
+
+
+def build_fragments(
+    result: SynthesisResult,
+    manifest_rows: Sequence[Dict[str, str]],
+    prisma: Dict[str, Any],
+    figure_names: Sequence[str],
+) -> List[Fragment]:
+    flow = FlowIndex.from_rows(manifest_rows).flow()
+    return [
+        Fragment("S001_stats.tex", stats_source(result.stats, prisma, flow), render_stats_tex),
+        Fragment("S001_tab_core_works.tex", core_works_source(result.works), render_core_works_tex),
+        Fragment("S001_tab_vigilance_outcomes.tex", vigilance_source(result.vigilance_rows), render_vigilance_tex),
+        Fragment("S001_figures.tex", figures_source(result.stats, figure_names), render_figures_tex),
+    ]
+
+
+def write_fragments(out_dir: Path, fragments: Sequence[Fragment], force: bool = False) -> Dict[str, str]:
+    """Render and write fragments whose source hash changed; returns {name: "written" | "unchanged"}."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    state_path = out_dir / STATE_NAME
+    try:
+        state: Dict[str, str] = json.loads(state_path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        state = {}
+
+    status: Dict[str, str] = {}
+    for frag in fragments:
+        h = source_hash(frag.source)
+        path = out_dir / frag.name
+        if not force and state.get(frag.name) == h and path.exists():
+            status[frag.name] = "unchanged"
+            continue
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(frag.render(frag.source), encoding="utf-8")
+        tmp.replace(path)
+        state[frag.name] = h
+        status[frag.name] = "written"
+
+    if any(s == "written" for s in status.values()):
+        state_path.write_text(json.dumps(state, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    return status
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Write LaTeX fragments for manuscript.tex (only those whose data changed).")
+    ap.add_argument("--out", type=Path, default=FRAGMENTS_DIR)
+    ap.add_argument("--force", action="store_true", help="rewrite every fragment")
+    args = ap.parse_args(argv)
+
+    manifest_rows = read_manifest(MANIFEST_PATH)
+    result = synthesize(EVIDENCE_PATH, ROB_PATH, manifest_rows, figures=False)
+    prisma = json.loads(PRISMA_COUNTS_PATH.read_text(encoding="utf-8"))
+    figure_names = sorted(p.name for p in OUT.glob("S001_fig*.png"))
+
+    status = write_fragments(args.out, build_fragments(result, manifest_rows, prisma, figure_names), force=args.force)
+    for name, s in status.items():
+        print(f"{s:9s} {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
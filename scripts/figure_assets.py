@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Paper 3 - Figure Asset Stage (Lossless Recompression + Derivatives)
+
+Reads:
+- figures/*.png, output/synthesis/*.png          (matplotlib renders; run after synthesize_evidence.py)
+- output/assets/asset_manifest.json               (previous run; hashes decide what to skip)
+
+Writes:
+- the source PNGs, in place, only with --in-place and when a lossless re-encoding is smaller
+- output/assets/<stem>_thumb.png                  width <= THUMB_WIDTH
+- output/assets/<stem>_web.png                    width <= WEB_WIDTH
+- output/assets/asset_manifest.json               per asset: dimensions, dpi, bytes and sha256
+                                                  before/after, derivative files
+
+Lossless means pixel-identical: candidate encodings (RGBA; RGB when alpha is fully opaque; an
+exact palette when there are <= 256 colours) are decoded again and compared with the source
+pixels before one is accepted, and the smallest wins only if it beats the original file. The
+dpi (pHYs) is kept so LaTeX sizes the figures as before; the matplotlib Software text chunk is
+dropped.
+
+Sources are left untouched by default: they are committed renders that the next
+synthesize_evidence.py run overwrites anyway, so rewriting them would only churn binaries.
+The manifest records the optimized size either way; `--in-place` swaps the smaller encoding in
+(e.g. right before a release build).
+
+An asset is skipped when its current bytes hash to what the manifest recorded and its
+derivatives exist. Files with identical bytes (figures/FigureN.png and the matching
+S001_figN) are processed once. The remaining work runs on a process pool, one PNG per task.
+When nothing was rebuilt and the asset set is unchanged, the manifest is not rewritten.
+Requires Pillow, which matplotlib already depends on.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from synthesize_evidence import OUT, ROOT, _now_utc_iso, render_json
+
+
+ASSET_DIR = ROOT / "output" / "assets"
+ASSET_MANIFEST_PATH = ASSET_DIR / "asset_manifest.json"
+SOURCE_DIRS = [ROOT / "figures", OUT]
+
+THUMB_WIDTH = 320
+WEB_WIDTH = 1200
+MANIFEST_VERSION = 1
+
+
+def _sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _rel(path: Path) -> str:
+    try:
+        return str(path.resolve().relative_to(ROOT))
+    except ValueError:
+        return str(path)
+
+
+def _encode(im: Any, dpi: Optional[Tuple[float, float]]) -> bytes:
+    buf = io.BytesIO()
+    kwargs: Dict[str, Any] = {"optimize": True}
+    if dpi:
+        kwargs["dpi"] = dpi
+    im.save(buf, format="PNG", **kwargs)
+    return buf.getvalue()
+
+
+def _rgba_bytes(data: bytes) -> bytes:
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as im:
+        return im.convert("RGBA").tobytes()
+
+
+def recompress(data: bytes) -> Tuple[bytes, str]:
+    """Smallest pixel-identical PNG encoding of `data` (the input itself if nothing is smaller) and its mode."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as src:
+        src.load()
+        dpi = src.info.get("dpi")
+        rgba = src.convert("RGBA")
+    reference = rgba.tobytes()
+
+    candidates = [rgba]
+    if rgba.getextrema()[3] == (255, 255):
+        candidates.append(rgba.convert("RGB"))
+    if rgba.getcolors(256) is not None:
+        candidates.append(rgba.convert("P", palette=Image.ADAPTIVE, colors=256))
+
+    best, best_mode = data, src.mode
+    for im in candidates:
+        encoded = _encode(im, dpi)
+        if len(encoded) < len(best) and _rgba_bytes(encoded) == reference:
+            best, best_mode = encoded, im.mode
+    return best, best_mode
+
+
+def derivative(data: bytes, max_width: int) -> Tuple[bytes, int, int]:
+    """Downscaled copy (Lanczos) at most `max_width` wide; returns (png, width, height)."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as src:
+        im = src.convert("RGBA") if src.mode == "P" else src.copy()
+    if im.width > max_width:
+        im = im.resize((max_width, max(1, round(im.height * max_width / im.width))), Image.LANCZOS)
+    return _encode(im, None), im.width, im.height
+
+
+def process_asset(data: bytes) -> Dict[str, Any]:
+    """Worker: recompress one PNG and build its derivatives (bytes are returned, not written)."""
+    from PIL import Image
+
+    optimized, mode = recompress(data)
+    with Image.open(io.BytesIO(optimized)) as im:
+        width, height = im.size
+        dpi = im.info.get("dpi")
+    out: Dict[str, Any] = {
+        "optimized": optimized,
+        "width": width,
+        "height": height,
+        "mode": mode,
+        "dpi": [round(d) for d in dpi] if dpi else None,
+        "derivatives": {},
+    }
+    for kind, max_width in (("thumb", THUMB_WIDTH), ("web", WEB_WIDTH)):
+        png, w, h = derivative(optimized, max_width)
+        out["derivatives"][kind] = {"png": png, "width": w, "height": h}
+    return out
+
+
+def discover_sources(dirs: Sequence[Path] = SOURCE_DIRS) -> List[Path]:
+    paths: List[Path] = []
+    for d in dirs:
+        paths.extend(sorted(d.glob("*.png")))
+    stems: Dict[str, Path] = {}
+    for p in paths:
+        if p.stem in stems:
+            raise ValueError(f"two figures named {p.stem}: {_rel(stems[p.stem])}, {_rel(p)}")
+        stems[p.stem] = p
+    return paths
+
+
+def load_manifest(path: Path = ASSET_MANIFEST_PATH) -> Dict[str, Any]:
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+    return manifest if manifest.get("version") == MANIFEST_VERSION else {}
+
+
+def _up_to_date(entry: Optional[Dict[str, Any]], sha: str, asset_dir: Path) -> bool:
+    if not entry or entry.get("sha256") != sha:
+        return False
+    return all((asset_dir / d["file"]).exists() for d in entry.get("derivatives", {}).values())
+
+
+def run_assets(
+    sources: Sequence[Path],
+    asset_dir: Path = ASSET_DIR,
+    manifest_path: Path = ASSET_MANIFEST_PATH,
+    workers: Optional[int] = None,
+    in_place: bool = False,
+    force: bool = False,
+) -> Tuple[Dict[str, Any], List[str]]:
+    """Process changed assets on a pool; returns (new manifest, paths rebuilt this run)."""
+    previous = {} if force else load_manifest(manifest_path).get("assets", {})
+    current = {p: p.read_bytes() for p in sources}
+
+    entries: Dict[str, Any] = {}
+    todo: Dict[str, bytes] = {}  # source sha -> bytes, one task per distinct file
+    for p, data in current.items():
+        rel, sha = _rel(p), _sha(data)
+        if _up_to_date(previous.get(rel), sha, asset_dir):
+            entries[rel] = previous[rel]
+        else:
+            todo.setdefault(sha, data)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    if todo:
+        shas = list(todo)
+        with ProcessPoolExecutor(max_workers=workers or min(len(shas), os.cpu_count() or 1)) as pool:
+            for sha, res in zip(shas, pool.map(process_asset, [todo[s] for s in shas])):
+                results[sha] = res
+
+    asset_dir.mkdir(parents=True, exist_ok=True)
+    rebuilt: List[str] = []
+    for p, data in current.items():
+        rel, sha = _rel(p), _sha(data)
+        if rel in entries:
+            continue
+        rebuilt.append(rel)
+        res = results[sha]
+        optimized = res["optimized"]
+        if in_place and optimized != data:
+            tmp = p.with_suffix(".png.tmp")
+            tmp.write_bytes(optimized)
+            os.replace(tmp, p)
+        final = optimized if in_place else data
+        derivatives: Dict[str, Any] = {}
+        for kind, d in res["derivatives"].items():
+            name = f"{p.stem}_{kind}.png"
+            (asset_dir / name).write_bytes(d["png"])
+            derivatives[kind] = {
+                "file": name,
+                "width": d["width"],
+                "height": d["height"],
+                "bytes": len(d["png"]),
+                "sha256": _sha(d["png"]),
+            }
+        entries[rel] = {
+            "source_sha256": sha,
+            "source_bytes": len(data),
+            "sha256": _sha(final),
+            "bytes": len(final),
+            "optimized_bytes": len(optimized),
+            "width": res["width"],
+            "height": res["height"],
+            "mode": res["mode"],
+            "dpi": res["dpi"],
+            "derivatives": derivatives,
+        }
+
+    entries = dict(sorted(entries.items()))
+    if not rebuilt and entries == previous:
+        # Nothing changed: keep the existing manifest (and its generated_utc) byte-for-byte.
+        return load_manifest(manifest_path), rebuilt
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "generated_utc": _now_utc_iso(),
+        "thumb_width": THUMB_WIDTH,
+        "web_width": WEB_WIDTH,
+        "assets": entries,
+    }
+    manifest_path.write_text(render_json(manifest), encoding="utf-8")
+    return manifest, rebuilt
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Losslessly recompress figure PNGs and build thumbnails/web copies.")
+    ap.add_argument("--source-dir", type=Path, action="append", help="figure directory (repeatable; default figures/ and output/synthesis/)")
+    ap.add_argument("--asset-dir", type=Path, default=ASSET_DIR)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--in-place", action="store_true", help="replace source PNGs with their smaller lossless encoding")
+    ap.add_argument("--force", action="store_true", help="ignore the previous manifest")
+    args = ap.parse_args(argv)
+
+    sources = discover_sources(args.source_dir or SOURCE_DIRS)
+    manifest, rebuilt = run_assets(
+        sources,
+        asset_dir=args.asset_dir,
+        manifest_path=args.asset_dir / ASSET_MANIFEST_PATH.name,
+        workers=args.workers,
+        in_place=args.in_place,
+        force=args.force,
+    )
+    assets = manifest["assets"]
+    before = sum(a["source_bytes"] for a in assets.values())
+    after = sum(a["bytes"] for a in assets.values())
+    print(f"assets={len(assets)} rebuilt={len(rebuilt)} skipped={len(assets) - len(rebuilt)}")
+    print(f"bytes: {before} -> {after} ({100.0 * (before - after) / before if before else 0.0:.1f}% smaller)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
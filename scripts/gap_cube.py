@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Paper 3 - Sparse Gap Cube
+
+Count cube over categorical evidence dimensions (e.g. intervention category x setting x
+duration bin x arousal class x repeated-use class x outcome domain) kept in sparse form:
+each work is stored once as one value set per dimension, and only non-empty cells exist.
+Multi-valued dimensions (a work with two intervention categories) contribute every
+combination, but a work is counted at most once per cell.
+
+Gaps are the empty or thin cells of low-order projections (pairs by default) whose expected
+count under independence, N * prod(marginal_i / N), is high: every value is well studied on
+its own, but the combination is not. Candidates are enumerated in descending marginal order
+with an upper-bound prune, so the dense product of domains is never materialized.
+
+Stdlib only and independent of the synthesis script, which supplies the per-work values.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass
+from itertools import combinations, product
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+
+Cell = Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class Gap:
+    dims: Tuple[str, ...]
+    values: Tuple[str, ...]
+    observed: int
+    expected: float
+
+    @property
+    def score(self) -> float:
+        return self.expected - self.observed
+
+    @property
+    def status(self) -> str:
+        return "empty" if self.observed == 0 else "thin"
+
+
+class SparseGapCube:
+    def __init__(self, dims: Sequence[str], known_values: Optional[Mapping[str, Iterable[str]]] = None) -> None:
+        self.dims = list(dims)
+        self._dim_idx = {d: i for i, d in enumerate(self.dims)}
+        self.items: List[Tuple[Tuple[str, ...], ...]] = []
+        self.marginals: Dict[str, Counter[str]] = {d: Counter() for d in self.dims}
+        # Values expected to exist (e.g. codebook classes) even if no work has them yet.
+        self.known: Dict[str, Set[str]] = {d: set((known_values or {}).get(d, ())) for d in self.dims}
+
+    @property
+    def n(self) -> int:
+        return len(self.items)
+
+    def add(self, values: Mapping[str, Iterable[str]]) -> None:
+        """Add one work; a dimension with no values is recorded as "(missing)"."""
+        item = []
+        for d in self.dims:
+            vs = tuple(sorted({v for v in values.get(d, ()) if v})) or ("(missing)",)
+            item.append(vs)
+            self.marginals[d].update(vs)
+        self.items.append(tuple(item))
+
+    def domain(self, dim: str) -> List[str]:
+        return sorted(set(self.marginals[dim]) | self.known[dim])
+
+    def project(self, dims: Sequence[str]) -> Counter[Cell]:
+        """Work counts per cell over `dims` (only non-empty cells)."""
+        idx = [self._dim_idx[d] for d in dims]
+        out: Counter[Cell] = Counter()
+        for item in self.items:
+            out.update(product(*(item[i] for i in idx)))
+        return out
+
+    def n_cells(self) -> int:
+        return len(self.project(self.dims))
+
+    def dense_size(self) -> int:
+        size = 1
+        for d in self.dims:
+            size *= len(self.domain(d))
+        return size
+
+    def missing_values(self) -> List[Tuple[str, str]]:
+        """One-dimensional gaps: known values that no work has."""
+        return [(d, v) for d in self.dims for v in sorted(self.known[d] - set(self.marginals[d]))]
+
+    def gaps(
+        self,
+        order: int = 2,
+        thin_max: int = 1,
+        min_expected: float = 2.0,
+        exclude_values: Iterable[str] = ("(missing)",),
+        linked_dims: Iterable[Iterable[str]] = (),
+    ) -> List[Gap]:
+        """
+        Empty/thin cells (observed <= thin_max) over every `order`-subset of dims, ranked by expected - observed.
+
+        `linked_dims` lists dimension sets that are coded from each other (their "gaps" are
+        definitional); subsets containing one are skipped.
+        """
+        if self.n == 0:
+            return []
+        skip = set(exclude_values)
+        linked = [set(ds) for ds in linked_dims]
+        n = float(self.n)
+        found: List[Gap] = []
+        for dims in combinations(self.dims, order):
+            if any(ds <= set(dims) for ds in linked):
+                continue
+            observed = self.project(dims)
+            # Per dimension, (value, share of works) sorted by share desc, for the bound below.
+            ranked = [
+                sorted(((v, c / n) for v, c in self.marginals[d].items() if v not in skip), key=lambda t: (-t[1], t[0]))
+                for d in dims
+            ]
+            if any(not r for r in ranked):
+                continue
+            # best[k] = max attainable product of shares over dims k.. (first entries, as lists are sorted).
+            best = [1.0] * (order + 1)
+            for k in range(order - 1, -1, -1):
+                best[k] = best[k + 1] * ranked[k][0][1]
+
+            def walk(k: int, prefix: Tuple[str, ...], share: float) -> None:
+                if k == order:
+                    exp = n * share
+                    obs = observed.get(prefix, 0)
+                    if obs <= thin_max and exp - obs > 0:
+                        found.append(Gap(dims, prefix, obs, exp))
+                    return
+                for v, s in ranked[k]:
+                    if n * share * s * best[k + 1] < min_expected - 1e-9:
+                        break  # later values have smaller shares
+                    walk(k + 1, prefix + (v,), share * s)
+
+            walk(0, (), 1.0)
+        found.sort(key=lambda g: (-g.score, g.dims, g.values))
+        return found
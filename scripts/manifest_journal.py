@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Paper 3 - Manifest Change Journal
+
+Row-level, append-only journal for data/fulltext_processing_manifest.csv, so a triage or
+screening batch that touches a few rows appends a few lines instead of rewriting the CSV.
+
+Files (next to the manifest):
+- fulltext_processing_manifest.csv                  snapshot (as before)
+- fulltext_processing_manifest.journal.jsonl        edits since the last compaction
+- fulltext_processing_manifest.history.jsonl        every compacted edit, in order (never truncated),
+                                                    each compaction closed by a marker record
+
+Journal record (one JSON object per line):
+  {"short_id": ..., "op": "upsert" | "delete", "fields": {...}, "batch_id": ..., "ts": ...}
+Compaction marker (skipped by replay):
+  {"op": "compact", "compaction_id": ..., "snapshot_sha256": ..., "records": n, "ts": ...}
+
+`read_manifest()` returns the current state (snapshot + journal replay, snapshot row order,
+new rows appended). A delete drops the row; a later upsert of the same short_id starts a new
+row from blank fields (appended), as if it had never existed. `compact()` writes that state
+back to the CSV, moves the journal into the history log and removes it; with the snapshot
+under version control the full edit history stays reconstructable.
+
+Compaction is restartable. Its id is the hash of the journal's edit records. Before the
+snapshot is replaced, a marker carrying that id and the new snapshot's hash is appended to the
+journal. The steps are: snapshot, then history (edits plus the marker), then unlink. A retry
+after a crash skips the fold if the snapshot already matches the marker. It skips the history
+append if the log already ends with that id. So edits are neither folded twice nor duplicated
+in the history.
+
+Writers and compaction serialize on an exclusive flock() of
+fulltext_processing_manifest.journal.lock, so an edit appended while compaction runs is never
+folded-and-deleted unseen. Stdlib only, so synthesize_evidence.py can import it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import fcntl
+import hashlib
+import io
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+
+DEFAULT_MANIFEST = Path(__file__).resolve().parents[1] / "data" / "fulltext_processing_manifest.csv"
+COMPACT_AFTER_RECORDS = 500
+EDIT_OPS = {"upsert", "delete"}
+# Bytes read from the end of the history log to find its last marker.
+_HISTORY_TAIL = 1 << 16
+
+
+def journal_path(manifest: Path) -> Path:
+    return manifest.with_suffix(".journal.jsonl")
+
+
+def history_path(manifest: Path) -> Path:
+    return manifest.with_suffix(".history.jsonl")
+
+
+def lock_path(manifest: Path) -> Path:
+    return manifest.with_suffix(".journal.lock")
+
+
+@contextmanager
+def journal_lock(manifest: Path) -> Iterator[None]:
+    """Exclusive flock() shared by `append_updates` and `compact`; blocks until granted."""
+    with open(lock_path(manifest), "a+") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _manifest_ts() -> str:
+    # Same format as the manifest's existing last_updated_utc values.
+    return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+
+
+def iter_journal(path: Path) -> Iterator[Dict[str, Any]]:
+    try:
+        f = open(path, encoding="utf-8")
+    except FileNotFoundError:
+        return
+    with f:
+        for ln in f:
+            ln = ln.strip()
+            if ln:
+                yield json.loads(ln)
+
+
+def _last_record(path: Path) -> Optional[Dict[str, Any]]:
+    """Last JSON line of a (possibly large) log, read from its tail."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - _HISTORY_TAIL))
+            tail = f.read()
+    except FileNotFoundError:
+        return None
+    lines = [ln for ln in tail.splitlines() if ln.strip()]
+    return json.loads(lines[-1]) if lines else None
+
+
+def replay(
+    fieldnames: List[str], rows: List[Dict[str, str]], records: Iterable[Mapping[str, Any]]
+) -> Tuple[List[str], List[Dict[str, str]]]:
+    """Apply journal records to snapshot rows; returns (fieldnames, rows) with deleted rows dropped."""
+    fieldnames = list(fieldnames)
+    by_sid: Dict[str, Dict[str, str]] = {r["short_id"]: r for r in rows}
+    # Insertion-ordered; a deleted row leaves it and comes back (blank) at the end.
+    order: Dict[str, None] = dict.fromkeys(r["short_id"] for r in rows)
+    for rec in records:
+        if rec.get("op", "upsert") not in EDIT_OPS:
+            continue
+        sid = rec["short_id"]
+        if rec.get("op") == "delete":
+            by_sid.pop(sid, None)
+            order.pop(sid, None)
+            continue
+        row = by_sid.get(sid)
+        if row is None:
+            row = by_sid[sid] = {f: "" for f in fieldnames}
+            row["short_id"] = sid
+            order[sid] = None
+        for k, v in rec.get("fields", {}).items():
+            if k not in fieldnames:
+                fieldnames.append(k)
+                for r in by_sid.values():
+                    r.setdefault(k, "")
+            row[k] = v
+    return fieldnames, [by_sid[sid] for sid in order]
+
+
+def _read_snapshot(manifest: Path) -> Tuple[List[str], List[Dict[str, str]]]:
+    with open(manifest, newline="") as f:
+        r = csv.DictReader(f)
+        rows = list(r)
+        return list(r.fieldnames or []), rows
+
+
+def read_manifest_table(manifest: Path = DEFAULT_MANIFEST) -> Tuple[List[str], List[Dict[str, str]]]:
+    fieldnames, rows = _read_snapshot(manifest)
+    return replay(fieldnames, rows, iter_journal(journal_path(manifest)))
+
+
+def read_manifest(manifest: Path = DEFAULT_MANIFEST) -> List[Dict[str, str]]:
+    """Current manifest rows: CSV snapshot plus any journaled edits."""
+    return read_manifest_table(manifest)[1]
+
+
+def append_updates(
+    manifest: Path,
+    updates: Mapping[str, Mapping[str, str]],
+    batch_id: Optional[str] = None,
+    deletes: Sequence[str] = (),
+    stamp: bool = True,
+) -> int:
+    """
+    Journal row-level edits (short_id -> {field: value}); O(changed rows), no CSV rewrite.
+
+    `stamp` sets `last_updated_utc` (and `batch_id`, when given) on every updated row, as the
+    bulk rewrites did. Returns the number of records appended.
+    """
+    ts = _manifest_ts()
+    lines: List[str] = []
+    for sid, fields in updates.items():
+        fields = dict(fields)
+        if stamp:
+            fields["last_updated_utc"] = ts
+            if batch_id:
+                fields["batch_id"] = batch_id
+        rec = {"short_id": sid, "op": "upsert", "fields": fields, "batch_id": batch_id or "", "ts": ts}
+        lines.append(json.dumps(rec, sort_keys=True, ensure_ascii=False))
+    for sid in deletes:
+        lines.append(json.dumps({"short_id": sid, "op": "delete", "fields": {}, "batch_id": batch_id or "", "ts": ts}, sort_keys=True))
+    if not lines:
+        return 0
+    # One O_APPEND write per batch, under the journal lock so compaction cannot interleave.
+    with journal_lock(manifest):
+        fd = os.open(journal_path(manifest), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, ("\n".join(lines) + "\n").encode("utf-8"))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    return len(lines)
+
+
+def _append_line(path: Path, line: str) -> None:
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode("utf-8"))
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _sha256_file(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _compact_segment(manifest: Path, edit_lines: List[str], marker: Optional[Dict[str, Any]]) -> int:
+    """Fold one run of journal edits (closed by `marker` if an earlier attempt wrote one)."""
+    records = [json.loads(ln) for ln in edit_lines]
+    edits_text = "".join(ln + "\n" for ln in edit_lines)
+    compaction_id = hashlib.sha256(edits_text.encode("utf-8")).hexdigest()[:16]
+    if marker is not None and marker.get("compaction_id") != compaction_id:
+        raise ValueError(f"{journal_path(manifest).name}: compaction marker does not match the edits before it")
+
+    # 1. Snapshot (skipped when a previous attempt already replaced it).
+    if marker is None or _sha256_file(manifest) != marker["snapshot_sha256"]:
+        fieldnames, rows = replay(*_read_snapshot(manifest), records)
+        buf = io.StringIO(newline="")
+        w = csv.DictWriter(buf, fieldnames=fieldnames)
+        w.writeheader()
+        w.writerows(rows)
+        data = buf.getvalue().encode("utf-8")
+        if marker is None:
+            marker = {
+                "op": "compact",
+                "compaction_id": compaction_id,
+                "snapshot_sha256": hashlib.sha256(data).hexdigest(),
+                "records": len(records),
+                "ts": _manifest_ts(),
+            }
+            _append_line(journal_path(manifest), json.dumps(marker, sort_keys=True) + "\n")
+        tmp = manifest.with_suffix(".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, manifest)
+
+    # 2. History: the edits plus the marker, unless a previous attempt got that far.
+    last = _last_record(history_path(manifest))
+    if not (last and last.get("op") == "compact" and last.get("compaction_id") == compaction_id):
+        _append_line(history_path(manifest), edits_text + json.dumps(marker, sort_keys=True) + "\n")
+    return len(records)
+
+
+def compact(manifest: Path = DEFAULT_MANIFEST) -> int:
+    """Fold the journal into the CSV snapshot and move it to the history log; returns records folded."""
+    jpath = journal_path(manifest)
+    with journal_lock(manifest):
+        # Fold exactly the edits that go to the history log; no writer can append meanwhile.
+        try:
+            text = jpath.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return 0
+        # Split at markers: a marked run is an interrupted compaction, finished before the rest.
+        segments: List[Tuple[List[str], Optional[Dict[str, Any]]]] = []
+        pending: List[str] = []
+        for ln in text.splitlines():
+            if not ln.strip():
+                continue
+            rec = json.loads(ln)
+            if rec.get("op", "upsert") in EDIT_OPS:
+                pending.append(ln)
+            elif rec.get("op") == "compact":
+                segments.append((pending, rec))
+                pending = []
+        if pending:
+            segments.append((pending, None))
+        n = sum(_compact_segment(manifest, edit_lines, marker) for edit_lines, marker in segments if edit_lines)
+        # 3. Only now drop the journal.
+        jpath.unlink()
+    return n
+
+
+def maybe_compact(manifest: Path = DEFAULT_MANIFEST, max_records: int = COMPACT_AFTER_RECORDS) -> int:
+    """Compact once the journal holds more than `max_records` edits; returns records folded (0 if not)."""
+    n = sum(1 for r in iter_journal(journal_path(manifest)) if r.get("op", "upsert") in EDIT_OPS)
+    return compact(manifest) if n > max_records else 0
+
+
+def row_history(manifest: Path, short_id: str) -> List[Dict[str, Any]]:
+    """Every recorded edit for one row, oldest first (history log, then the live journal)."""
+    out = [r for r in iter_journal(history_path(manifest)) if r.get("short_id") == short_id]
+    out.extend(r for r in iter_journal(journal_path(manifest)) if r.get("short_id") == short_id)
+    return out
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Inspect or compact the manifest change journal.")
+    ap.add_argument("--manifest", type=Path, default=DEFAULT_MANIFEST)
+    ap.add_argument("--compact", action="store_true", help="fold the journal into the CSV snapshot now")
+    ap.add_argument("--history", metavar="SHORT_ID", help="print every recorded edit for one row")
+    args = ap.parse_args(argv)
+
+    if args.history:
+        for rec in row_history(args.manifest, args.history):
+            print(json.dumps(rec, sort_keys=True, ensure_ascii=False))
+        return 0
+    if args.compact:
+        print(f"compacted {compact(args.manifest)} journal records into {args.manifest.name}")
+        return 0
+    n = sum(1 for r in iter_journal(journal_path(args.manifest)) if r.get("op", "upsert") in EDIT_OPS)
+    print(f"journal records pending: {n} (auto-compaction above {COMPACT_AFTER_RECORDS})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
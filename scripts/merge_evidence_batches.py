@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Paper 3 - Evidence Batch Merge
+
+Reads:
+- data/evidence_table.csv                                     (current table; lowest precedence)
+- workflow/extraction/**/E00X_evidence_rows.csv               (per-batch extraction rows, see
+                                                               10_T2_context_cutoff_and_stopping_rule.md)
+
+Writes:
+- data/evidence_table.csv                                     (merged: current rows in their order,
+                                                               then new rows in batch order)
+- output/qa/evidence_merge_conflicts.csv                      (duplicate keys whose rows disagree)
+
+Rows are merged on (short_id, outcome_domain, outcome_measure, outcome_timepoint). Each input,
+the base table included, is split into sorted spill runs of at most RUN_ROWS rows (the
+external-sort front half shared with the vigilance ledger, `sort_into_runs`), so memory is
+bounded by the run size rather than the largest input. The runs are combined by a k-way heap
+merge; with more than FAN_IN runs, runs are merged in rounds so open files and heap size stay
+bounded.
+
+The merge only decides which rows survive; it does not set the output order. Each row carries
+its position (input index, row number). Duplicate keys with identical rows collapse to the
+first occurrence. Duplicates that differ are conflicts: by default nothing is written;
+`--on-conflict newest` puts the row from the latest input (batches sort by file name after the
+current table) at the first occurrence's position. A second sequential pass then streams the
+inputs in order, skipping dropped positions, so curated row order is kept and new keys are
+appended in batch order. Memory scales with the number of duplicates, not the table.
+
+The whole read-merge-replace runs under an exclusive lock on data/evidence_table.csv.lock, and
+batch files are read under shared locks, so concurrent merges from several reviewers serialize.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import fcntl
+import heapq
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from synthesize_evidence import EVIDENCE_PATH, ROOT, _spill_run, sort_into_runs
+
+
+BATCH_GLOB = "workflow/extraction/**/E[0-9][0-9][0-9]_evidence_rows.csv"
+CONFLICTS_PATH = ROOT / "output" / "qa" / "evidence_merge_conflicts.csv"
+FAN_IN = 32
+# Rows sorted in memory per spill run.
+RUN_ROWS = 100_000
+CONFLICT_FIELDS = ["short_id", "outcome_domain", "outcome_measure", "outcome_timepoint", "source", "kept", "differing_fields"]
+
+_SOURCE_COL = "__merge_source"
+_LINE_COL = "__merge_line"
+MergeKey = Tuple[str, str, str, str]
+# (input index, row number within that input)
+Position = Tuple[int, int]
+
+
+def merge_key(row: Dict[str, str]) -> MergeKey:
+    return (
+        (row.get("short_id") or "").strip(),
+        (row.get("outcome_domain") or "").strip().lower(),
+        (row.get("outcome_measure") or "").strip(),
+        (row.get("outcome_timepoint") or "").strip(),
+    )
+
+
+@contextmanager
+def locked(path: Path, exclusive: bool) -> Iterator[None]:
+    """flock() on `path` (created if missing); blocks until the lock is granted."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@dataclass
+class MergeReport:
+    sources: List[str]
+    rows_in: int = 0
+    rows_out: int = 0
+    duplicates_collapsed: int = 0
+    conflicts: List[Dict[str, str]] = field(default_factory=list)
+
+
+def _iter_input(path: Path, fieldnames: List[str]) -> Iterator[Dict[str, str]]:
+    with locked(path, exclusive=False), open(path, newline="") as f:
+        r = csv.DictReader(f)
+        extra = [c for c in (r.fieldnames or []) if c not in fieldnames]
+        if extra:
+            raise ValueError(f"{path}: columns not in evidence_table.csv: {', '.join(extra)}")
+        for row in r:
+            yield {c: row.get(c) or "" for c in fieldnames}
+
+
+def _make_runs(
+    path: Path, source_idx: int, fieldnames: List[str], tmpdir: Path, run_rows: int
+) -> Tuple[List[Path], int]:
+    """Sort one input by merge key into run files of at most `run_rows` rows, tagged with each row's position."""
+    counter = {"rows": 0}
+
+    def keyed() -> Iterator[Tuple[Tuple[MergeKey, int], Dict[str, str]]]:
+        for line, row in enumerate(_iter_input(path, fieldnames)):
+            counter["rows"] += 1
+            yield (merge_key(row), line), {**row, _SOURCE_COL: str(source_idx), _LINE_COL: str(line)}
+
+    run_fields = fieldnames + [_SOURCE_COL, _LINE_COL]
+    prefix = f"run_{source_idx:05d}"
+    runs, rest = sort_into_runs(keyed(), run_fields, tmpdir, run_rows, prefix)
+    if rest or not runs:
+        runs.append(_spill_run(rest, tmpdir / f"{prefix}_{len(runs):05d}.csv", run_fields))
+    return runs, counter["rows"]
+
+
+def _iter_run(path: Path) -> Iterator[Tuple[MergeKey, Position, Dict[str, str]]]:
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            yield merge_key(row), (int(row[_SOURCE_COL]), int(row[_LINE_COL])), row
+
+
+def _merge_runs(runs: Sequence[Path]) -> Iterator[Tuple[MergeKey, Position, Dict[str, str]]]:
+    # Ties on key are broken by position, so precedence survives intermediate rounds.
+    return heapq.merge(*(_iter_run(p) for p in runs), key=lambda t: (t[0], t[1]))
+
+
+def _reduce_runs(runs: List[Path], fieldnames: List[str], tmpdir: Path, fan_in: int) -> List[Path]:
+    """Merge runs in rounds of `fan_in` until one round's worth remains."""
+    round_no = 0
+    while len(runs) > fan_in:
+        merged: List[Path] = []
+        for i in range(0, len(runs), fan_in):
+            group = runs[i : i + fan_in]
+            out = tmpdir / f"round{round_no}_{i // fan_in:05d}.csv"
+            with open(out, "w", newline="") as f:
+                w = csv.DictWriter(f, fieldnames=fieldnames + [_SOURCE_COL, _LINE_COL])
+                w.writeheader()
+                for _, _, row in _merge_runs(group):
+                    w.writerow(row)
+            for p in group:
+                p.unlink()
+            merged.append(out)
+        runs = merged
+        round_no += 1
+    return runs
+
+
+def merge_evidence(
+    base: Path,
+    batches: Sequence[Path],
+    out: Path,
+    on_conflict: str = "fail",
+    fan_in: int = FAN_IN,
+    run_rows: int = RUN_ROWS,
+) -> MergeReport:
+    """Merge `batches` into `base`, writing `out` (which may be `base`) unless conflicts block it."""
+    if on_conflict not in {"fail", "newest"}:
+        raise ValueError("on_conflict must be 'fail' or 'newest'")
+    with open(base, newline="") as f:
+        fieldnames = list(csv.DictReader(f).fieldnames or [])
+    sources = [base] + sorted(batches, key=lambda p: p.name)
+    report = MergeReport(sources=[str(p) for p in sources])
+
+    with tempfile.TemporaryDirectory(prefix="evidence_merge_", dir=out.parent) as td:
+        tmpdir = Path(td)
+        runs: List[Path] = []
+        for idx, src in enumerate(sources):
+            src_runs, n = _make_runs(src, idx, fieldnames, tmpdir, run_rows)
+            runs.extend(src_runs)
+            report.rows_in += n
+        runs = _reduce_runs(runs, fieldnames, tmpdir, fan_in)
+
+        # Pass 1: decide survivors. Every group keeps its first position; later positions are
+        # dropped, and with --on-conflict newest the first position gets the newest row.
+        drop: Set[Position] = set()
+        replace: Dict[Position, Dict[str, str]] = {}
+        group: List[Tuple[Position, Dict[str, str]]] = []
+        group_key: Optional[MergeKey] = None
+
+        def flush() -> None:
+            if not group:
+                return
+            distinct = {tuple(r[c] for c in fieldnames) for _, r in group}
+            if len(distinct) > 1:
+                sid, domain, measure, timepoint = group_key or ("", "", "", "")
+                for i, (pos, r) in enumerate(group):
+                    report.conflicts.append(
+                        {
+                            "short_id": sid,
+                            "outcome_domain": domain,
+                            "outcome_measure": measure,
+                            "outcome_timepoint": timepoint,
+                            "source": str(sources[pos[0]]),
+                            "kept": "yes" if (on_conflict == "newest" and i == len(group) - 1) else "no",
+                            "differing_fields": "; ".join(c for c in fieldnames if len({g[1][c] for g in group}) > 1),
+                        }
+                    )
+                newest = group[-1][1]  # highest source index = newest input
+                if group[0][1] != newest:
+                    replace[group[0][0]] = {c: newest[c] for c in fieldnames}
+            drop.update(pos for pos, _ in group[1:])
+            report.duplicates_collapsed += len(group) - 1
+
+        for key, pos, row in _merge_runs(runs):
+            if key != group_key:
+                flush()
+                group = []
+                group_key = key
+            group.append((pos, row))
+        flush()
+
+        if report.conflicts and on_conflict == "fail":
+            return report
+
+        # Pass 2: stream the inputs in order; base rows keep their order, new keys follow in batch order.
+        tmp_out = tmpdir / "merged.csv"
+        with open(tmp_out, "w", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=fieldnames)
+            w.writeheader()
+            for idx, src in enumerate(sources):
+                for line, row in enumerate(_iter_input(src, fieldnames)):
+                    pos = (idx, line)
+                    if pos in drop:
+                        continue
+                    w.writerow(replace.get(pos, row))
+                    report.rows_out += 1
+        tmp_out.replace(out)
+    return report
+
+
+def write_conflicts_csv(path: Path, conflicts: Sequence[Dict[str, str]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=CONFLICT_FIELDS)
+        w.writeheader()
+        w.writerows(conflicts)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="K-way merge of per-batch evidence rows into evidence_table.csv.")
+    ap.add_argument("batches", nargs="*", type=Path, help=f"batch files (default: {BATCH_GLOB})")
+    ap.add_argument("--table", type=Path, default=EVIDENCE_PATH)
+    ap.add_argument("--on-conflict", choices=["fail", "newest"], default="fail")
+    ap.add_argument("--fan-in", type=int, default=FAN_IN, help="max runs merged at once")
+    ap.add_argument("--run-rows", type=int, default=RUN_ROWS, help="rows sorted in memory per spill run")
+    args = ap.parse_args(argv)
+
+    batches = args.batches or sorted(ROOT.glob(BATCH_GLOB))
+    if not batches:
+        print("no batch files found")
+        return 0
+
+    with locked(args.table.with_suffix(args.table.suffix + ".lock"), exclusive=True):
+        report = merge_evidence(
+            args.table, batches, args.table, on_conflict=args.on_conflict, fan_in=args.fan_in, run_rows=args.run_rows
+        )
+
+    if report.conflicts:
+        write_conflicts_csv(CONFLICTS_PATH, report.conflicts)
+    print(
+        f"sources={len(report.sources)} rows_in={report.rows_in} rows_out={report.rows_out} "
+        f"duplicates={report.duplicates_collapsed} conflict_rows={len(report.conflicts)}"
+    )
+    if report.conflicts and args.on_conflict == "fail":
+        print(f"conflicts found; {args.table.name} left unchanged (see {CONFLICTS_PATH.relative_to(ROOT)})")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Paper 3 - T2_context Novelty Monitor (Stopping Rule)
+
+Reads:
+- data/evidence_table.csv                   rows appended since the last run only
+- data/fulltext_processing_manifest.csv     extraction batch (`extract:E00X` in notes) and tier per work
+
+Writes:
+- output/synthesis/S001_t2_novelty.json     per-batch novelty and stopping-rule status
+- .cache/novelty_state.json                 first-seen batch per signature hash, read offset, prefix check
+                                            and batch-map digest (incremental state)
+
+Applies the stopping rule of workflow/extraction/10_T2_context_cutoff_and_stopping_rule.md:
+stop extracting T2_context when a batch (~5 papers) adds no new intervention category,
+repeated-use timescale or habituation/tolerance pattern, twice in a row.
+
+Every evidence row maps to a signature (intervention_category, outcome_measure, setting class,
+duration bin, habituation signal). The state maps each 16-hex hash, per signature dimension and
+for whole signatures, to the earliest batch (in batch order, unbatched rows last) that contains
+it; a batch's novelty is the set of values first seen in it. Attribution therefore does not
+depend on where rows sit in the file. The evidence table is append-only between merges, so
+each run seeks to the stored byte offset and parses only the new rows. Appends are validated
+in bounded time: the file must be at least `offset` bytes and the first and last
+CHECK_WINDOW bytes before the offset must hash as stored (an edit elsewhere in the prefix is
+not detected; `--full` rebuilds). The state also records a digest of the batch and tier
+of every work already read, so rows read before their `extract:E00X` tag reached the manifest
+are re-credited: a change for any of those works rebuilds the state from the whole table.
+
+T1_core batches seed the sets but are not judged; the rule looks at T2_context batches in
+batch order. By default outcome measures are reported but not part of the rule (free-text
+measures are nearly always new); `--rule-dims` changes that.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from manifest_journal import read_manifest
+from synthesize_evidence import (
+    CACHE,
+    EVIDENCE_PATH,
+    MANIFEST_PATH,
+    OUT,
+    _duration_bin,
+    _exposure_end_days,
+    _setting_class,
+    render_json,
+)
+
+
+NOVELTY_JSON_PATH = OUT / "S001_t2_novelty.json"
+STATE_PATH = CACHE / "novelty_state.json"
+
+SIGNATURE_DIMENSIONS = ["intervention_category", "outcome_measure", "setting", "duration_bin", "habituation_pattern"]
+# The three "no new ..." conditions of the authoritative stopping rule.
+DEFAULT_RULE_DIMENSIONS = ["intervention_category", "duration_bin", "habituation_pattern"]
+SATURATED_BATCHES_TO_STOP = 2
+STATE_VERSION = 3
+# Bytes hashed at each end of the already-read prefix to validate that the table was only appended to.
+CHECK_WINDOW = 64 * 1024
+UNBATCHED = "(unbatched)"
+
+_EXTRACT_RE = re.compile(r"extract:(E\d+)")
+
+
+def _h(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def _norm(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+
+def row_signature(row: Mapping[str, str]) -> Dict[str, str]:
+    category = _norm(row.get("intervention_category", "")) or "(missing)"
+    return {
+        "intervention_category": category,
+        "outcome_measure": _norm(row.get("outcome_measure", "")) or "(missing)",
+        "setting": _setting_class(row.get("setting", "")) or "(missing)",
+        "duration_bin": _duration_bin(_exposure_end_days(row.get("exposure_duration_days", ""))) or "(missing)",
+        # Habituation pattern = signal within an intervention category ("caffeine: yes").
+        "habituation_pattern": f"{category}: {_norm(row.get('habituation_or_tolerance_signal', '')) or '(missing)'}",
+    }
+
+
+def extraction_batches(manifest_rows: Sequence[Mapping[str, str]]) -> Dict[str, Tuple[str, str]]:
+    """short_id -> (extraction batch id, eligibility tier) from manifest notes."""
+    out: Dict[str, Tuple[str, str]] = {}
+    for r in manifest_rows:
+        m = _EXTRACT_RE.search(r.get("notes") or "")
+        out[r["short_id"]] = (m.group(1) if m else UNBATCHED, (r.get("eligibility_tier") or "").strip())
+    return out
+
+
+def _batch_order(batch_id: str) -> Tuple[int, str]:
+    return (1 if batch_id == UNBATCHED else 0, batch_id)
+
+
+def _empty_state() -> Dict[str, Any]:
+    return {
+        "version": STATE_VERSION,
+        "offset": 0,
+        "prefix_check": "",
+        "batches_sha": "",
+        "header": [],
+        # dimension -> hash -> [first batch id, value]
+        "first_seen": {d: {} for d in SIGNATURE_DIMENSIONS + ["signature"]},
+        "batches": {},
+    }
+
+
+class NoveltyMonitor:
+    def __init__(self, state: Optional[Dict[str, Any]] = None) -> None:
+        self.state = state or _empty_state()
+        self.first_seen: Dict[str, Dict[str, List[str]]] = self.state["first_seen"]
+
+    def _credit(self, dim: str, h: str, value: str, batch_id: str) -> None:
+        first = self.first_seen[dim].get(h)
+        if first is None or _batch_order(batch_id) < _batch_order(first[0]):
+            self.first_seen[dim][h] = [batch_id, value]
+
+    def observe(self, row: Mapping[str, str], batch_id: str, tier: str) -> None:
+        sig = row_signature(row)
+        b = self.state["batches"].setdefault(batch_id, {"tiers": {}, "papers": [], "rows": 0})
+        b["rows"] += 1
+        b["tiers"][tier or "(missing)"] = b["tiers"].get(tier or "(missing)", 0) + 1
+        sid = (row.get("short_id") or "").strip()
+        if sid not in b["papers"]:
+            b["papers"].append(sid)
+        for d in SIGNATURE_DIMENSIONS:
+            self._credit(d, _h(d, sig[d]), sig[d], batch_id)
+        self._credit("signature", _h(*(sig[d] for d in SIGNATURE_DIMENSIONS)), "", batch_id)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return self.state
+
+
+def _prefix_check(path: Path, offset: int) -> str:
+    """Hash of the first and last CHECK_WINDOW bytes of `path[:offset]` (with the offset itself)."""
+    h = hashlib.sha256(str(offset).encode("ascii"))
+    with open(path, "rb") as f:
+        h.update(f.read(min(offset, CHECK_WINDOW)))
+        tail = max(min(offset, CHECK_WINDOW), offset - CHECK_WINDOW)
+        f.seek(tail)
+        h.update(f.read(offset - tail))
+    return h.hexdigest()
+
+
+def _seen_ids(state: Mapping[str, Any]) -> List[str]:
+    return sorted({sid for b in state["batches"].values() for sid in b["papers"]})
+
+
+def batches_sha(batches: Mapping[str, Tuple[str, str]], short_ids: Sequence[str]) -> str:
+    """Digest of the (batch, tier) assignment of the works already read."""
+    pairs = [[sid, list(batches.get(sid, (UNBATCHED, "")))] for sid in short_ids]
+    return hashlib.sha256(json.dumps(pairs, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _state_valid(state: Dict[str, Any], path: Path, batches: Mapping[str, Tuple[str, str]]) -> bool:
+    if state.get("version") != STATE_VERSION or not state.get("header"):
+        return False
+    if state.get("batches_sha") != batches_sha(batches, _seen_ids(state)):
+        return False
+    offset = state["offset"]
+    return path.stat().st_size >= offset and _prefix_check(path, offset) == state["prefix_check"]
+
+
+def _read_new_rows(path: Path, state: Dict[str, Any]) -> Tuple[List[Dict[str, str]], int]:
+    """Rows after the stored offset (whole lines only) and the offset after them."""
+    with open(path, "rb") as f:
+        f.seek(state["offset"])
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    text = data[:end].decode("utf-8")
+    if not state["header"]:
+        reader = csv.DictReader(io.StringIO(text, newline=""))
+        rows = list(reader)
+        state["header"] = list(reader.fieldnames or [])
+    else:
+        rows = list(csv.DictReader(io.StringIO(text, newline=""), fieldnames=state["header"]))
+    return rows, state["offset"] + end
+
+
+def load_state(path: Path = STATE_PATH) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_state(state: Dict[str, Any], path: Path = STATE_PATH) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def update(
+    evidence: Path,
+    batches: Mapping[str, Tuple[str, str]],
+    state: Optional[Dict[str, Any]] = None,
+) -> Tuple[Dict[str, Any], int, str]:
+    """Feed rows appended since `state` into the monitor; returns (state, rows read, "incremental" | "full")."""
+    mode = "incremental"
+    if state is None or not _state_valid(state, evidence, batches):
+        state, mode = _empty_state(), "full"
+    mon = NoveltyMonitor(state)
+    rows, offset = _read_new_rows(evidence, mon.state)
+    for r in rows:
+        batch_id, tier = batches.get((r.get("short_id") or "").strip(), (UNBATCHED, ""))
+        mon.observe(r, batch_id, tier)
+    state = mon.snapshot()
+    state["offset"] = offset
+    state["prefix_check"] = _prefix_check(evidence, offset)
+    state["batches_sha"] = batches_sha(batches, _seen_ids(state))
+    return state, len(rows), mode
+
+
+def stopping_report(
+    state: Mapping[str, Any],
+    rule_dims: Sequence[str] = DEFAULT_RULE_DIMENSIONS,
+    to_stop: int = SATURATED_BATCHES_TO_STOP,
+) -> Dict[str, Any]:
+    """Per-batch novelty and whether the last `to_stop` T2_context batches were all saturated."""
+    # Values first seen in each batch (sorted, so the report does not depend on row order).
+    new: Dict[str, Dict[str, List[str]]] = {b: {d: [] for d in SIGNATURE_DIMENSIONS} for b in state["batches"]}
+    new_signatures: Counter[str] = Counter()
+    for d in SIGNATURE_DIMENSIONS:
+        for batch_id, value in sorted(state["first_seen"][d].values(), key=lambda bv: bv[1]):
+            new[batch_id][d].append(value)
+    for batch_id, _ in state["first_seen"]["signature"].values():
+        new_signatures[batch_id] += 1
+
+    batches: List[Dict[str, Any]] = []
+    run = 0
+    for batch_id in sorted(state["batches"], key=_batch_order):
+        b = state["batches"][batch_id]
+        tier = Counter(b["tiers"]).most_common(1)[0][0]
+        new_counts = {d: len(new[batch_id][d]) for d in SIGNATURE_DIMENSIONS}
+        judged = tier == "T2_context" and batch_id != UNBATCHED
+        saturated = judged and not any(new_counts[d] for d in rule_dims)
+        if judged:
+            run = run + 1 if saturated else 0
+        batches.append(
+            {
+                "batch_id": batch_id,
+                "tier": tier,
+                "papers": len(b["papers"]),
+                "rows": b["rows"],
+                "new_signatures": new_signatures[batch_id],
+                "new_counts": new_counts,
+                "new_values": {d: new[batch_id][d] for d in rule_dims if new[batch_id][d]},
+                "judged": judged,
+                "saturated": saturated,
+            }
+        )
+    return {
+        "rule_dimensions": list(rule_dims),
+        "saturated_batches_to_stop": to_stop,
+        "consecutive_saturated_t2_batches": run,
+        "stop_t2_extraction": run >= to_stop,
+        "distinct_values": {d: len(state["first_seen"][d]) for d in SIGNATURE_DIMENSIONS},
+        "distinct_signatures": len(state["first_seen"]["signature"]),
+        "batches": batches,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Track T2_context extraction novelty and apply the stopping rule.")
+    ap.add_argument("--evidence", type=Path, default=EVIDENCE_PATH)
+    ap.add_argument("--manifest", type=Path, default=MANIFEST_PATH)
+    ap.add_argument("--state", type=Path, default=STATE_PATH)
+    ap.add_argument("--full", action="store_true", help="discard the state and re-read the whole table")
+    ap.add_argument(
+        "--rule-dims",
+        nargs="+",
+        choices=SIGNATURE_DIMENSIONS,
+        default=DEFAULT_RULE_DIMENSIONS,
+        help="dimensions that must add nothing new for a batch to count as saturated",
+    )
+    args = ap.parse_args(argv)
+
+    state = None if args.full else load_state(args.state)
+    state, n_rows, mode = update(args.evidence, extraction_batches(read_manifest(args.manifest)), state)
+    save_state(state, args.state)
+    report = stopping_report(state, rule_dims=args.rule_dims)
+
+    OUT.mkdir(parents=True, exist_ok=True)
+    NOVELTY_JSON_PATH.write_text(render_json(report), encoding="utf-8")
+
+    print(f"read={mode} new_rows={n_rows} batches={len(report['batches'])} signatures={report['distinct_signatures']}")
+    for b in report["batches"]:
+        flag = ("saturated" if b["saturated"] else "novel") if b["judged"] else "seed"
+        new = " ".join(f"{d}+{n}" for d, n in b["new_counts"].items() if n)
+        print(f"  {b['batch_id']} {b['tier']} papers={b['papers']} rows={b['rows']} {flag}: {new or 'nothing new'}")
+    if report["stop_t2_extraction"]:
+        print(f"STOP: {report['consecutive_saturated_t2_batches']} consecutive saturated T2_context batches")
+    else:
+        print(f"continue: {report['consecutive_saturated_t2_batches']}/{SATURATED_BATCHES_TO_STOP} consecutive saturated T2_context batches")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Paper 3 - Page-Level Full-Text Cache
+
+Persistent store of extracted PDF page text, keyed by `pdf_sha256_16` (the same 16-hex-char
+SHA-256 prefix carried in data/evidence_table.csv). Full-text PDFs are local-only, so the
+store lives under .cache/pages/ and is never part of the public bundle.
+
+On-disk layout, one file per PDF (`<sha16>.pages`):
+- magic b"PGS1", uint32 page count N (little-endian)
+- N+1 uint64 byte offsets into the text block
+- UTF-8 page texts, concatenated
+
+`PageStore.open()` memory-maps a file so single pages can be read without loading the rest.
+An index (`index.json`) maps PDF path -> (size, mtime_ns, sha16) so unchanged PDFs are not
+re-hashed on every run.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from synthesize_evidence import CACHE
+
+
+PAGES_DIR = CACHE / "pages"
+
+_MAGIC = b"PGS1"
+_HEADER = struct.Struct("<4sI")
+
+
+def sha256_16(path: Path, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()[:16]
+
+
+class MappedPages:
+    """Read-only memory-mapped view of one `.pages` file; pages are decoded on access only."""
+
+    def __init__(self, path: Path) -> None:
+        self._f = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped.
+            self._f.close()
+            raise ValueError(f"{path}: not a page store file")
+        magic, n = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            self.close()
+            raise ValueError(f"{path}: not a page store file")
+        self.n_pages = n
+        self._offsets = struct.unpack_from(f"<{n + 1}Q", self._mm, _HEADER.size)
+        self._base = _HEADER.size + 8 * (n + 1)
+
+    def page(self, page_no: int) -> Optional[str]:
+        """Text of a 1-based PDF page (the numbering used in evidence anchors), or None if out of range."""
+        i = page_no - 1
+        if i < 0 or i >= self.n_pages:
+            return None
+        return self._mm[self._base + self._offsets[i] : self._base + self._offsets[i + 1]].decode("utf-8")
+
+    def pages(self, page_nos: Iterable[int]) -> Dict[int, str]:
+        out: Dict[int, str] = {}
+        for p in page_nos:
+            txt = self.page(p)
+            if txt is not None:
+                out[p] = txt
+        return out
+
+    def close(self) -> None:
+        self._mm.close()
+        self._f.close()
+
+    def __enter__(self) -> "MappedPages":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+class PageStore:
+    def __init__(self, root: Path = PAGES_DIR) -> None:
+        self.root = root
+        self.index_path = root / "index.json"
+
+    def path_for(self, sha16: str) -> Path:
+        return self.root / f"{sha16}.pages"
+
+    def has(self, sha16: str) -> bool:
+        return self.path_for(sha16).exists()
+
+    def put(self, sha16: str, pages: Sequence[str]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        blobs = [p.encode("utf-8") for p in pages]
+        offsets = [0]
+        for b in blobs:
+            offsets.append(offsets[-1] + len(b))
+        tmp = self.path_for(sha16).with_suffix(f".tmp{os.getpid()}")
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, len(blobs)))
+            f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+            for b in blobs:
+                f.write(b)
+        tmp.replace(self.path_for(sha16))
+
+    def get(self, sha16: str) -> Optional[List[str]]:
+        """All page texts for a PDF (0-based list), or None if not cached."""
+        try:
+            raw = self.path_for(sha16).read_bytes()
+        except FileNotFoundError:
+            return None
+        magic, n = _HEADER.unpack_from(raw, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{self.path_for(sha16)}: not a page store file")
+        offsets = struct.unpack_from(f"<{n + 1}Q", raw, _HEADER.size)
+        base = _HEADER.size + 8 * (n + 1)
+        return [raw[base + offsets[i] : base + offsets[i + 1]].decode("utf-8") for i in range(n)]
+
+    def open(self, sha16: str) -> Optional[MappedPages]:
+        """Memory-map a cached PDF for page-level access, or None if not cached."""
+        path = self.path_for(sha16)
+        if not path.exists():
+            return None
+        return MappedPages(path)
+
+    def load_index(self) -> Dict[str, List]:
+        try:
+            return json.loads(self.index_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+
+    def save_index(self, index: Dict[str, List]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(index, indent=2, sort_keys=True), encoding="utf-8")
+        tmp.replace(self.index_path)
+
+    def indexed_sha16(self, pdf_path: Path, index: Dict[str, List]) -> Optional[str]:
+        """The indexed hash of a PDF while its size and mtime are unchanged, else None."""
+        hit = index.get(str(pdf_path))
+        if not hit:
+            return None
+        try:
+            st = pdf_path.stat()
+        except FileNotFoundError:
+            return None
+        if hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+            return hit[2]
+        return None
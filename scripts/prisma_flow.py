@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Paper 3 - PRISMA 2020 Flow from the Manifest
+
+Reads:
+- data/fulltext_processing_manifest.csv (+ .journal.jsonl)   retrieval and full-text stages
+- data/prisma_counts.json                                   identification and title/abstract stages
+
+Writes (under output/synthesis/):
+- S001_prisma_flow.json   flow counts, exclusion reasons and reconciliation checks
+- S001_prisma_flow.png    PRISMA 2020 flow diagram
+- data/prisma_counts.json `fulltext_flow` block (only with --update-counts)
+- protocol/03_prisma_flow_and_reporting_text.md   the generated blocks between
+  `<!-- prisma_flow.py:begin NAME -->` / `<!-- prisma_flow.py:end NAME -->` markers
+  (flow-counts, flow-results), rewritten from the derived flow
+
+Every retrieval/full-text count is derived from four manifest columns: `pdf_status`,
+`fulltext_screen_status`, `fulltext_exclusion_reason` and `eligibility_tier`. The index maps
+short_id -> that 4-tuple and keeps a Counter over tuples in step, so the flow is computed from
+the (few) distinct tuples rather than the rows, and an edited row moves one count.
+
+The index is cached in .cache/prisma_flow_index.json with the manifest CSV's size/mtime and
+the byte offset read in the journal. While the CSV is unchanged, a run only replays journal
+records appended since the last run; a changed CSV (e.g. after compaction) triggers one full
+pass. Reconciliation against prisma_counts.json runs on every build.
+
+The protocol's retrieval and full-text numbers live only in the generated blocks, so the prose
+cannot drift from S001_prisma_flow.json; with `--no-protocol` the file is left alone and
+`--strict` also fails when a block is stale or missing.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from manifest_journal import journal_path, read_manifest_table
+from synthesize_evidence import CACHE, MANIFEST_PATH, OUT, PRISMA_COUNTS_PATH, PRISMA_FLOW_PATH, _fig_png, render_json
+
+
+FLOW_JSON_PATH = OUT / "S001_prisma_flow.json"
+FLOW_PNG_PATH = OUT / "S001_prisma_flow.png"
+INDEX_CACHE_PATH = CACHE / "prisma_flow_index.json"
+
+PROTOCOL_BLOCKS = ("flow-counts", "flow-results")
+_BLOCK_RE = re.compile(
+    r"(<!-- prisma_flow\.py:begin (?P<name>[\w-]+) -->\n)(?P<body>.*?)(<!-- prisma_flow\.py:end (?P=name) -->)", re.S
+)
+
+KEY_FIELDS = ("pdf_status", "fulltext_screen_status", "fulltext_exclusion_reason", "eligibility_tier")
+FlowKey = Tuple[str, str, str, str]
+_BLANK: FlowKey = ("", "", "", "")
+
+
+class FlowIndex:
+    """short_id -> (pdf_status, screen status, exclusion reason, tier), with tuple counts kept in step."""
+
+    def __init__(self) -> None:
+        self.keys: Dict[str, FlowKey] = {}
+        self.counts: Counter[FlowKey] = Counter()
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Mapping[str, str]]) -> "FlowIndex":
+        idx = cls()
+        for r in rows:
+            idx.upsert(r["short_id"], r)
+        return idx
+
+    def upsert(self, short_id: str, fields: Mapping[str, Any]) -> None:
+        """Set a row's flow fields; fields not given keep their previous value (journal semantics)."""
+        old = self.keys.get(short_id)
+        base = old or _BLANK
+        new: FlowKey = tuple(  # type: ignore[assignment]
+            str(fields[f]).strip() if f in fields and fields[f] is not None else base[i]
+            for i, f in enumerate(KEY_FIELDS)
+        )
+        if old == new:
+            return
+        if old is not None:
+            self._dec(old)
+        self.keys[short_id] = new
+        self.counts[new] += 1
+
+    def delete(self, short_id: str) -> None:
+        old = self.keys.pop(short_id, None)
+        if old is not None:
+            self._dec(old)
+
+    def _dec(self, key: FlowKey) -> None:
+        self.counts[key] -= 1
+        if not self.counts[key]:
+            del self.counts[key]
+
+    def apply(self, records: Iterable[Mapping[str, Any]]) -> int:
+        """Apply manifest journal records; returns how many were applied."""
+        n = 0
+        for rec in records:
+            if rec.get("op") == "delete":
+                self.delete(rec["short_id"])
+            else:
+                self.upsert(rec["short_id"], rec.get("fields", {}))
+            n += 1
+        return n
+
+    def flow(self) -> Dict[str, Any]:
+        sought = retrieved = included = excluded = pending = included_no_fulltext = 0
+        reasons: Counter[str] = Counter()
+        tiers: Counter[str] = Counter()
+        screen: Counter[str] = Counter()
+        for (pdf, status, reason, tier), n in self.counts.items():
+            sought += n
+            screen[status or "(blank)"] += n
+            got = pdf == "downloaded"
+            retrieved += n if got else 0
+            if status == "include":
+                included += n
+                tiers[tier or "(missing)"] += n
+                included_no_fulltext += 0 if got else n
+            elif got and status == "exclude":
+                excluded += n
+                reasons[reason or "(unspecified)"] += n
+            elif got:
+                pending += n
+        return {
+            "reports_sought_for_retrieval": sought,
+            "reports_not_retrieved": sought - retrieved,
+            "reports_assessed_for_eligibility": retrieved,
+            "reports_excluded_fulltext": excluded,
+            "fulltext_exclusion_reasons": dict(sorted(reasons.items(), key=lambda kv: (-kv[1], kv[0]))),
+            "reports_pending_fulltext_screen": pending,
+            "studies_included": included,
+            "studies_included_by_tier": dict(sorted(tiers.items())),
+            "studies_included_without_fulltext": included_no_fulltext,
+            "fulltext_screen_status_counts": dict(sorted(screen.items())),
+        }
+
+
+# ---- incremental index ------------------------------------------------------------------
+
+
+def _csv_stamp(manifest: Path) -> Dict[str, int]:
+    st = manifest.stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _read_journal_from(path: Path, offset: int) -> Tuple[List[Dict[str, Any]], int]:
+    """Journal records after byte `offset`, and the new offset (only whole lines are consumed)."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return [], 0
+    with f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    records = [json.loads(ln) for ln in data[:end].decode("utf-8").splitlines() if ln.strip()]
+    return records, offset + end
+
+
+def load_index(manifest: Path = MANIFEST_PATH, cache: Optional[Path] = INDEX_CACHE_PATH) -> Tuple[FlowIndex, str]:
+    """Flow index for the manifest's current state; returns (index, "incremental" | "full")."""
+    jpath = journal_path(manifest)
+    stamp = _csv_stamp(manifest)
+    state: Optional[Dict[str, Any]] = None
+    if cache is not None:
+        try:
+            state = json.loads(cache.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            state = None
+    j_size = jpath.stat().st_size if jpath.exists() else 0
+
+    if state and state.get("manifest") == stamp and state.get("journal_offset", 0) <= j_size:
+        idx = FlowIndex()
+        for sid, key in state["keys"].items():
+            idx.upsert(sid, dict(zip(KEY_FIELDS, key)))
+        records, offset = _read_journal_from(jpath, state["journal_offset"])
+        idx.apply(records)
+        mode = "incremental"
+    else:
+        # Full pass: snapshot + whole journal; the offset covers what that replay consumed.
+        _, rows = read_manifest_table(manifest)
+        idx = FlowIndex.from_rows(rows)
+        offset = j_size
+        mode = "full"
+
+    if cache is not None:
+        cache.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache.with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps({"manifest": stamp, "journal_offset": offset, "keys": idx.keys}, sort_keys=True),
+            encoding="utf-8",
+        )
+        os.replace(tmp, cache)
+    return idx, mode
+
+
+# ---- identification + reconciliation -----------------------------------------------------
+
+
+def identification_counts(prisma: Mapping[str, Any]) -> Dict[str, Any]:
+    by_source = {"seed": int(prisma.get("records_identified_seed_raw", 0))}
+    for k in sorted(prisma):
+        if k.startswith("records_identified_hop") and k.endswith("_raw"):
+            by_source["hop" + k[len("records_identified_hop") : -len("_raw")]] = int(prisma[k])
+    total = sum(by_source.values())
+    unique = int(prisma.get("records_total_unique_after_dedup", 0))
+    return {
+        "records_identified_by_source": by_source,
+        "records_identified_total": total,
+        "duplicates_removed": total - unique,
+        "records_screened_title_abstract": int(prisma.get("records_screened_title_abstract", 0)),
+        "records_excluded_title_abstract": int(prisma.get("records_excluded_title_abstract", 0)),
+    }
+
+
+def reconcile(flow: Mapping[str, Any], prisma: Mapping[str, Any]) -> List[Dict[str, Any]]:
+    """Compare manifest-derived counts with every overlapping figure recorded in prisma_counts.json."""
+    sought = flow["reports_sought_for_retrieval"]
+    checks: List[Tuple[str, Any, Any]] = []
+    if "reports_sought_for_retrieval" in prisma:
+        checks.append(("reports_sought_for_retrieval", prisma["reports_sought_for_retrieval"], sought))
+    if "studies_included_title_abstract_stage" in prisma:
+        checks.append(("studies_included_title_abstract_stage", prisma["studies_included_title_abstract_stage"], sought))
+    if "records_screened_title_abstract" in prisma and "records_excluded_title_abstract" in prisma:
+        checks.append(
+            (
+                "records_screened_title_abstract - records_excluded_title_abstract",
+                int(prisma["records_screened_title_abstract"]) - int(prisma["records_excluded_title_abstract"]),
+                sought,
+            )
+        )
+    for k, v in (prisma.get("fulltext_flow") or {}).items():
+        if k in flow:
+            checks.append((f"fulltext_flow.{k}", v, flow[k]))
+    return [{"check": name, "recorded": rec, "derived": der, "ok": rec == der} for name, rec, der in checks]
+
+
+def update_prisma_counts(path: Path, flow: Mapping[str, Any]) -> Dict[str, Any]:
+    counts: Dict[str, Any] = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+    counts["fulltext_flow"] = dict(flow)
+    path.write_text(json.dumps(counts, indent=2) + "\n", encoding="utf-8")
+    return counts
+
+
+def build_flow(index: FlowIndex, prisma: Mapping[str, Any]) -> Dict[str, Any]:
+    flow = index.flow()
+    return {
+        "identification": identification_counts(prisma),
+        "fulltext": flow,
+        "reconciliation": reconcile(flow, prisma),
+    }
+
+
+# ---- protocol text ---------------------------------------------------------------------
+
+
+def render_protocol_blocks(flow: Mapping[str, Any]) -> Dict[str, str]:
+    """Generated protocol text per block name, from the derived flow."""
+    ft = flow["fulltext"]
+    tiers = ", ".join(f"{n:,} `{t}`" for t, n in ft["studies_included_by_tier"].items())
+    counts = [
+        f"- Reports sought for full-text retrieval: {ft['reports_sought_for_retrieval']:,}",
+        f"- Reports not retrieved (manifest `pdf_status` not `downloaded`): {ft['reports_not_retrieved']:,}",
+        f"- Reports assessed for eligibility (full text): {ft['reports_assessed_for_eligibility']:,}",
+        f"- Reports excluded at full text: {ft['reports_excluded_fulltext']:,}",
+        f"- Studies included: {ft['studies_included']:,} ({tiers})",
+    ]
+    if ft["reports_pending_fulltext_screen"]:
+        counts.append(f"- Reports pending a full-text decision: {ft['reports_pending_fulltext_screen']:,}")
+    results = (
+        f"Full-text retrieval was attempted for all {ft['reports_sought_for_retrieval']:,} included records, with an "
+        "initial retrieval pass followed by automated resolver retries; after full-text QA, "
+        f"{ft['reports_assessed_for_eligibility']:,} reports were retrieved and {ft['reports_not_retrieved']:,} were not "
+        "retrieved due to access restrictions, missing/invalid full-text links, unresolved host-level failures, or "
+        "downloaded files that did not match the record. "
+        f"Of the {ft['reports_assessed_for_eligibility']:,} reports assessed for eligibility, "
+        f"{ft['reports_excluded_fulltext']:,} were excluded at full text and {ft['studies_included']:,} studies were "
+        f"included ({tiers})."
+    )
+    return {"flow-counts": "\n".join(counts) + "\n", "flow-results": results + "\n"}
+
+
+def sync_protocol_text(text: str, blocks: Mapping[str, str]) -> Tuple[str, List[str], List[str]]:
+    """(text with the marked blocks replaced, names of stale blocks, names of missing blocks)."""
+    stale: List[str] = []
+    found: List[str] = []
+
+    def sub(m: "re.Match[str]") -> str:
+        name = m.group("name")
+        if name not in blocks:
+            return m.group(0)
+        found.append(name)
+        if m.group("body") != blocks[name]:
+            stale.append(name)
+        return m.group(1) + blocks[name] + m.group(4)
+
+    new = _BLOCK_RE.sub(sub, text)
+    return new, stale, [name for name in blocks if name not in found]
+
+
+# ---- figure -----------------------------------------------------------------------------
+
+
+def render_prisma_png(flow: Mapping[str, Any]) -> bytes:
+    """PRISMA 2020 flow diagram (main flow left, exclusions right)."""
+    # Local import so the script still runs in environments without mpl.
+    import matplotlib.pyplot as plt
+
+    ident, ft = flow["identification"], flow["fulltext"]
+    src = "\n".join(f"  {k}: n = {v:,}" for k, v in ident["records_identified_by_source"].items())
+    reasons = "\n".join(f"  {r.replace('_', ' ')}: n = {n:,}" for r, n in ft["fulltext_exclusion_reasons"].items())
+    tiers = "; ".join(f"{t}: {n:,}" for t, n in ft["studies_included_by_tier"].items())
+    included = f"Studies included\nn = {ft['studies_included']:,}\n({tiers})"
+    if ft["reports_pending_fulltext_screen"]:
+        included += f"\nPending full-text decision: n = {ft['reports_pending_fulltext_screen']:,}"
+
+    # (stage, main box, side box)
+    rows = [
+        ("Identification", f"Records identified (OpenAlex)\nn = {ident['records_identified_total']:,}\n{src}",
+         f"Duplicates removed\nn = {ident['duplicates_removed']:,}"),
+        ("Screening", f"Records screened (title/abstract)\nn = {ident['records_screened_title_abstract']:,}",
+         f"Records excluded\nn = {ident['records_excluded_title_abstract']:,}"),
+        ("", f"Reports sought for retrieval\nn = {ft['reports_sought_for_retrieval']:,}",
+         f"Reports not retrieved\nn = {ft['reports_not_retrieved']:,}"),
+        ("", f"Reports assessed for eligibility\nn = {ft['reports_assessed_for_eligibility']:,}",
+         f"Reports excluded\nn = {ft['reports_excluded_fulltext']:,}\n{reasons}"),
+        ("Included", included, None),
+    ]
+    heights = [1.5, 1.0, 1.0, max(1.0, 0.22 * (len(ft["fulltext_exclusion_reasons"]) + 2)), 1.2]
+    gap = 0.45
+    total = sum(heights) + gap * (len(rows) - 1)
+
+    fig, ax = plt.subplots(figsize=(10, 0.95 * total + 0.6))
+    ax.set_xlim(0, 10)
+    ax.set_ylim(0, total)
+    ax.axis("off")
+    box = dict(boxstyle="square,pad=0.5", facecolor="white", edgecolor="black", lw=1)
+    arrow = dict(arrowstyle="-|>", color="black", lw=1)
+
+    y = total
+    prev_bottom: Optional[float] = None
+    for (stage, main, side), h in zip(rows, heights):
+        mid = y - h / 2
+        if stage:
+            ax.text(0.25, mid, stage, rotation=90, ha="center", va="center", fontsize=9, fontweight="bold",
+                    bbox=dict(boxstyle="round,pad=0.4", facecolor="#cfe2f3", edgecolor="none"))
+        ax.text(2.9, mid, main, ha="center", va="center", fontsize=8, bbox=box, multialignment="left")
+        if side:
+            ax.text(7.6, mid, side, ha="center", va="center", fontsize=8, bbox=box, multialignment="left")
+            ax.annotate("", xy=(5.7, mid), xytext=(4.9, mid), arrowprops=arrow)
+        if prev_bottom is not None:
+            ax.annotate("", xy=(2.9, y - 0.05), xytext=(2.9, prev_bottom + 0.05), arrowprops=arrow)
+        prev_bottom = y - h
+        y -= h + gap
+
+    ax.set_title("S001: PRISMA 2020 Flow (full-text stages derived from the manifest)", fontsize=10)
+    fig.tight_layout()
+    png = _fig_png(fig)
+    plt.close(fig)
+    return png
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Derive PRISMA flow counts and diagram from the manifest.")
+    ap.add_argument("--manifest", type=Path, default=MANIFEST_PATH)
+    ap.add_argument("--prisma-counts", type=Path, default=PRISMA_COUNTS_PATH)
+    ap.add_argument("--full", action="store_true", help="ignore the cached index and rebuild in one pass")
+    ap.add_argument("--no-figure", action="store_true")
+    ap.add_argument("--update-counts", action="store_true", help="record the derived flow in prisma_counts.json")
+    ap.add_argument("--protocol", type=Path, default=PRISMA_FLOW_PATH, help="protocol text with generated flow blocks")
+    ap.add_argument("--no-protocol", action="store_true", help="check the protocol's generated blocks without rewriting them")
+    ap.add_argument(
+        "--strict", action="store_true", help="exit non-zero if reconciliation fails or a protocol block is missing/stale"
+    )
+    args = ap.parse_args(argv)
+
+    if args.full:
+        INDEX_CACHE_PATH.unlink(missing_ok=True)
+    index, mode = load_index(args.manifest)
+    prisma = json.loads(args.prisma_counts.read_text(encoding="utf-8")) if args.prisma_counts.exists() else {}
+    if args.update_counts:
+        prisma = update_prisma_counts(args.prisma_counts, index.flow())
+    flow = build_flow(index, prisma)
+
+    OUT.mkdir(parents=True, exist_ok=True)
+    FLOW_JSON_PATH.write_text(render_json(flow), encoding="utf-8")
+    if not args.no_figure:
+        FLOW_PNG_PATH.write_bytes(render_prisma_png(flow))
+
+    ft = flow["fulltext"]
+    print(
+        f"index={mode} sought={ft['reports_sought_for_retrieval']} not_retrieved={ft['reports_not_retrieved']} "
+        f"assessed={ft['reports_assessed_for_eligibility']} excluded={ft['reports_excluded_fulltext']} "
+        f"included={ft['studies_included']} pending={ft['reports_pending_fulltext_screen']}"
+    )
+    bad = [c for c in flow["reconciliation"] if not c["ok"]]
+    for c in flow["reconciliation"]:
+        print(f"reconciliation: {c['check']}: recorded={c['recorded']} derived={c['derived']} -> {'OK' if c['ok'] else 'MISMATCH'}")
+
+    text = args.protocol.read_text(encoding="utf-8")
+    new_text, stale, missing = sync_protocol_text(text, render_protocol_blocks(flow))
+    if stale and not args.no_protocol:
+        args.protocol.write_text(new_text, encoding="utf-8")
+        print(f"protocol: rewrote {', '.join(stale)} in {args.protocol.name}")
+        stale = []
+    for name in stale:
+        print(f"protocol: block {name} in {args.protocol.name} is STALE")
+    for name in missing:
+        print(f"protocol: block {name} MISSING from {args.protocol.name}")
+    return 1 if (args.strict and (bad or stale or missing)) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Paper 3 - Review Workspace (S001, S002, ... on One Worker Pool)
+
+Reads:
+- reviews.json                      one entry per review: id (output prefix), input tables,
+                                    locked question, PRISMA flow text, output directory
+- each review's evidence / risk-of-bias / manifest (+ manifest journal) and protocol files
+
+Writes:
+- <out_dir>/<id>_*                  the full synthesize_evidence.py artifact set per review
+- .cache/workspace/<id>.json        per-review state: input signature + artifact hashes
+
+Config entry (paths relative to the repo root; only `id` and the three tables are required):
+
+    {"id": "S002", "evidence": "data/S002/evidence_table.csv",
+     "risk_of_bias": "data/S002/risk_of_bias.csv",
+     "manifest": "data/S002/fulltext_processing_manifest.csv",
+     "locked_question": "protocol/S002/00_locked_question.md",
+     "prisma_flow_text": "protocol/03_prisma_flow_and_reporting_text.md",
+     "out_dir": "output/synthesis", "figures": true, "max_rows_in_memory": 100000}
+
+`locked_question` and `prisma_flow_text` default to the shared protocol files, `out_dir` to
+output/synthesis/ (reviews can share it; artifacts are prefixed by id; the reports cite it), `max_rows_in_memory`
+to VIGILANCE_SPILL_ROWS (run size of the streamed vigilance ledger, as in synthesize_evidence.py).
+
+Scheduling:
+- A review is rebuilt only when its signature changes: hash of its input bytes (manifest
+  journal included), protocol texts, id, figure flag and the synthesis code itself. Unchanged
+  reviews whose outputs are still on disk are skipped without starting a worker.
+- Protocol files are read and parsed once per run and shared by every review that points at
+  them; workers receive the parsed strings, not paths.
+- Stale reviews go to one ProcessPoolExecutor, largest inputs first. Each worker writes only
+  artifacts whose bytes changed, so untouched files keep their mtimes.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from manifest_journal import journal_path
+from synthesize_evidence import (
+    CACHE,
+    EVIDENCE_PATH,
+    LOCKED_Q_PATH,
+    MANIFEST_PATH,
+    OUT,
+    PRISMA_FLOW_PATH,
+    ROB_PATH,
+    ROOT,
+    VIGILANCE_SPILL_ROWS,
+    _locked_question_from_text,
+    _write_text,
+    synthesize,
+)
+
+
+WORKSPACE_PATH = ROOT / "reviews.json"
+STATE_DIR = CACHE / "workspace"
+STATE_VERSION = 1
+
+_ID_RE = re.compile(r"^[A-Za-z0-9]+$")
+# Modules whose code shapes the artifacts; editing one invalidates every review.
+_CODE_FILES = ["synthesize_evidence.py", "gap_cube.py", "columnar_tables.py", "manifest_journal.py"]
+
+
+@dataclass(frozen=True)
+class ReviewConfig:
+    id: str
+    evidence: Path
+    risk_of_bias: Path
+    manifest: Path
+    locked_question: Path = LOCKED_Q_PATH
+    prisma_flow_text: Path = PRISMA_FLOW_PATH
+    out_dir: Path = OUT
+    figures: bool = True
+    max_rows_in_memory: int = VIGILANCE_SPILL_ROWS
+
+    def inputs(self) -> List[Path]:
+        return [self.evidence, self.risk_of_bias, self.manifest, journal_path(self.manifest)]
+
+    def out_rel(self) -> str:
+        """`out_dir` as the reports cite it: relative to ROOT when inside the repo."""
+        try:
+            return self.out_dir.resolve().relative_to(ROOT).as_posix()
+        except ValueError:
+            return self.out_dir.as_posix()
+
+
+def _resolve(p: str) -> Path:
+    path = Path(p)
+    return path if path.is_absolute() else ROOT / path
+
+
+def load_workspace(path: Path = WORKSPACE_PATH) -> List[ReviewConfig]:
+    """Parse and validate the review list; unknown keys and duplicate ids are errors."""
+    if not path.exists():
+        # No workspace file: the single S001 review at the historical locations.
+        return [ReviewConfig("S001", EVIDENCE_PATH, ROB_PATH, MANIFEST_PATH)]
+    raw = json.loads(path.read_text(encoding="utf-8"))
+    fields = set(ReviewConfig.__dataclass_fields__)  # type: ignore[attr-defined]
+    reviews: List[ReviewConfig] = []
+    seen = set()
+    for i, entry in enumerate(raw.get("reviews", [])):
+        unknown = set(entry) - fields
+        if unknown:
+            raise ValueError(f"{path.name}: review #{i + 1}: unknown keys {sorted(unknown)}")
+        missing = {"id", "evidence", "risk_of_bias", "manifest"} - set(entry)
+        if missing:
+            raise ValueError(f"{path.name}: review #{i + 1}: missing keys {sorted(missing)}")
+        rid = str(entry["id"])
+        if not _ID_RE.match(rid):
+            raise ValueError(f"{path.name}: review id {rid!r} must be alphanumeric (it prefixes file names)")
+        if rid in seen:
+            raise ValueError(f"{path.name}: duplicate review id {rid!r}")
+        seen.add(rid)
+        kwargs: Dict[str, Any] = {
+            k: (v if k in ("id", "figures", "max_rows_in_memory") else _resolve(v)) for k, v in entry.items()
+        }
+        kwargs["id"] = rid
+        reviews.append(ReviewConfig(**kwargs))
+    return reviews
+
+
+class ProtocolCache:
+    """Protocol texts read and parsed once per run, shared across reviews."""
+
+    def __init__(self) -> None:
+        self._texts: Dict[Path, str] = {}
+        self._questions: Dict[Path, str] = {}
+
+    def text(self, path: Path) -> str:
+        if path not in self._texts:
+            self._texts[path] = path.read_text(encoding="utf-8") if path.exists() else ""
+        return self._texts[path]
+
+    def locked_question(self, path: Path) -> str:
+        if path not in self._questions:
+            self._questions[path] = _locked_question_from_text(self.text(path))
+        return self._questions[path]
+
+
+def _sha_file(h: "hashlib._Hash", path: Path) -> None:
+    h.update(str(path).encode("utf-8") + b"\0")
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    except FileNotFoundError:
+        h.update(b"<missing>")
+    h.update(b"\0")
+
+
+def code_signature() -> str:
+    h = hashlib.sha256()
+    for name in _CODE_FILES:
+        _sha_file(h, Path(__file__).with_name(name))
+    return h.hexdigest()
+
+
+def review_signature(review: ReviewConfig, protocols: ProtocolCache, code_sig: str) -> str:
+    h = hashlib.sha256()
+    h.update(json.dumps([STATE_VERSION, code_sig, review.id, review.figures, str(review.out_dir)]).encode("utf-8"))
+    for p in review.inputs():
+        _sha_file(h, p)
+    h.update(protocols.locked_question(review.locked_question).encode("utf-8") + b"\0")
+    h.update(protocols.text(review.prisma_flow_text).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _state_path(review_id: str) -> Path:
+    return STATE_DIR / f"{review_id}.json"
+
+
+def load_state(review_id: str) -> Dict[str, Any]:
+    try:
+        return json.loads(_state_path(review_id).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_state(review_id: str, state: Dict[str, Any]) -> None:
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = _state_path(review_id).with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, _state_path(review_id))
+
+
+def _outputs_present(review: ReviewConfig, state: Dict[str, Any]) -> bool:
+    return bool(state.get("artifacts")) and all((review.out_dir / n).exists() for n in state["artifacts"])
+
+
+def _sha(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def _sha_path(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _build_review(
+    review: ReviewConfig, locked_question: str, prisma_flow_text: str, old_hashes: Dict[str, str]
+) -> Tuple[Dict[str, str], int]:
+    """Worker: synthesize one review and write changed artifacts; returns (artifact hashes, files written)."""
+    result = synthesize(
+        review.evidence,
+        review.risk_of_bias,
+        review.manifest,
+        locked_question=locked_question,
+        prisma_flow_text=prisma_flow_text,
+        figures=review.figures,
+        review_id=review.id,
+        max_rows_in_memory=review.max_rows_in_memory,
+        out_rel=review.out_rel(),
+    )
+    review.out_dir.mkdir(parents=True, exist_ok=True)
+    hashes: Dict[str, str] = {}
+    written = 0
+    for name, content in result.artifacts().items():
+        data = content if isinstance(content, bytes) else content.encode("utf-8")
+        hashes[name] = _sha(data)
+        path = review.out_dir / name
+        if old_hashes.get(name) == hashes[name] and path.exists():
+            continue
+        if isinstance(content, bytes):
+            path.write_bytes(content)
+        else:
+            _write_text(path, content)
+        written += 1
+    # Streamed artifacts go to a scratch directory first so unchanged files are left alone.
+    with tempfile.TemporaryDirectory(prefix=".stream_", dir=review.out_dir) as td:
+        for write_streamed in result.streamed.values():
+            write_streamed(Path(td))
+        for name in result.streamed:
+            tmp = Path(td) / name
+            hashes[name] = _sha_path(tmp)
+            path = review.out_dir / name
+            if old_hashes.get(name) == hashes[name] and path.exists():
+                continue
+            os.replace(tmp, path)
+            written += 1
+    return hashes, written
+
+
+def _input_bytes(review: ReviewConfig) -> int:
+    return sum(p.stat().st_size for p in review.inputs() if p.exists())
+
+
+def run_workspace(
+    reviews: Sequence[ReviewConfig],
+    workers: Optional[int] = None,
+    force: bool = False,
+) -> Dict[str, Dict[str, Any]]:
+    """Rebuild stale reviews on a shared process pool; returns per-review status."""
+    protocols = ProtocolCache()
+    code_sig = code_signature()
+    status: Dict[str, Dict[str, Any]] = {}
+    stale: List[Tuple[ReviewConfig, str, Dict[str, Any]]] = []
+    for review in reviews:
+        sig = review_signature(review, protocols, code_sig)
+        state = load_state(review.id)
+        if not force and state.get("signature") == sig and _outputs_present(review, state):
+            status[review.id] = {"status": "up-to-date", "artifacts": len(state["artifacts"]), "written": 0}
+        else:
+            stale.append((review, sig, state))
+    if not stale:
+        return status
+
+    stale.sort(key=lambda item: -_input_bytes(item[0]))
+    with ProcessPoolExecutor(max_workers=workers or min(len(stale), os.cpu_count() or 1)) as pool:
+        futures = {
+            pool.submit(
+                _build_review,
+                review,
+                protocols.locked_question(review.locked_question),
+                protocols.text(review.prisma_flow_text),
+                {} if force else state.get("artifacts", {}),
+            ): (review, sig)
+            for review, sig, state in stale
+        }
+        for fut in as_completed(futures):
+            review, sig = futures[fut]
+            try:
+                hashes, written = fut.result()
+            except Exception as exc:  # one broken review must not stop the others
+                status[review.id] = {"status": "failed", "error": f"{type(exc).__name__}: {exc}"}
+                continue
+            save_state(
+                review.id,
+                {"version": STATE_VERSION, "signature": sig, "config": {k: str(v) for k, v in asdict(review).items()}, "artifacts": hashes},
+            )
+            status[review.id] = {"status": "rebuilt", "artifacts": len(hashes), "written": written}
+    return status
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Build every review in the workspace on one worker pool.")
+    ap.add_argument("--config", type=Path, default=WORKSPACE_PATH)
+    ap.add_argument("--only", nargs="+", metavar="ID", help="build just these review ids")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--force", action="store_true", help="rebuild and rewrite every artifact")
+    args = ap.parse_args(argv)
+
+    reviews = load_workspace(args.config)
+    if args.only:
+        unknown = set(args.only) - {r.id for r in reviews}
+        if unknown:
+            ap.error(f"unknown review ids: {sorted(unknown)}")
+        reviews = [r for r in reviews if r.id in args.only]
+
+    status = run_workspace(reviews, workers=args.workers, force=args.force)
+    failed = 0
+    for review in reviews:
+        s = status[review.id]
+        if s["status"] == "failed":
+            failed += 1
+            print(f"{review.id}: FAILED {s['error']}")
+        else:
+            print(f"{review.id}: {s['status']} artifacts={s['artifacts']} written={s['written']}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Paper 3 - Title/Abstract Screening Engine
+
+Reads:
+- protocol/02_exact_search_strategy_log.md  (keyword dictionaries + classification rules)
+- data/all_candidates_screened.csv         (short_id, title, abstract, type)
+- data/prisma_counts.json                   (for reconciliation only)
+
+Writes (under output/screening/):
+- title_abstract_screening.csv  (one row per record: decision, rule fired, matched terms per dictionary)
+
+Rules (exact, from the search log):
+- core_include:    intervention-hit AND outcome-hit AND (baseline-hit OR duration-hit)
+- support_include: intervention-hit AND outcome-hit AND (trial-hit OR review/meta signal)
+- exclude otherwise
+
+Design goals:
+- All dictionaries compile into one Aho-Corasick automaton; each record is scanned once
+- Case-insensitive substring semantics, matching the original screening run
+- Records are scanned in chunks on a process pool; output order follows the input
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import re
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from synthesize_evidence import DATA, PRISMA_COUNTS_PATH, PROTOCOL, ROOT, _read_csv_dicts
+
+
+SEARCH_LOG_PATH = PROTOCOL / "02_exact_search_strategy_log.md"
+CANDIDATES_PATH = DATA / "all_candidates_screened.csv"
+SCREEN_OUT = ROOT / "output" / "screening"
+
+# Dictionary label in the search log -> short key used in rules and output columns.
+DICTIONARY_KEYS = {
+    "Intervention terms": "intervention",
+    "Outcome terms": "outcome",
+    "Baseline terms": "baseline",
+    "Duration terms": "duration",
+    "Trial/RCT terms": "trial",
+}
+# The log names a "review/meta signal" without listing terms; these are the signal phrases.
+REVIEW_TERMS = ["review", "meta-analysis", "meta analysis"]
+REVIEW_TYPES = {"review"}
+
+OUTPUT_FIELDS = [
+    "short_id",
+    "decision",
+    "rule",
+    "intervention_terms",
+    "outcome_terms",
+    "baseline_terms",
+    "duration_terms",
+    "trial_terms",
+    "review_terms",
+]
+
+
+def parse_keyword_dictionaries(path: Path = SEARCH_LOG_PATH) -> Dict[str, List[str]]:
+    """Pull the `- <Label> terms: a, b, c` lines out of the search log."""
+    dicts: Dict[str, List[str]] = {}
+    pat = re.compile(r"^-\s*(.+?):\s*(.+)$")
+    for ln in path.read_text(encoding="utf-8").splitlines():
+        m = pat.match(ln.strip())
+        if not m or m.group(1) not in DICTIONARY_KEYS:
+            continue
+        terms = [t.strip().lower() for t in m.group(2).split(",") if t.strip()]
+        dicts[DICTIONARY_KEYS[m.group(1)]] = terms
+    missing = set(DICTIONARY_KEYS.values()) - set(dicts)
+    if missing:
+        raise ValueError(f"{path}: keyword dictionaries not found: {sorted(missing)}")
+    dicts["review"] = list(REVIEW_TERMS)
+    return dicts
+
+
+class Automaton:
+    """Aho-Corasick automaton over (dictionary, term) patterns."""
+
+    def __init__(self, dictionaries: Dict[str, List[str]]) -> None:
+        self.patterns: List[Tuple[str, str]] = []
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[int]] = [[]]
+
+        for key in sorted(dictionaries):
+            for term in dictionaries[key]:
+                self._add(term, len(self.patterns))
+                self.patterns.append((key, term))
+        self._link()
+
+    def _add(self, term: str, pid: int) -> None:
+        node = 0
+        for ch in term:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+            node = nxt
+        self.out[node].append(pid)
+
+    def _link(self) -> None:
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def scan(self, text: str) -> Dict[str, Set[str]]:
+        hits: Dict[str, Set[str]] = {}
+        goto, fail, out, patterns = self.goto, self.fail, self.out, self.patterns
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for pid in out[node]:
+                key, term = patterns[pid]
+                hits.setdefault(key, set()).add(term)
+        return hits
+
+
+def classify(hits: Dict[str, Set[str]], record_type: str = "") -> Tuple[str, str]:
+    """Apply the search-log rules; returns (decision, rule)."""
+    if "intervention" not in hits or "outcome" not in hits:
+        return "exclude", "no_intervention_hit" if "intervention" not in hits else "no_outcome_hit"
+    if "baseline" in hits or "duration" in hits:
+        return "core_include", "intervention+outcome+" + "|".join(k for k in ("baseline", "duration") if k in hits)
+    if "trial" in hits:
+        return "support_include", "intervention+outcome+trial"
+    if "review" in hits or record_type in REVIEW_TYPES:
+        return "support_include", "intervention+outcome+review"
+    return "exclude", "no_qualifier_hit"
+
+
+_WORKER_AUTOMATON: Optional[Automaton] = None
+
+
+def _init_worker(dictionaries: Dict[str, List[str]]) -> None:
+    global _WORKER_AUTOMATON
+    _WORKER_AUTOMATON = Automaton(dictionaries)
+
+
+def _screen_chunk(chunk: List[Tuple[str, str, str]]) -> List[Dict[str, str]]:
+    assert _WORKER_AUTOMATON is not None
+    return [_screen_one(_WORKER_AUTOMATON, sid, text, rtype) for sid, text, rtype in chunk]
+
+
+def _screen_one(automaton: Automaton, sid: str, text: str, record_type: str) -> Dict[str, str]:
+    hits = automaton.scan(text)
+    decision, rule = classify(hits, record_type)
+    row = {"short_id": sid, "decision": decision, "rule": rule}
+    for key in ("intervention", "outcome", "baseline", "duration", "trial", "review"):
+        row[f"{key}_terms"] = "; ".join(sorted(hits.get(key, ())))
+    return row
+
+
+def _record_tuples(rows: Iterable[Dict[str, str]]) -> Iterable[Tuple[str, str, str]]:
+    for r in rows:
+        sid = (r.get("short_id") or "").strip()
+        if not sid:
+            continue
+        text = f"{r.get('title') or ''} {r.get('abstract') or ''}".lower()
+        yield sid, text, (r.get("type") or "").strip().lower()
+
+
+def screen_records(
+    rows: Iterable[Dict[str, str]],
+    dictionaries: Dict[str, List[str]],
+    workers: Optional[int] = None,
+    chunk_size: int = 2000,
+) -> List[Dict[str, str]]:
+    records = list(_record_tuples(rows))
+    if workers == 1 or len(records) <= chunk_size:
+        automaton = Automaton(dictionaries)
+        return [_screen_one(automaton, *rec) for rec in records]
+
+    chunks = [records[i : i + chunk_size] for i in range(0, len(records), chunk_size)]
+    out: List[Dict[str, str]] = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(dictionaries,)) as pool:
+        for part in pool.map(_screen_chunk, chunks):
+            out.extend(part)
+    return out
+
+
+def write_screening_csv(path: Path, screened: Sequence[Dict[str, str]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=OUTPUT_FIELDS)
+        w.writeheader()
+        for row in screened:
+            w.writerow(row)
+
+
+def reconcile(screened: Sequence[Dict[str, str]], prisma_path: Path = PRISMA_COUNTS_PATH) -> Tuple[bool, str]:
+    n_excluded = sum(1 for r in screened if r["decision"] == "exclude")
+    try:
+        expected = json.loads(prisma_path.read_text(encoding="utf-8")).get("records_excluded_title_abstract")
+    except FileNotFoundError:
+        expected = None
+    if expected is None:
+        return True, f"excluded={n_excluded} (no records_excluded_title_abstract to reconcile against)"
+    ok = n_excluded == int(expected)
+    return ok, f"excluded={n_excluded} prisma_counts={expected} -> {'OK' if ok else 'MISMATCH'}"
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Title/abstract screening from the search-log keyword dictionaries.")
+    ap.add_argument("--candidates", type=Path, default=CANDIDATES_PATH)
+    ap.add_argument("--search-log", type=Path, default=SEARCH_LOG_PATH)
+    ap.add_argument("--out", type=Path, default=SCREEN_OUT / "title_abstract_screening.csv")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--strict", action="store_true", help="exit non-zero if the excluded count does not reconcile")
+    args = ap.parse_args(argv)
+
+    dictionaries = parse_keyword_dictionaries(args.search_log)
+    screened = screen_records(_read_csv_dicts(args.candidates), dictionaries, workers=args.workers)
+    write_screening_csv(args.out, screened)
+
+    print(f"decisions: {dict(Counter(r['decision'] for r in screened))}")
+    ok, msg = reconcile(screened)
+    print(f"reconciliation: {msg}")
+    return 1 if (args.strict and not ok) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
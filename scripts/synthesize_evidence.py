@@ -5,18 +5,35 @@ Paper 3 - Synthesis Builder (S001)
 Reads:
 - data/evidence_table.csv
 - data/risk_of_bias.csv
-- data/fulltext_processing_manifest.csv
+- data/fulltext_processing_manifest.csv (plus pending edits in its .journal.jsonl, see manifest_journal.py)
 
 Writes (under output/synthesis/):
-- S001_evidence_map_worklevel.csv
+- S001_evidence_map_worklevel.csv (+ .cols columnar copy, see columnar_tables.py)
+- S001_vigilance_outcomes.csv (+ .cols)
 - S001_stats.json
 - S001_fig1_study_counts_by_intervention.png
 - S001_fig2_vigilance_durability_map.png
 - S001_fig3_risk_of_bias_distribution.png
+- S001_fig4_durability_trajectories.png
+- S001_fig5_gap_heatmap.png
+- S001_durability_trajectories.csv
+- S001_gap_table.csv
 - S001_synthesis_report.md
 - S001_gap_map.md
 - S001_manuscript_outline.md
 
+Library use:
+- `synthesize(evidence, rob, manifest)` builds every artifact in memory (tables as CSV/JSON text,
+  markdown strings, figure PNG bytes) from paths, text streams or parsed rows; `main()` only
+  writes `SynthesisResult.artifacts()` to output/synthesis/.
+- With `max_rows_in_memory=N` (what `main()` uses; `--max-rows-in-memory`), the vigilance ledger
+  is not built in memory: `write()` streams S001_vigilance_outcomes.csv through an external sort
+  in runs of N rows and encodes its .cols copy from that file in N-row chunks. The input tables
+  are still loaded whole; N bounds the ledger, not the run. `--check-vigilance-stream` verifies
+  both files are byte-identical to the in-memory renders.
+- `review_id` (default S001) sets the file prefix and report labels; review_workspace.py builds
+  several reviews from reviews.json this way.
+
 Design goals:
 - No pandas dependency (CSV module only)
 - Auditable, manifest-linked, work-level + outcome-level views
@@ -25,41 +42,62 @@ Design goals:
 
 from __future__ import annotations
 
+import argparse
 import csv
+import heapq
+import io
 import json
 import math
+import re
+import tempfile
 from collections import Counter, defaultdict
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from columnar_tables import encode_table, write_table_streamed
+from gap_cube import Gap, SparseGapCube
+from manifest_journal import read_manifest
 
 
 ROOT = Path(__file__).resolve().parents[1]
 DATA = ROOT / "data"
 PROTOCOL = ROOT / "protocol"
 OUT = ROOT / "output" / "synthesis"
+CACHE = ROOT / ".cache"
 
 EVIDENCE_PATH = DATA / "evidence_table.csv"
 ROB_PATH = DATA / "risk_of_bias.csv"
 MANIFEST_PATH = DATA / "fulltext_processing_manifest.csv"
 LOCKED_Q_PATH = PROTOCOL / "00_locked_question.md"
+PRISMA_COUNTS_PATH = DATA / "prisma_counts.json"
+PRISMA_FLOW_PATH = PROTOCOL / "03_prisma_flow_and_reporting_text.md"
+# Output file prefix and report label; other reviews pass their own (see review_workspace.py).
+DEFAULT_REVIEW_ID = "S001"
+# Output directory as cited in the reports, relative to ROOT (review_workspace.py passes each review's).
+DEFAULT_OUT_REL = "output/synthesis"
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class WorkRow:
+    """
+    One work in the evidence map. Numeric fields are parsed once at build time (None = missing);
+    `text()` / `as_csv_row()` render the CSV strings.
+    """
+
     short_id: str
     eligibility_tier: str
-    publication_year: str
+    publication_year: Optional[int]
     citation: str
     doi: str
     primary_intervention_category: str
     intervention_categories: str
     primary_setting: str
     settings: str
-    n_total: str
-    exposure_days_min: str
-    exposure_days_max: str
+    n_total: Optional[int]
+    exposure_days_min: Optional[float]
+    exposure_days_max: Optional[float]
     outcome_domains: str
     has_vigilance_outcome: str
     vigilance_effect_summary: str
@@ -71,6 +109,39 @@ class WorkRow:
     rob_tool: str
     abstract_only_flag: str
     notes: str
+    # Text after the leading count in n_total, e.g. " (17 evaluations)"; the whole value if unparsed.
+    n_total_note: str = ""
+
+    def text(self, field: str) -> str:
+        if field == "n_total":
+            return ("" if self.n_total is None else str(self.n_total)) + self.n_total_note
+        v = getattr(self, field)
+        return "" if v is None else str(v)
+
+    def as_csv_row(self) -> Dict[str, str]:
+        return {f: self.text(f) for f in WORK_MAP_FIELDS}
+
+
+# Columns of S001_evidence_map_worklevel.csv (n_total_note is folded into n_total).
+WORK_MAP_FIELDS = [f for f in WorkRow.__dataclass_fields__ if f != "n_total_note"]  # type: ignore[attr-defined]
+
+
+_N_TOTAL_RE = re.compile(r"(\d+)(\D.*)?", re.DOTALL)
+
+
+def _parse_n_total(raw: str) -> Tuple[Optional[int], str]:
+    """Split n_total text into (leading count, remainder); (None, raw) unless it round-trips exactly."""
+    m = _N_TOTAL_RE.fullmatch(raw)
+    if m and str(int(m.group(1))) == m.group(1):
+        return int(m.group(1)), m.group(2) or ""
+    return None, raw
+
+
+def _parse_year(raw: str) -> Optional[int]:
+    try:
+        return int(raw)
+    except ValueError:
+        return None
 
 
 def _now_utc_iso() -> str:
@@ -83,13 +154,44 @@ def _read_csv_dicts(path: Path) -> List[Dict[str, str]]:
         return list(r)
 
 
+# A table input for the in-memory API: a path, an open text stream, or already-parsed rows.
+TableSource = Union[Path, str, IO[str], Iterable[Dict[str, str]]]
+
+
+def _load_rows(src: TableSource) -> List[Dict[str, str]]:
+    if isinstance(src, (str, Path)):
+        return _read_csv_dicts(Path(src))
+    if hasattr(src, "read"):
+        return list(csv.DictReader(src))  # type: ignore[arg-type]
+    return [dict(r) for r in src]  # type: ignore[union-attr]
+
+
+def _render_csv(fieldnames: List[str], rows: Iterable[Dict[str, Any]]) -> str:
+    buf = io.StringIO(newline="")
+    w = csv.DictWriter(buf, fieldnames=fieldnames)
+    w.writeheader()
+    for row in rows:
+        w.writerow(row)
+    return buf.getvalue()
+
+
+def _write_text(path: Path, text: str) -> None:
+    # newline="" keeps the csv module's \r\n row terminators byte-for-byte.
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        f.write(text)
+
+
 def _read_locked_question() -> str:
     try:
-        txt = LOCKED_Q_PATH.read_text(encoding="utf-8").strip()
+        txt = LOCKED_Q_PATH.read_text(encoding="utf-8")
     except FileNotFoundError:
         return ""
+    return _locked_question_from_text(txt)
+
+
+def _locked_question_from_text(txt: str) -> str:
     # Keep just the actual question line(s).
-    lines = [ln.strip() for ln in txt.splitlines() if ln.strip()]
+    lines = [ln.strip() for ln in txt.strip().splitlines() if ln.strip()]
     # Usually last line holds the question.
     return lines[-1] if lines else ""
 
@@ -102,7 +204,10 @@ def _safe_float(x: str) -> Optional[float]:
 
 
 def _mode_str(values: Iterable[str]) -> str:
-    c = Counter([v for v in values if (v or "").strip()])
+    return _mode_of_counts(Counter([v for v in values if (v or "").strip()]))
+
+
+def _mode_of_counts(c: Counter[str]) -> str:
     if not c:
         return ""
     # Deterministic tie-breaker: alphabetical.
@@ -116,11 +221,10 @@ def _join_unique(values: Iterable[str]) -> str:
     return "; ".join(uniq)
 
 
-def _vigilance_summary(rows: List[Dict[str, str]]) -> str:
-    v_rows = [r for r in rows if (r.get("outcome_domain") or "").strip() == "vigilance"]
-    if not v_rows:
+def _vigilance_summary_from_directions(dirs: Optional[Set[str]]) -> str:
+    """Work-level vigilance summary from the effect directions of its vigilance rows (None = no such rows)."""
+    if dirs is None:
         return "no_vigilance"
-    dirs = {(r.get("effect_direction") or "").strip() for r in v_rows}
     if "improves" in dirs and "worsens" in dirs:
         return "mixed"
     if "mixed" in dirs:
@@ -136,10 +240,380 @@ def _vigilance_summary(rows: List[Dict[str, str]]) -> str:
     return "unclear"
 
 
+DIRECTION_SCORE = {"improves": 1.0, "mixed": 0.0, "null": 0.0, "worsens": -1.0}
+
+# Durability bins (upper bound in days, label), aligned with the codebook D0-D3 classes plus long follow-up.
+DURABILITY_BINS: List[Tuple[float, str]] = [
+    (1.0, "<=1d"),
+    (6.0, "2-6d"),
+    (27.0, "7-27d"),
+    (89.0, "28-89d"),
+    (math.inf, ">=90d"),
+]
+
+_TP_UNIT_DAYS = {"day": 1.0, "night": 1.0, "week": 7.0, "wk": 7.0, "month": 30.0, "mo": 30.0, "year": 365.0, "y": 365.0}
+# "2-month", "14-day", "6 months", "6 mo", "1.5y"
+_TP_QTY_RE = re.compile(r"(\d+(?:\.\d+)?)\s*-?\s*(day|night|week|wk|month|mo|year|y)s?\b")
+# "Day 2", "week4", "weeks 1-4", "Nights 1,3,6"
+_TP_ORD_RE = re.compile(r"\b(day|night|week)s?\s*(\d+(?:\s*[-,]\s*\d+)*)\b")
+# Follow-up offsets measured from the end of exposure: "1-month follow-up", "follow-ups (6 mo, 1.5y, 7y)",
+# "1 week after final training".
+_TP_FOLLOWUP_RE = re.compile(
+    r"(\d+(?:\.\d+)?\s*-?\s*(?:day|night|week|wk|month|mo|year|y)s?)\s*follow"
+    r"|follow-?ups?\s*\(([^)]*)\)"
+    r"|(\d+(?:\.\d+)?\s*-?\s*(?:day|night|week|wk|month|mo|year|y)s?)\s+after (?:the )?(?:final|last)"
+)
+_TP_START_RE = re.compile(r"\b(first|acute|baseline|pre-exercise)\b")
+_TP_END_RE = re.compile(r"\b(end|post|after|last|across|mean|weekly|daily|during|vs)\b")
+
+
+def _timepoint_span_days(text: str) -> Optional[float]:
+    """
+    Largest explicit duration or day/week ordinal mentioned in a timepoint fragment.
+
+    Durations chained with "+" are consecutive phases ("7-day restriction + 5-day recovery"),
+    so the chain counts as their sum (12) rather than its longest phase.
+    """
+    vals = [float(q) * _TP_UNIT_DAYS[u] for q, u in _TP_QTY_RE.findall(text)]
+    for unit, nums in _TP_ORD_RE.findall(text):
+        vals.extend(float(n) * _TP_UNIT_DAYS[unit] for n in re.findall(r"\d+", nums))
+    phases = [[float(q) * _TP_UNIT_DAYS[u] for q, u in _TP_QTY_RE.findall(seg)] for seg in text.split("+")]
+    phases = [p for p in phases if p]
+    if len(phases) > 1:
+        vals.append(sum(max(p) for p in phases))
+    return max(vals) if vals else None
+
+
+def _exposure_end_days(raw: str) -> Optional[float]:
+    """Leading number (or upper bound of a leading range such as "~21-35") of exposure_duration_days."""
+    m = re.match(r"\s*~?\s*(\d+(?:\.\d+)?)(?:\s*-\s*(\d+(?:\.\d+)?))?", raw or "")
+    if not m:
+        return None
+    return float(m.group(2) or m.group(1))
+
+
+def parse_outcome_timepoint(timepoint: str, exposure_duration_days: str) -> Tuple[Optional[float], str]:
+    """
+    Normalize free-text `outcome_timepoint` to days since intervention start.
+
+    Returns (days, basis) where basis is one of:
+    - explicit:        a duration/ordinal is stated ("end of each 2-month condition" -> 60, "Day 2" -> 2)
+    - follow_up:       a follow-up offset is stated; added to the end of exposure
+    - start:           first-exposure / acute / baseline timing -> day 1
+    - end_of_exposure: endpoint or across-protocol wording -> exposure_duration_days
+    - unparsed:        nothing usable
+    """
+    text = (timepoint or "").lower()
+    exposure_end = _exposure_end_days(exposure_duration_days)
+
+    followups = [_timepoint_span_days(" ".join(g for g in m.groups() if g)) for m in _TP_FOLLOWUP_RE.finditer(text)]
+    followups_days = [d for d in followups if d is not None]
+    if followups_days and exposure_end is not None:
+        return exposure_end + max(followups_days), "follow_up"
+    main_text = _TP_FOLLOWUP_RE.sub(" ", text)
+    explicit = _timepoint_span_days(main_text)
+    if explicit is not None:
+        return explicit, "explicit"
+    if _TP_START_RE.search(text) and not _TP_END_RE.search(text):
+        return 1.0, "start"
+    if exposure_end is not None:
+        return exposure_end, "end_of_exposure"
+    return None, "unparsed"
+
+
+def build_durability_trajectories(evidence_rows: List[Dict[str, str]]) -> Dict[str, Any]:
+    """
+    Per-work, per-category vigilance effect-over-time series plus a durability curve per category.
+
+    Timepoints are parsed per row; all grouping/aggregation is done with numpy (bincount over
+    encoded group keys), so it scales with the number of outcome rows rather than Python loops.
+    """
+    # Local import: numpy ships with matplotlib, which the figure stage already requires.
+    import numpy as np
+
+    v_rows = [r for r in evidence_rows if (r.get("outcome_domain") or "").strip() == "vigilance"]
+    parsed = [parse_outcome_timepoint(r.get("outcome_timepoint", ""), r.get("exposure_duration_days", "")) for r in v_rows]
+
+    sids = np.array([(r.get("short_id") or "").strip() for r in v_rows], dtype=object)
+    cats = np.array([(r.get("intervention_category") or "").strip() or "(missing)" for r in v_rows], dtype=object)
+    days = np.array([np.nan if d is None else d for d, _ in parsed], dtype=float)
+    score = np.array([DIRECTION_SCORE.get((r.get("effect_direction") or "").strip(), np.nan) for r in v_rows], dtype=float)
+    basis_counts = Counter(b for _, b in parsed)
+
+    ok = ~np.isnan(days) & ~np.isnan(score)
+    sids, cats, days, score = sids[ok], cats[ok], days[ok], score[ok]
+    if not len(days):
+        return {"trajectories": [], "curves": {}, "timepoint_basis_counts": dict(basis_counts)}
+
+    sid_levels, sid_idx = np.unique(sids.astype(str), return_inverse=True)
+    cat_levels, cat_idx = np.unique(cats.astype(str), return_inverse=True)
+    day_levels, day_idx = np.unique(days, return_inverse=True)
+
+    # Per-work trajectories: mean direction score per (work, category, timepoint).
+    key = (sid_idx * len(cat_levels) + cat_idx) * len(day_levels) + day_idx
+    keys, inv = np.unique(key, return_inverse=True)
+    n = np.bincount(inv)
+    mean = np.bincount(inv, weights=score) / n
+    k_sid, rem = np.divmod(keys, len(cat_levels) * len(day_levels))
+    k_cat, k_day = np.divmod(rem, len(day_levels))
+    trajectories = [
+        {
+            "short_id": str(s),
+            "intervention_category": str(c),
+            "timepoint_days": float(d),
+            "mean_direction_score": round(float(m), 4),
+            "n_rows": int(k),
+        }
+        for s, c, d, m, k in zip(sid_levels[k_sid], cat_levels[k_cat], day_levels[k_day], mean, n)
+    ]
+
+    # Durability curves: mean score, rows and distinct works per (category, duration bin).
+    edges = np.array([ub for ub, _ in DURABILITY_BINS], dtype=float)
+    bin_idx = np.searchsorted(edges, days, side="left")
+    n_bins = len(DURABILITY_BINS)
+    cb = cat_idx * n_bins + bin_idx
+    size = len(cat_levels) * n_bins
+    rows_n = np.bincount(cb, minlength=size)
+    score_sum = np.bincount(cb, weights=score, minlength=size)
+    works_n = np.bincount(np.unique(cb * len(sid_levels) + sid_idx) // len(sid_levels), minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        curve_mean = score_sum / rows_n
+
+    curves: Dict[str, List[Dict[str, Any]]] = {}
+    for ci, cat in enumerate(cat_levels):
+        sl = slice(ci * n_bins, (ci + 1) * n_bins)
+        curves[str(cat)] = [
+            {
+                "duration_bin": label,
+                "n_rows": int(rn),
+                "n_works": int(wn),
+                "mean_direction_score": None if rn == 0 else round(float(cm), 4),
+            }
+            for (_, label), rn, wn, cm in zip(DURABILITY_BINS, rows_n[sl], works_n[sl], curve_mean[sl])
+        ]
+
+    return {"trajectories": trajectories, "curves": curves, "timepoint_basis_counts": dict(basis_counts)}
+
+
+TRAJECTORY_FIELDS = ["short_id", "intervention_category", "timepoint_days", "mean_direction_score", "n_rows"]
+
+
+def render_trajectories_csv(trajectories: List[Dict[str, Any]]) -> str:
+    return _render_csv(TRAJECTORY_FIELDS, trajectories)
+
+
+def write_trajectories_csv(path: Path, trajectories: List[Dict[str, Any]]) -> None:
+    _write_text(path, render_trajectories_csv(trajectories))
+
+
+# Dimensions of the gap cube; multi-valued ones (categories, domains) count a work once per value.
+GAP_DIMENSIONS = [
+    "intervention_category",
+    "setting",
+    "duration_bin",
+    "low_baseline_arousal_class",
+    "repeated_use_class",
+    "outcome_domain",
+]
+GAP_KNOWN_VALUES = {
+    "duration_bin": [label for _, label in DURABILITY_BINS],
+    "low_baseline_arousal_class": [
+        "A1_explicit_low_arousal",
+        "A2_structural_proxy_low_arousal",
+        "A3_experimentally_induced_low_arousal",
+        "A4_general_adults_unscreened",
+    ],
+    "repeated_use_class": ["D0_acute_only", "D1_repeated_short", "D2_repeated_weekplus", "D3_repeated_monthplus"],
+}
+# repeated_use_class is coded from the exposure duration, so duration_bin x repeated_use_class "gaps" are definitional.
+GAP_LINKED_DIMENSIONS = [("duration_bin", "repeated_use_class")]
+GAP_TABLE_FIELDS = ["rank", "dimensions", "values", "status", "observed_works", "expected_works", "gap_score"]
+_SETTING_CLASSES = ["workplace", "field", "home", "clinical", "lab"]
+
+
+def _setting_class(setting: str) -> str:
+    """Coarse setting class from free-text settings ("workplace/field (ED)" -> "workplace")."""
+    s = setting.lower()
+    for cls in _SETTING_CLASSES:
+        if cls in s:
+            return cls
+    return "other" if s.strip() else ""
+
+
+def _duration_bin(days: Optional[float]) -> str:
+    if days is None:
+        return ""
+    for ub, label in DURABILITY_BINS:
+        if days <= ub:
+            return label
+    return DURABILITY_BINS[-1][1]
+
+
+def _split_joined(v: str) -> List[str]:
+    return [x.strip() for x in v.split(";") if x.strip()]
+
+
+def build_gap_cube(works: List[WorkRow]) -> SparseGapCube:
+    cube = SparseGapCube(GAP_DIMENSIONS, known_values=GAP_KNOWN_VALUES)
+    for w in works:
+        cube.add(
+            {
+                "intervention_category": _split_joined(w.intervention_categories),
+                "setting": [_setting_class(w.primary_setting)],
+                "duration_bin": [_duration_bin(w.exposure_days_max)],
+                "low_baseline_arousal_class": [w.low_baseline_arousal_class],
+                "repeated_use_class": [w.repeated_use_class],
+                "outcome_domain": _split_joined(w.outcome_domains),
+            }
+        )
+    return cube
+
+
+def build_gap_table(gaps: List[Gap], top: int = 50) -> List[Dict[str, Any]]:
+    return [
+        {
+            "rank": i,
+            "dimensions": " x ".join(g.dims),
+            "values": " x ".join(g.values),
+            "status": g.status,
+            "observed_works": g.observed,
+            "expected_works": round(g.expected, 2),
+            "gap_score": round(g.score, 2),
+        }
+        for i, g in enumerate(gaps[:top], start=1)
+    ]
+
+
+def gap_cube_stats(cube: SparseGapCube, gap_rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "dimensions": GAP_DIMENSIONS,
+        "n_works": cube.n,
+        "n_nonempty_cells": cube.n_cells(),
+        "n_dense_cells": cube.dense_size(),
+        "n_ranked_gaps": len(gap_rows),
+        "known_values_without_works": [f"{d}={v}" for d, v in cube.missing_values()],
+    }
+
+
+def render_gap_table_csv(gap_rows: List[Dict[str, Any]]) -> str:
+    return _render_csv(GAP_TABLE_FIELDS, gap_rows)
+
+
+@dataclass(frozen=True)
+class FieldReducer:
+    """
+    How one WorkRow field is reduced from a work's evidence rows.
+
+    ops: "mode" / "join_unique" (over non-blank values), "min" / "max" (over values that
+    `parse` accepts; None if none do), "any" ("yes" if `test` holds for some value), or "custom"
+    (`init()` -> state, `step(state, row)` -> state, `finish(state)` -> value).
+    """
+
+    op: str
+    column: str = ""
+    parse: Optional[Callable[[str], Optional[float]]] = None
+    test: Optional[Callable[[str], bool]] = None
+    init: Optional[Callable[[], Any]] = None
+    step: Optional[Callable[[Any, Dict[str, str]], Any]] = None
+    finish: Optional[Callable[[Any], Any]] = None
+
+
+def _vigilance_dirs_step(dirs: Optional[Set[str]], row: Dict[str, str]) -> Optional[Set[str]]:
+    if (row.get("outcome_domain") or "").strip() != "vigilance":
+        return dirs
+    if dirs is None:
+        dirs = set()
+    dirs.add((row.get("effect_direction") or "").strip())
+    return dirs
+
+
+# Evidence-derived WorkRow fields. Adding a column here adds no extra pass over the rows:
+# the spec is compiled once and every work's rows are scanned a single time.
+WORK_REDUCERS: Dict[str, FieldReducer] = {
+    "publication_year": FieldReducer("mode", "publication_year"),
+    "citation": FieldReducer("mode", "citation"),
+    "primary_intervention_category": FieldReducer("mode", "intervention_category"),
+    "intervention_categories": FieldReducer("join_unique", "intervention_category"),
+    "primary_setting": FieldReducer("mode", "setting"),
+    "settings": FieldReducer("join_unique", "setting"),
+    "n_total": FieldReducer("mode", "n_total"),
+    "exposure_days_min": FieldReducer("min", "exposure_duration_days", parse=_safe_float),
+    "exposure_days_max": FieldReducer("max", "exposure_duration_days", parse=_safe_float),
+    "outcome_domains": FieldReducer("join_unique", "outcome_domain"),
+    "has_vigilance_outcome": FieldReducer("any", "outcome_domain", test=lambda v: v.strip() == "vigilance"),
+    "vigilance_effect_summary": FieldReducer(
+        "custom", init=lambda: None, step=_vigilance_dirs_step, finish=_vigilance_summary_from_directions
+    ),
+    "habituation_signal_any": FieldReducer("any", "habituation_or_tolerance_signal", test=lambda v: v.strip().lower() == "yes"),
+}
+
+
+class _CompiledReducers:
+    """A reducer spec grouped by source column: each (column, parser) pair is parsed once per row."""
+
+    def __init__(self, spec: Dict[str, FieldReducer]) -> None:
+        for name, red in spec.items():
+            if red.op not in {"mode", "join_unique", "min", "max", "any", "custom"}:
+                raise ValueError(f"{name}: unknown reducer op {red.op!r}")
+        self.spec = spec
+        self.count_cols = sorted({r.column for r in spec.values() if r.op in {"mode", "join_unique"}})
+        # min/max reducers sharing a column and parser share one parse; different parsers on
+        # the same column are tracked separately.
+        self.parse_keys: Dict[str, Tuple[str, Callable[[str], Optional[float]]]] = {}
+        for name, r in spec.items():
+            if r.op in {"min", "max"}:
+                self.parse_keys[name] = (r.column, r.parse or _safe_float)
+        self.parse_cols = list(dict.fromkeys(self.parse_keys.values()))
+        self.any_tests = [(name, r.column, r.test) for name, r in spec.items() if r.op == "any" and r.test]
+        self.customs = [(name, r) for name, r in spec.items() if r.op == "custom"]
+
+    def reduce(self, rows: Iterable[Dict[str, str]]) -> Dict[str, Any]:
+        counts: Dict[str, Counter[str]] = {c: Counter() for c in self.count_cols}
+        lo: Dict[Tuple[str, Callable[[str], Optional[float]]], Optional[float]] = {k: None for k in self.parse_cols}
+        hi: Dict[Tuple[str, Callable[[str], Optional[float]]], Optional[float]] = {k: None for k in self.parse_cols}
+        hits = {name: False for name, _, _ in self.any_tests}
+        states = {name: r.init() if r.init else None for name, r in self.customs}
+
+        for row in rows:
+            for c in self.count_cols:
+                v = row.get(c, "")
+                if (v or "").strip():
+                    counts[c][v] += 1
+            for key in self.parse_cols:
+                c, parse = key
+                x = parse(row.get(c, ""))
+                if x is None:
+                    continue
+                if lo[key] is None or x < lo[key]:  # type: ignore[operator]
+                    lo[key] = x
+                if hi[key] is None or x > hi[key]:  # type: ignore[operator]
+                    hi[key] = x
+            for name, c, test in self.any_tests:
+                if not hits[name] and test(row.get(c) or ""):  # type: ignore[misc]
+                    hits[name] = True
+            for name, r in self.customs:
+                states[name] = r.step(states[name], row)  # type: ignore[misc]
+
+        out: Dict[str, Any] = {}
+        for name, r in self.spec.items():
+            if r.op == "mode":
+                out[name] = _mode_of_counts(counts[r.column])
+            elif r.op == "join_unique":
+                out[name] = "; ".join(sorted({v.strip() for v in counts[r.column]}))
+            elif r.op in {"min", "max"}:
+                out[name] = (lo if r.op == "min" else hi)[self.parse_keys[name]]
+            elif r.op == "any":
+                out[name] = "yes" if hits[name] else "no"
+            else:
+                out[name] = r.finish(states[name]) if r.finish else states[name]
+        return out
+
+
 def build_work_level_map(
     evidence_rows: List[Dict[str, str]],
     rob_rows: List[Dict[str, str]],
     manifest_rows: List[Dict[str, str]],
+    locked_question: Optional[str] = None,
 ) -> Tuple[List[WorkRow], Dict[str, Any]]:
     evidence_by_sid: Dict[str, List[Dict[str, str]]] = defaultdict(list)
     for r in evidence_rows:
@@ -162,6 +636,7 @@ def build_work_level_map(
 
     works: List[WorkRow] = []
     stats: Dict[str, Any] = {}
+    reducers = _CompiledReducers(WORK_REDUCERS)
 
     for sid in sorted(evidence_by_sid.keys()):
         rows = evidence_by_sid[sid]
@@ -175,27 +650,10 @@ def build_work_level_map(
         doi = (m.get("doi") or "").strip()
         notes_m = (m.get("notes") or "").strip()
 
-        year = _mode_str([r.get("publication_year", "") for r in rows]) or (m.get("publication_year") or "").strip()
-        citation = _mode_str([r.get("citation", "") for r in rows])
-        n_total = _mode_str([r.get("n_total", "") for r in rows])
-
-        settings = _join_unique([r.get("setting", "") for r in rows])
-        primary_setting = _mode_str([r.get("setting", "") for r in rows])
-
-        cats = [r.get("intervention_category", "") for r in rows]
-        primary_cat = _mode_str(cats)
-        cats_join = _join_unique(cats)
-
-        durs = [_safe_float(r.get("exposure_duration_days", "")) for r in rows]
-        durs = [d for d in durs if d is not None]
-        d_min = str(min(durs)) if durs else ""
-        d_max = str(max(durs)) if durs else ""
-
-        domains = _join_unique([r.get("outcome_domain", "") for r in rows])
-        has_vigilance = "yes" if any((r.get("outcome_domain") or "").strip() == "vigilance" for r in rows) else "no"
-        vig_sum = _vigilance_summary(rows)
-
-        hab_any = "yes" if any((r.get("habituation_or_tolerance_signal") or "").strip().lower() == "yes" for r in rows) else "no"
+        red = reducers.reduce(rows)
+        year = red["publication_year"] or (m.get("publication_year") or "").strip()
+        citation = red["citation"]
+        n_total, n_total_note = _parse_n_total(red["n_total"])
 
         rob_overall = (rob.get("rob_overall") or "").strip()
         rob_tool = (rob.get("rob_tool") or "").strip()
@@ -206,20 +664,20 @@ def build_work_level_map(
             WorkRow(
                 short_id=sid,
                 eligibility_tier=eligibility_tier,
-                publication_year=year,
+                publication_year=_parse_year(year),
                 citation=citation,
                 doi=doi,
-                primary_intervention_category=primary_cat,
-                intervention_categories=cats_join,
-                primary_setting=primary_setting,
-                settings=settings,
+                primary_intervention_category=red["primary_intervention_category"],
+                intervention_categories=red["intervention_categories"],
+                primary_setting=red["primary_setting"],
+                settings=red["settings"],
                 n_total=n_total,
-                exposure_days_min=d_min,
-                exposure_days_max=d_max,
-                outcome_domains=domains,
-                has_vigilance_outcome=has_vigilance,
-                vigilance_effect_summary=vig_sum,
-                habituation_signal_any=hab_any,
+                exposure_days_min=red["exposure_days_min"],
+                exposure_days_max=red["exposure_days_max"],
+                outcome_domains=red["outcome_domains"],
+                has_vigilance_outcome=red["has_vigilance_outcome"],
+                vigilance_effect_summary=red["vigilance_effect_summary"],
+                habituation_signal_any=red["habituation_signal_any"],
                 low_baseline_arousal_class=low_cls,
                 repeated_use_class=rep_cls,
                 habituation_class=hab_cls,
@@ -227,6 +685,7 @@ def build_work_level_map(
                 rob_tool=rob_tool,
                 abstract_only_flag=abstract_only,
                 notes=notes_m,
+                n_total_note=n_total_note,
             )
         )
 
@@ -240,7 +699,7 @@ def build_work_level_map(
     stats.update(
         {
             "generated_utc": _now_utc_iso(),
-            "locked_question": _read_locked_question(),
+            "locked_question": _read_locked_question() if locked_question is None else locked_question,
             "n_unique_works": len(works),
             "n_outcome_rows": len(evidence_rows),
             "works_by_tier": dict(tier_counts),
@@ -255,35 +714,40 @@ def build_work_level_map(
     return works, stats
 
 
-def write_work_map_csv(path: Path, works: List[WorkRow]) -> None:
-    fieldnames = [f.name for f in WorkRow.__dataclass_fields__.values()]  # type: ignore[attr-defined]
-    with open(path, "w", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
-        w.writeheader()
-        for row in works:
-            w.writerow(row.__dict__)
+def render_work_map_csv(works: List[WorkRow]) -> str:
+    return _render_csv(WORK_MAP_FIELDS, (row.as_csv_row() for row in works))
 
 
-def write_vigilance_outcomes_csv(path: Path, works: List[WorkRow], evidence_rows: List[Dict[str, str]]) -> None:
+def write_work_map_csv(path: Path, works: List[WorkRow]) -> None:
+    _write_text(path, render_work_map_csv(works))
+
+
+VIGILANCE_FIELDS = [
+    "short_id",
+    "eligibility_tier",
+    "citation",
+    "publication_year",
+    "primary_intervention_category",
+    "exposure_duration_days",
+    "outcome_measure",
+    "outcome_timepoint",
+    "timepoint_days",
+    "timepoint_basis",
+    "effect_direction",
+    "effect_size_reported",
+    "habituation_or_tolerance_signal",
+    "rob_overall",
+    "abstract_only_flag",
+]
+
+
+VigilanceKey = Tuple[int, int, str]
+
+
+def _iter_keyed_vigilance_rows(
+    works: List[WorkRow], evidence_rows: Iterable[Dict[str, str]]
+) -> Iterator[Tuple[VigilanceKey, Dict[str, str]]]:
     works_by_sid = {w.short_id: w for w in works}
-
-    fieldnames = [
-        "short_id",
-        "eligibility_tier",
-        "citation",
-        "publication_year",
-        "primary_intervention_category",
-        "exposure_duration_days",
-        "outcome_measure",
-        "outcome_timepoint",
-        "effect_direction",
-        "effect_size_reported",
-        "habituation_or_tolerance_signal",
-        "rob_overall",
-        "abstract_only_flag",
-    ]
-
-    rows_out: List[Dict[str, str]] = []
     for r in evidence_rows:
         if (r.get("outcome_domain") or "").strip() != "vigilance":
             continue
@@ -291,52 +755,186 @@ def write_vigilance_outcomes_csv(path: Path, works: List[WorkRow], evidence_rows
         w = works_by_sid.get(sid)
         if not w:
             continue
-        rows_out.append(
-            {
-                "short_id": sid,
-                "eligibility_tier": w.eligibility_tier,
-                "citation": w.citation,
-                "publication_year": w.publication_year,
-                "primary_intervention_category": w.primary_intervention_category,
-                "exposure_duration_days": (r.get("exposure_duration_days") or "").strip(),
-                "outcome_measure": (r.get("outcome_measure") or "").strip(),
-                "outcome_timepoint": (r.get("outcome_timepoint") or "").strip(),
-                "effect_direction": (r.get("effect_direction") or "").strip(),
-                "effect_size_reported": (r.get("effect_size_reported") or "").strip(),
-                "habituation_or_tolerance_signal": (r.get("habituation_or_tolerance_signal") or "").strip(),
-                "rob_overall": w.rob_overall,
-                "abstract_only_flag": w.abstract_only_flag,
-            }
-        )
+        # Stable ordering: core first, then context; then year desc; then short_id.
+        key = (0 if w.eligibility_tier == "T1_core" else 1, -(w.publication_year or 0), sid)
+        tp_days, tp_basis = parse_outcome_timepoint(r.get("outcome_timepoint", ""), r.get("exposure_duration_days", ""))
+        yield key, {
+            "short_id": sid,
+            "eligibility_tier": w.eligibility_tier,
+            "citation": w.citation,
+            "publication_year": w.text("publication_year"),
+            "primary_intervention_category": w.primary_intervention_category,
+            "exposure_duration_days": (r.get("exposure_duration_days") or "").strip(),
+            "outcome_measure": (r.get("outcome_measure") or "").strip(),
+            "outcome_timepoint": (r.get("outcome_timepoint") or "").strip(),
+            "timepoint_days": "" if tp_days is None else f"{tp_days:g}",
+            "timepoint_basis": tp_basis,
+            "effect_direction": (r.get("effect_direction") or "").strip(),
+            "effect_size_reported": (r.get("effect_size_reported") or "").strip(),
+            "habituation_or_tolerance_signal": (r.get("habituation_or_tolerance_signal") or "").strip(),
+            "rob_overall": w.rob_overall,
+            "abstract_only_flag": w.abstract_only_flag,
+        }
+
+
+def iter_vigilance_rows(works: List[WorkRow], evidence_rows: Iterable[Dict[str, str]]) -> Iterator[Dict[str, str]]:
+    """Vigilance-only outcome rows joined to work-level fields, in evidence-table order."""
+    return (row for _, row in _iter_keyed_vigilance_rows(works, evidence_rows))
+
 
-    # Stable ordering: core first, then context; then year desc; then short_id.
-    def _key(row: Dict[str, str]) -> Tuple[int, int, str]:
-        tier = row.get("eligibility_tier") or ""
-        tier_rank = 0 if tier == "T1_core" else 1
-        try:
-            year = int(row.get("publication_year") or "0")
-        except Exception:
-            year = 0
-        return (tier_rank, -year, row.get("short_id") or "")
+def _vigilance_sort_key(row: Dict[str, str]) -> VigilanceKey:
+    # Same order as the typed key, recomputed for rows read back from spill runs.
+    tier = row.get("eligibility_tier") or ""
+    tier_rank = 0 if tier == "T1_core" else 1
+    try:
+        year = int(row.get("publication_year") or "0")
+    except Exception:
+        year = 0
+    return (tier_rank, -year, row.get("short_id") or "")
+
+
+def _first(pair: Tuple[VigilanceKey, Dict[str, str]]) -> VigilanceKey:
+    return pair[0]
+
+
+def build_vigilance_rows(works: List[WorkRow], evidence_rows: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Vigilance-only outcome ledger joined to work-level fields, in report order."""
+    pairs = list(_iter_keyed_vigilance_rows(works, evidence_rows))
+    pairs.sort(key=_first)
+    return [row for _, row in pairs]
 
-    rows_out.sort(key=_key)
 
-    with open(path, "w", newline="") as f:
-        wtr = csv.DictWriter(f, fieldnames=fieldnames)
-        wtr.writeheader()
-        for row in rows_out:
-            wtr.writerow(row)
+def render_vigilance_outcomes_csv(vigilance_rows: List[Dict[str, str]]) -> str:
+    return _render_csv(VIGILANCE_FIELDS, vigilance_rows)
+
+
+# Rows held in memory per sorted run before spilling to disk (streaming vigilance writer).
+VIGILANCE_SPILL_ROWS = 100_000
+
+
+def _spill_run(pairs: List[Tuple[Any, Dict[str, str]]], path: Path, fieldnames: List[str]) -> Path:
+    pairs.sort(key=_first)
+    _write_text(path, _render_csv(fieldnames, (row for _, row in pairs)))
+    return path
+
+
+def sort_into_runs(
+    pairs: Iterable[Tuple[Any, Dict[str, str]]],
+    fieldnames: List[str],
+    tmpdir: Path,
+    max_rows_in_memory: int,
+    prefix: str,
+) -> Tuple[List[Path], List[Tuple[Any, Dict[str, str]]]]:
+    """
+    First half of an external sort over (key, row) pairs.
+
+    Every `max_rows_in_memory` pairs are sorted by key (stable) and spilled to
+    `tmpdir/<prefix>_NNNNN.csv`. Returns the run paths and the sorted remainder that was not
+    spilled; callers merge the runs (e.g. `heapq.merge` over `_iter_run`) or, if there are
+    none, use the remainder directly.
+    """
+    if max_rows_in_memory < 1:
+        raise ValueError("max_rows_in_memory must be >= 1")
+    runs: List[Path] = []
+    buf: List[Tuple[Any, Dict[str, str]]] = []
+    for pair in pairs:
+        buf.append(pair)
+        if len(buf) >= max_rows_in_memory:
+            runs.append(_spill_run(buf, tmpdir / f"{prefix}_{len(runs):05d}.csv", fieldnames))
+            buf = []
+    buf.sort(key=_first)
+    return runs, buf
+
+
+def _iter_run(path: Path) -> Iterator[Dict[str, str]]:
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+def write_vigilance_outcomes_csv(
+    path: Path,
+    works: List[WorkRow],
+    evidence_rows: Iterable[Dict[str, str]],
+    max_rows_in_memory: int = VIGILANCE_SPILL_ROWS,
+) -> None:
+    """
+    Stream the vigilance ledger to `path` with an external sort.
+
+    Rows are sorted in runs of at most `max_rows_in_memory` and spilled to temporary CSVs;
+    the runs are then heap-merged into the output. Python's sort and `heapq.merge` are both
+    stable, so the file is byte-identical to `render_vigilance_outcomes_csv(build_vigilance_rows(...))`.
+    """
+    with tempfile.TemporaryDirectory(prefix="vigilance_runs_") as td:
+        runs, buf = sort_into_runs(
+            _iter_keyed_vigilance_rows(works, evidence_rows), VIGILANCE_FIELDS, Path(td), max_rows_in_memory, "vigilance_run"
+        )
+        if not runs:
+            # Everything fit in one run: no spill needed.
+            merged: Iterable[Dict[str, str]] = (row for _, row in buf)
+        else:
+            if buf:
+                runs.append(_spill_run(buf, Path(td) / f"vigilance_run_{len(runs):05d}.csv", VIGILANCE_FIELDS))
+                buf = []
+            merged = heapq.merge(*(_iter_run(p) for p in runs), key=_vigilance_sort_key)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=VIGILANCE_FIELDS)
+            w.writeheader()
+            for row in merged:
+                w.writerow(row)
+
+
+def check_vigilance_stream(
+    works: List[WorkRow], evidence_rows: List[Dict[str, str]], max_rows_in_memory: int = VIGILANCE_SPILL_ROWS
+) -> bool:
+    """True if the streamed ledger and its .cols copy are byte-identical to the in-memory renders."""
+    with tempfile.TemporaryDirectory(prefix="vigilance_check_") as td:
+        path, cols = Path(td) / "vigilance.csv", Path(td) / "vigilance.cols"
+        write_vigilance_outcomes_csv(path, works, evidence_rows, max_rows_in_memory)
+        write_table_streamed(cols, VIGILANCE_FIELDS, lambda: _iter_run(path), max_rows_in_memory)
+        rows = build_vigilance_rows(works, evidence_rows)
+        return (
+            path.read_bytes() == render_vigilance_outcomes_csv(rows).encode("utf-8")
+            and cols.read_bytes() == encode_table(VIGILANCE_FIELDS, rows)
+        )
+
+
+def render_json(obj: Dict[str, Any]) -> str:
+    return json.dumps(obj, indent=2, sort_keys=True)
 
 
 def write_json(path: Path, obj: Dict[str, Any]) -> None:
-    path.write_text(json.dumps(obj, indent=2, sort_keys=True), encoding="utf-8")
+    path.write_text(render_json(obj), encoding="utf-8")
+
+
+def _fig_png(fig: Any) -> bytes:
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=200)
+    return buf.getvalue()
 
 
-def build_figures(works: List[WorkRow], evidence_rows: List[Dict[str, str]]) -> None:
+def build_figures(
+    works: List[WorkRow],
+    evidence_rows: List[Dict[str, str]],
+    trajectories: Optional[Dict[str, Any]] = None,
+    gap_cube: Optional[SparseGapCube] = None,
+) -> None:
+    OUT.mkdir(parents=True, exist_ok=True)
+    for name, png in render_figures(works, evidence_rows, trajectories, gap_cube).items():
+        (OUT / name).write_bytes(png)
+
+
+def render_figures(
+    works: List[WorkRow],
+    evidence_rows: List[Dict[str, str]],
+    trajectories: Optional[Dict[str, Any]] = None,
+    gap_cube: Optional[SparseGapCube] = None,
+    review_id: str = DEFAULT_REVIEW_ID,
+) -> Dict[str, bytes]:
+    """Render the synthesis figures as PNG bytes keyed by output file name."""
     # Local import so the script still runs in environments without mpl.
     import matplotlib.pyplot as plt
 
-    OUT.mkdir(parents=True, exist_ok=True)
+    figures: Dict[str, bytes] = {}
 
     # Fig 1: Unique works by primary intervention category, stacked by tier.
     tiers = ["T1_core", "T2_context"]
@@ -360,12 +958,12 @@ def build_figures(works: List[WorkRow], evidence_rows: List[Dict[str, str]]) ->
         ax.barh(cats_sorted, vals, left=left, color=colors.get(tier, "#7f7f7f"), label=tier)
         left = [l + v for l, v in zip(left, vals)]
 
-    ax.set_title("S001: Extracted Works by Primary Intervention Category (Unique Works)")
+    ax.set_title(f"{review_id}: Extracted Works by Primary Intervention Category (Unique Works)")
     ax.set_xlabel("Number of works")
     ax.invert_yaxis()
     ax.legend(loc="lower right", frameon=False)
     fig.tight_layout()
-    fig.savefig(OUT / "S001_fig1_study_counts_by_intervention.png", dpi=200)
+    figures[f"{review_id}_fig1_study_counts_by_intervention.png"] = _fig_png(fig)
     plt.close(fig)
 
     # Fig 2: Durability map for vigilance outcomes (work-level).
@@ -413,7 +1011,7 @@ def build_figures(works: List[WorkRow], evidence_rows: List[Dict[str, str]]) ->
     for w in works:
         if w.has_vigilance_outcome != "yes":
             continue
-        x = _safe_float(w.exposure_days_max) or 0.0
+        x = w.exposure_days_max or 0.0
         if x <= 0:
             continue
         y = y_pos.get(w.vigilance_effect_summary, y_pos["unclear"])
@@ -448,7 +1046,7 @@ def build_figures(works: List[WorkRow], evidence_rows: List[Dict[str, str]]) ->
     ax.set_yticks([y_pos[k] for k in y_order])
     ax.set_yticklabels(y_order)
     ax.set_xlabel("Repeated-use duration (days; max per work; log scale)")
-    ax.set_title("S001: Vigilance Durability Map (Work-Level Summary)")
+    ax.set_title(f"{review_id}: Vigilance Durability Map (Work-Level Summary)")
     ax.grid(True, axis="x", which="both", linestyle=":", alpha=0.4)
 
     # Legend: tiers + categories (top cats only)
@@ -463,7 +1061,7 @@ def build_figures(works: List[WorkRow], evidence_rows: List[Dict[str, str]]) ->
     ax.legend(handles, labels, loc="lower right", frameon=False, fontsize=8, ncol=2)
 
     fig.tight_layout()
-    fig.savefig(OUT / "S001_fig2_vigilance_durability_map.png", dpi=200)
+    figures[f"{review_id}_fig2_vigilance_durability_map.png"] = _fig_png(fig)
     plt.close(fig)
 
     # Fig 3: Risk of bias distribution by tier (work-level).
@@ -487,21 +1085,93 @@ def build_figures(works: List[WorkRow], evidence_rows: List[Dict[str, str]]) ->
     ax.set_xticks(x)
     ax.set_xticklabels(rob_order)
     ax.set_ylabel("Number of works")
-    ax.set_title("S001: Risk of Bias (Overall) Distribution by Tier")
+    ax.set_title(f"{review_id}: Risk of Bias (Overall) Distribution by Tier")
     ax.legend(frameon=False)
     fig.tight_layout()
-    fig.savefig(OUT / "S001_fig3_risk_of_bias_distribution.png", dpi=200)
+    figures[f"{review_id}_fig3_risk_of_bias_distribution.png"] = _fig_png(fig)
+    plt.close(fig)
+
+    # Fig 5: Gap heatmap (works per intervention category x duration bin; empty cells marked).
+    if gap_cube is not None and gap_cube.n:
+        cells = gap_cube.project(["intervention_category", "duration_bin"])
+        row_labels = [c for c in gap_cube.domain("intervention_category") if c != "(missing)"]
+        col_labels = [label for _, label in DURABILITY_BINS]
+        grid = [[cells.get((r, c), 0) for c in col_labels] for r in row_labels]
+        fig, ax = plt.subplots(figsize=(7.5, max(3.5, 0.45 * len(row_labels) + 1.5)))
+        im = ax.imshow(grid, cmap="Blues", aspect="auto", vmin=0)
+        vmax = max((v for row in grid for v in row), default=0)
+        for i, row in enumerate(grid):
+            for j, v in enumerate(row):
+                color = "#b22222" if not v else ("white" if v > vmax / 2 else "black")
+                ax.text(j, i, str(v) if v else "gap", ha="center", va="center", fontsize=8, color=color)
+        ax.set_xticks(range(len(col_labels)))
+        ax.set_xticklabels(col_labels)
+        ax.set_yticks(range(len(row_labels)))
+        ax.set_yticklabels(row_labels)
+        ax.set_xlabel("Repeated-use duration bin (max per work)")
+        ax.set_title(f"{review_id}: Evidence Gap Heatmap (Works per Category x Duration)")
+        fig.colorbar(im, ax=ax, label="Number of works")
+        fig.tight_layout()
+        figures[f"{review_id}_fig5_gap_heatmap.png"] = _fig_png(fig)
+        plt.close(fig)
+
+    if trajectories is None:
+        return figures
+
+    # Fig 4: Vigilance durability trajectories.
+    # Left: per-work effect-over-time series (x = parsed outcome timepoint, days since start; log scale).
+    # Right: durability curve per intervention category over codebook-aligned duration bins.
+    fig, (ax_l, ax_r) = plt.subplots(1, 2, figsize=(13, 5.4), gridspec_kw={"width_ratios": [1.35, 1]})
+
+    series: Dict[Tuple[str, str], List[Tuple[float, float]]] = defaultdict(list)
+    for t in trajectories.get("trajectories", []):
+        series[(t["short_id"], t["intervention_category"])].append((t["timepoint_days"], t["mean_direction_score"]))
+    for (sid, cat), pts in sorted(series.items()):
+        pts.sort()
+        xs = [max(p[0], 1.0) for p in pts]
+        ys = [p[1] for p in pts]
+        color = cat_color.get(cat, "#444444")
+        ax_l.plot(xs, ys, "-o", color=color, alpha=0.7, lw=1.0, ms=4)
+    ax_l.set_xscale("log")
+    ax_l.set_yticks([-1, 0, 1])
+    ax_l.set_yticklabels(["worsens", "null/mixed", "improves"])
+    ax_l.set_ylim(-1.3, 1.3)
+    ax_l.set_xlabel("Outcome timepoint (days since start; log scale)")
+    ax_l.set_title("Per-work vigilance trajectories")
+    ax_l.grid(True, which="both", axis="x", alpha=0.2)
+
+    bin_labels = [label for _, label in DURABILITY_BINS]
+    for cat, curve in sorted(trajectories.get("curves", {}).items()):
+        pts = [(i, c["mean_direction_score"], c["n_works"]) for i, c in enumerate(curve) if c["mean_direction_score"] is not None]
+        if not pts:
+            continue
+        color = cat_color.get(cat, "#444444")
+        ax_r.plot([p[0] for p in pts], [p[1] for p in pts], "-", color=color, alpha=0.8, lw=1.4, label=cat)
+        ax_r.scatter([p[0] for p in pts], [p[1] for p in pts], s=[30 + 25 * p[2] for p in pts], color=color, alpha=0.85, edgecolors="white", linewidths=0.7)
+    ax_r.axhline(0, color="0.6", lw=0.8, ls="--")
+    ax_r.set_xticks(range(len(bin_labels)))
+    ax_r.set_xticklabels(bin_labels)
+    ax_r.set_ylim(-1.1, 1.1)
+    ax_r.set_xlabel("Outcome timepoint bin")
+    ax_r.set_ylabel("Mean direction score (improves=+1, worsens=-1)")
+    ax_r.set_title("Durability curve by intervention category")
+    ax_r.legend(loc="lower left", frameon=False, fontsize=7.5, ncol=2)
+
+    fig.suptitle(f"{review_id}: Vigilance Effect Direction Over Repeated Use")
+    fig.tight_layout()
+    figures[f"{review_id}_fig4_durability_trajectories.png"] = _fig_png(fig)
     plt.close(fig)
+    return figures
 
 
-def write_report_md(
+def render_report_md(
     works: List[WorkRow],
     stats: Dict[str, Any],
     evidence_rows: List[Dict[str, str]],
     manifest_rows: List[Dict[str, str]],
-) -> None:
-    out_path = OUT / "S001_synthesis_report.md"
-
+    review_id: str = DEFAULT_REVIEW_ID,
+    out_rel: str = DEFAULT_OUT_REL,
+) -> str:
     # Build quick access lookups
     manifest_by_sid = {r["short_id"]: r for r in manifest_rows if r.get("short_id")}
     works_by_sid = {w.short_id: w for w in works}
@@ -521,7 +1191,7 @@ def write_report_md(
     core_vig = []
     for sid in core_ids:
         w = works_by_sid[sid]
-        core_vig.append((sid, w.citation, w.primary_intervention_category, w.exposure_days_max, w.vigilance_effect_summary, w.habituation_signal_any))
+        core_vig.append((sid, w.citation, w.primary_intervention_category, w.text("exposure_days_max"), w.vigilance_effect_summary, w.habituation_signal_any))
 
     # Habituation / tolerance signals
     hab_ids = sorted([w.short_id for w in works if w.habituation_signal_any == "yes"])
@@ -531,7 +1201,7 @@ def write_report_md(
     cat_top = cat_counts.most_common()
 
     lines: List[str] = []
-    lines.append("# S001 Synthesis Report (Draft Working Notes)")
+    lines.append(f"# {review_id} Synthesis Report (Draft Working Notes)")
     lines.append("")
     lines.append(f"- Generated (UTC): `{stats.get('generated_utc','')}`")
     lines.append(f"- Locked question: {stats.get('locked_question','').strip()}")
@@ -584,7 +1254,7 @@ def write_report_md(
         comparator = pick(rows, "comparator")
         setting = pick(rows, "setting")
         n_total = pick(rows, "n_total")
-        dmax = w.exposure_days_max
+        dmax = w.text("exposure_days_max")
 
         lines.append(f"#### `{sid}` - {w.citation}")
         lines.append(f"- Tier: `{w.eligibility_tier}`")
@@ -653,7 +1323,7 @@ def write_report_md(
             rows = evidence_by_sid.get(sid, [])
             design = pick(rows, "study_design")
             pop = pick(rows, "population_description")
-            dmax = w.exposure_days_max
+            dmax = w.text("exposure_days_max")
             lines.append(f"- `{sid}` {w.citation} (duration max={dmax}d; RoB={w.rob_overall}; {('ABSTRACT-ONLY' if w.abstract_only_flag=='yes' else 'full-text')}): {design}. Population: {pop}.")
             v_rows = [r for r in rows if (r.get('outcome_domain') or '').strip() == 'vigilance']
             for r in v_rows:
@@ -678,11 +1348,7 @@ def write_report_md(
             w = works_by_sid[sid]
             a = 0 if w.abstract_only_flag == "yes" else 1
             h = 0 if w.habituation_signal_any == "yes" else 1
-            try:
-                y = -int(w.publication_year or "0")
-            except Exception:
-                y = 0
-            return (a, h, y, sid)
+            return (a, h, -(w.publication_year or 0), sid)
 
         for sid in sorted(light_ctx_ids, key=_prio):
             w = works_by_sid[sid]
@@ -692,7 +1358,7 @@ def write_report_md(
             # Keep to the most relevant endpoints for the locked question framing.
             v_rows = [r for r in rows if (r.get("outcome_domain") or "").strip() == "vigilance"]
             s_rows = [r for r in rows if (r.get("outcome_domain") or "").strip() == "sleepiness"]
-            dmax = w.exposure_days_max
+            dmax = w.text("exposure_days_max")
             lines.append(f"- `{sid}` {w.citation} (duration max={dmax}d; abstract_only={w.abstract_only_flag}; RoB={w.rob_overall})")
             if w.abstract_only_flag == "yes":
                 lines.append("- Note: extracted from abstract only due to paywalled full text; treat as context with reduced confidence.")
@@ -724,25 +1390,34 @@ def write_report_md(
     lines.append("- Explicitly separates **core evidence** (T1_core) from **context evidence** (T2_context) and avoids overstating generalizability to trait low-arousal individuals.")
     lines.append("")
 
-    lines.append("## Files Generated (S001)")
+    lines.append(f"## Files Generated ({review_id})")
     lines.append("")
-    lines.append("- Work-level evidence map: `output/synthesis/S001_evidence_map_worklevel.csv`")
-    lines.append("- Vigilance-only outcomes table: `output/synthesis/S001_vigilance_outcomes.csv`")
+    lines.append(f"- Work-level evidence map: `{out_rel}/{review_id}_evidence_map_worklevel.csv`")
+    lines.append(f"- Vigilance-only outcomes table: `{out_rel}/{review_id}_vigilance_outcomes.csv`")
     lines.append("- Figures:")
-    lines.append("  - `output/synthesis/S001_fig1_study_counts_by_intervention.png`")
-    lines.append("  - `output/synthesis/S001_fig2_vigilance_durability_map.png`")
-    lines.append("  - `output/synthesis/S001_fig3_risk_of_bias_distribution.png`")
-    lines.append("- Gap map (draft): `output/synthesis/S001_gap_map.md`")
-    lines.append("- Manuscript outline (draft): `output/synthesis/S001_manuscript_outline.md`")
+    lines.append(f"  - `{out_rel}/{review_id}_fig1_study_counts_by_intervention.png`")
+    lines.append(f"  - `{out_rel}/{review_id}_fig2_vigilance_durability_map.png`")
+    lines.append(f"  - `{out_rel}/{review_id}_fig3_risk_of_bias_distribution.png`")
+    lines.append(f"  - `{out_rel}/{review_id}_fig4_durability_trajectories.png`")
+    lines.append(f"  - `{out_rel}/{review_id}_fig5_gap_heatmap.png`")
+    lines.append(f"- Durability trajectories (parsed timepoints): `{out_rel}/{review_id}_durability_trajectories.csv`")
+    lines.append(f"- Gap map (draft): `{out_rel}/{review_id}_gap_map.md`")
+    lines.append(f"- Ranked gap table (sparse gap cube): `{out_rel}/{review_id}_gap_table.csv`")
+    lines.append(f"- Manuscript outline (draft): `{out_rel}/{review_id}_manuscript_outline.md`")
     lines.append("")
 
-    out_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return "\n".join(lines) + "\n"
 
 
-def write_gap_map_md(works: List[WorkRow], stats: Dict[str, Any]) -> None:
-    out_path = OUT / "S001_gap_map.md"
+def render_gap_map_md(
+    works: List[WorkRow],
+    stats: Dict[str, Any],
+    gap_rows: Optional[List[Dict[str, Any]]] = None,
+    review_id: str = DEFAULT_REVIEW_ID,
+    out_rel: str = DEFAULT_OUT_REL,
+) -> str:
     lines: List[str] = []
-    lines.append("# S001 Gap Map (Draft)")
+    lines.append(f"# {review_id} Gap Map (Draft)")
     lines.append("")
     lines.append(f"- Generated (UTC): `{stats.get('generated_utc','')}`")
     lines.append(f"- Locked question: {stats.get('locked_question','').strip()}")
@@ -769,20 +1444,41 @@ def write_gap_map_md(works: List[WorkRow], stats: Dict[str, Any]) -> None:
     lines.append("- Blinding is often infeasible; strong designs therefore need robust counterbalancing, objective endpoints, and careful control of expectancy and carryover.")
     lines.append("- Many studies are underpowered or have subset analyses for PVT; publication-quality conclusions require larger samples and preregistered primary outcomes.")
     lines.append("")
+    if gap_rows is not None:
+        gc = stats.get("gap_cube", {})
+        lines.append("## Data-Driven Gaps (Sparse Gap Cube)")
+        lines.append("")
+        lines.append(
+            f"Works are counted over {' x '.join(gc.get('dimensions', []))} "
+            f"({gc.get('n_nonempty_cells', 0)} non-empty of {gc.get('n_dense_cells', 0)} possible cells). "
+            "Pairs of dimension values are ranked by how many works would be expected if the two were independent "
+            f"minus how many were found; `empty` = no works, `thin` = one work. Full table: `{out_rel}/{review_id}_gap_table.csv`; heatmap: Fig 5."
+        )
+        lines.append("")
+        missing = gc.get("known_values_without_works", [])
+        if missing:
+            lines.append(f"- Duration bins / codebook classes with no extracted works: {', '.join(f'`{m}`' for m in missing)}")
+            lines.append("")
+        lines.append("| rank | dimensions | values | status | observed | expected |")
+        lines.append("|---:|---|---|---|---:|---:|")
+        for g in gap_rows[:15]:
+            lines.append(f"| {g['rank']} | {g['dimensions']} | `{g['values']}` | {g['status']} | {g['observed_works']} | {g['expected_works']} |")
+        lines.append("")
     lines.append("## Highest-Leverage Next-Step Analyses (Secondary Research Only)")
     lines.append("")
     lines.append("1. Build a durability-first taxonomy: classify each protocol by expected mechanism (sleep pressure reduction, circadian phase management, sensory stimulation, autonomic modulation) and map which mechanisms show evidence of attenuation.")
     lines.append("2. Extract and compare protocol 'dose' parameters (light intensity/target, timing, adherence) and tie them to effect direction and durability windows.")
     lines.append("3. Formalize a 'habituation' coding scheme usable across heterogeneous designs, then re-label the evidence in a transparent audit trail (can be done without new experiments).")
     lines.append("")
-    out_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return "\n".join(lines) + "\n"
 
 
-def write_manuscript_outline_md(stats: Dict[str, Any]) -> None:
-    out_path = OUT / "S001_manuscript_outline.md"
+def render_manuscript_outline_md(
+    stats: Dict[str, Any], review_id: str = DEFAULT_REVIEW_ID, out_rel: str = DEFAULT_OUT_REL
+) -> str:
     q = (stats.get("locked_question") or "").strip()
     lines: List[str] = []
-    lines.append("# S001 Manuscript Outline (Draft)")
+    lines.append(f"# {review_id} Manuscript Outline (Draft)")
     lines.append("")
     lines.append(f"- Generated (UTC): `{stats.get('generated_utc','')}`")
     lines.append("")
@@ -832,19 +1528,36 @@ def write_manuscript_outline_md(stats: Dict[str, Any]) -> None:
     lines.append("- Limitations (proxy populations; heterogeneity; unblinded designs; abstract-only context item).")
     lines.append("- Research agenda: a next-generation repeated-use trial architecture (counterbalanced, objective endpoints, physiology + performance, preregistered).")
     lines.append("")
-    lines.append("## Figures/Tables (From S001)")
-    lines.append("- Fig 1: `output/synthesis/S001_fig1_study_counts_by_intervention.png`")
-    lines.append("- Fig 2: `output/synthesis/S001_fig2_vigilance_durability_map.png`")
-    lines.append("- Fig 3: `output/synthesis/S001_fig3_risk_of_bias_distribution.png`")
-    lines.append("- Table: `output/synthesis/S001_evidence_map_worklevel.csv` (convert to manuscript Table 1).")
+    lines.append(f"## Figures/Tables (From {review_id})")
+    lines.append(f"- Fig 1: `{out_rel}/{review_id}_fig1_study_counts_by_intervention.png`")
+    lines.append(f"- Fig 2: `{out_rel}/{review_id}_fig2_vigilance_durability_map.png`")
+    lines.append(f"- Fig 3: `{out_rel}/{review_id}_fig3_risk_of_bias_distribution.png`")
+    lines.append(f"- Fig 4: `{out_rel}/{review_id}_fig4_durability_trajectories.png`")
+    lines.append(f"- Fig 5: `{out_rel}/{review_id}_fig5_gap_heatmap.png`")
+    lines.append(f"- Table: `{out_rel}/{review_id}_evidence_map_worklevel.csv` (convert to manuscript Table 1).")
     lines.append("")
-    out_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return "\n".join(lines) + "\n"
 
 
-def write_figure_captions_md(stats: Dict[str, Any]) -> None:
-    out_path = OUT / "S001_figure_captions.md"
+def _timepoint_fallback_note(stats: Dict[str, Any]) -> str:
+    """Caption sentence giving the share of vigilance rows placed at the end of exposure for lack of stated timing."""
+    basis = stats.get("outcome_timepoint_basis_counts") or {}
+    total = sum(basis.values())
+    fallback = int(basis.get("end_of_exposure", 0))
+    if not total or not fallback:
+        return ""
+    return (
+        f" {fallback} of {total} vigilance rows ({100.0 * fallback / total:.0f}%) state no usable timing and are placed"
+        " at the end of exposure, so for those rows the x-position repeats the exposure duration shown in Fig 2;"
+        " per-row days and basis are in the vigilance outcome ledger (`timepoint_days`, `timepoint_basis`)."
+    )
+
+
+def render_figure_captions_md(
+    stats: Dict[str, Any], review_id: str = DEFAULT_REVIEW_ID, out_rel: str = DEFAULT_OUT_REL
+) -> str:
     lines: List[str] = []
-    lines.append("# S001 Figure Captions (Draft)")
+    lines.append(f"# {review_id} Figure Captions (Draft)")
     lines.append("")
     lines.append(f"- Generated (UTC): `{stats.get('generated_utc','')}`")
     lines.append("")
@@ -857,14 +1570,23 @@ def write_figure_captions_md(stats: Dict[str, Any]) -> None:
     lines.append("## Fig 3")
     lines.append("Risk of bias (overall) distribution by tier, using the per-work RoB summary recorded in `data/risk_of_bias.csv`. Missing/unclear ratings reflect incomplete reporting and/or abstract-only extraction for paywalled full texts.")
     lines.append("")
-    out_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    lines.append("## Fig 4")
+    lines.append("Vigilance durability trajectories. Left: per-work effect direction (improves=+1, null/mixed=0, worsens=-1; unclear omitted) at each outcome timepoint, with free-text timepoints normalized to days since intervention start (log scale). Right: mean direction score per intervention category across duration bins aligned with the codebook repeated-use classes; marker size scales with the number of works. Direction scores summarize reported effects and are not pooled effect sizes." + _timepoint_fallback_note(stats))
+    lines.append("")
+    lines.append("## Fig 5")
+    lines.append(f"Evidence gap heatmap: number of extracted works per intervention category and repeated-use duration bin (maximum duration per work). Cells marked `gap` have no works; the ranked gap table over all dimension pairs is in `{out_rel}/{review_id}_gap_table.csv`.")
+    lines.append("")
+    return "\n".join(lines) + "\n"
 
 
-def write_results_and_discussion_drafts(
+def render_results_and_discussion_drafts(
     works: List[WorkRow],
     stats: Dict[str, Any],
     evidence_rows: List[Dict[str, str]],
-) -> None:
+    review_id: str = DEFAULT_REVIEW_ID,
+    out_rel: str = DEFAULT_OUT_REL,
+) -> Tuple[str, str]:
+    """Returns (results_draft_md, discussion_draft_md)."""
     works_by_sid = {w.short_id: w for w in works}
     evidence_by_sid: Dict[str, List[Dict[str, str]]] = defaultdict(list)
     for r in evidence_rows:
@@ -877,15 +1599,13 @@ def write_results_and_discussion_drafts(
 
     # Work-level counts for quick statements
     core_cats = Counter(works_by_sid[sid].primary_intervention_category for sid in core_ids)
-    core_durs = [_safe_float(works_by_sid[sid].exposure_days_max) for sid in core_ids]
-    core_durs = [d for d in core_durs if d is not None]
+    core_durs = [d for d in (works_by_sid[sid].exposure_days_max for sid in core_ids) if d is not None]
     core_dur_min = min(core_durs) if core_durs else None
     core_dur_max = max(core_durs) if core_durs else None
 
     # RESULTS DRAFT
-    r_path = OUT / "S001_results_draft.md"
     r_lines: List[str] = []
-    r_lines.append("# S001 Results Draft (Working Text)")
+    r_lines.append(f"# {review_id} Results Draft (Working Text)")
     r_lines.append("")
     r_lines.append(f"- Generated (UTC): `{stats.get('generated_utc','')}`")
     r_lines.append("")
@@ -912,7 +1632,7 @@ def write_results_and_discussion_drafts(
             w = works_by_sid[sid]
             rows = evidence_by_sid.get(sid, [])
             pop = _mode_str([(r.get("population_description") or "").strip() for r in rows])
-            dmax = w.exposure_days_max
+            dmax = w.text("exposure_days_max")
             r_lines.append(f"- `{sid}` {w.citation} (duration max={dmax}d; RoB={w.rob_overall}): {pop}.")
             for r in [rr for rr in rows if (rr.get("outcome_domain") or "").strip() == "vigilance"]:
                 r_lines.append(f"- Vigilance `{r.get('outcome_measure','').strip()}` ({r.get('outcome_timepoint','').strip()}): `{r.get('effect_direction','').strip()}`; {r.get('effect_size_reported','').strip()}")
@@ -929,7 +1649,7 @@ def write_results_and_discussion_drafts(
             w = works_by_sid[sid]
             rows = evidence_by_sid.get(sid, [])
             pop = _mode_str([(r.get("population_description") or "").strip() for r in rows])
-            dmax = w.exposure_days_max
+            dmax = w.text("exposure_days_max")
             r_lines.append(f"- `{sid}` {w.citation} (duration max={dmax}d; RoB={w.rob_overall}; habituation_signal={w.habituation_signal_any}): {pop}.")
             for r in [rr for rr in rows if (rr.get("outcome_domain") or "").strip() == "vigilance"]:
                 r_lines.append(f"- Vigilance `{r.get('outcome_measure','').strip()}` ({r.get('outcome_timepoint','').strip()}): `{r.get('effect_direction','').strip()}`; {r.get('effect_size_reported','').strip()}")
@@ -948,7 +1668,7 @@ def write_results_and_discussion_drafts(
             w = works_by_sid[sid]
             rows = evidence_by_sid.get(sid, [])
             pop = _mode_str([(r.get("population_description") or "").strip() for r in rows])
-            dmax = w.exposure_days_max
+            dmax = w.text("exposure_days_max")
             r_lines.append(f"- `{sid}` {w.citation} (duration max={dmax}d; RoB={w.rob_overall}): {pop}.")
             for r in [rr for rr in rows if (rr.get("outcome_domain") or "").strip() == "vigilance"]:
                 r_lines.append(f"- Vigilance `{r.get('outcome_measure','').strip()}` ({r.get('outcome_timepoint','').strip()}): `{r.get('effect_direction','').strip()}`; {r.get('effect_size_reported','').strip()}")
@@ -967,7 +1687,7 @@ def write_results_and_discussion_drafts(
             w = works_by_sid[sid]
             rows = evidence_by_sid.get(sid, [])
             pop = _mode_str([(r.get("population_description") or "").strip() for r in rows])
-            dmax = w.exposure_days_max
+            dmax = w.text("exposure_days_max")
             r_lines.append(f"- `{sid}` {w.citation} (duration max={dmax}d; RoB={w.rob_overall}): {pop}.")
             for r in [rr for rr in rows if (rr.get("outcome_domain") or "").strip() == "vigilance"]:
                 r_lines.append(f"- Vigilance `{r.get('outcome_measure','').strip()}` ({r.get('outcome_timepoint','').strip()}): `{r.get('effect_direction','').strip()}`; {r.get('effect_size_reported','').strip()}")
@@ -975,19 +1695,32 @@ def write_results_and_discussion_drafts(
         r_lines.append("In the extracted multicomponent core evidence, objective vigilance changes were limited, despite some subjective improvements reported in the underlying papers.")
         r_lines.append("")
 
+    curves = stats.get("vigilance_durability_curves_by_category") or {}
+    if curves:
+        r_lines.append("## Vigilance Effect Direction Over Repeated Use (Parsed Timepoints)")
+        r_lines.append("")
+        r_lines.append("Outcome timepoints were normalized to days since intervention start and vigilance effect directions scored (improves=+1, null/mixed=0, worsens=-1). Mean score per duration bin (works):")
+        r_lines.append("")
+        bins = [label for _, label in DURABILITY_BINS]
+        r_lines.append("| intervention category | " + " | ".join(bins) + " |")
+        r_lines.append("|---|" + "---:|" * len(bins))
+        for cat, curve in sorted(curves.items()):
+            cells = ["" if c["mean_direction_score"] is None else f"{c['mean_direction_score']:+.2f} ({c['n_works']})" for c in curve]
+            r_lines.append(f"| `{cat}` | " + " | ".join(cells) + " |")
+        r_lines.append("")
+        r_lines.append(f"See `{out_rel}/{review_id}_durability_trajectories.csv` for the per-work series behind Fig 4.")
+        r_lines.append("")
+
     r_lines.append("## Context Evidence for Habituation/Tolerance Framing (T2_context)")
     r_lines.append("")
     r_lines.append("Context studies were extracted under a pre-specified cutoff emphasizing repeated-use duration and/or explicit habituation testing. These studies inform interpretation of durability mechanisms (e.g., stimulant tolerance/withdrawal; time-of-day and circadian interactions in light).")
     r_lines.append("")
-    r_lines.append("See `output/synthesis/S001_vigilance_outcomes.csv` for the vigilance-only endpoint ledger used for this synthesis.")
+    r_lines.append(f"See `{out_rel}/{review_id}_vigilance_outcomes.csv` for the vigilance-only endpoint ledger used for this synthesis.")
     r_lines.append("")
 
-    r_path.write_text("\n".join(r_lines) + "\n", encoding="utf-8")
-
     # DISCUSSION DRAFT
-    d_path = OUT / "S001_discussion_draft.md"
     d_lines: List[str] = []
-    d_lines.append("# S001 Discussion Draft (Working Text)")
+    d_lines.append(f"# {review_id} Discussion Draft (Working Text)")
     d_lines.append("")
     d_lines.append(f"- Generated (UTC): `{stats.get('generated_utc','')}`")
     d_lines.append("")
@@ -1016,21 +1749,24 @@ def write_results_and_discussion_drafts(
     d_lines.append("- Abstract-only extraction exists for at least one context item due to paywalled full text; these items are treated as context with reduced confidence.")
     d_lines.append("")
 
-    d_path.write_text("\n".join(d_lines) + "\n", encoding="utf-8")
+    return "\n".join(r_lines) + "\n", "\n".join(d_lines) + "\n"
 
 
-def write_manuscript_draft_md(stats: Dict[str, Any]) -> None:
+def render_manuscript_draft_md(
+    stats: Dict[str, Any],
+    results_md: str,
+    discussion_md: str,
+    prisma_flow_text: Optional[str] = None,
+    review_id: str = DEFAULT_REVIEW_ID,
+    out_rel: str = DEFAULT_OUT_REL,
+) -> str:
     """
     Assemble a single manuscript draft that pulls Methods text from protocol/PRISMA docs
     and embeds the current Results + Discussion drafts (with heading levels adjusted).
     """
-    out_path = OUT / "S001_manuscript_draft.md"
-
-    def read_text(path: Path) -> str:
-        return path.read_text(encoding="utf-8")
 
-    def md_body_demote(path: Path, demote_by: int = 1) -> str:
-        lines = read_text(path).splitlines()
+    def md_body_demote(text: str, demote_by: int = 1) -> str:
+        lines = text.splitlines()
         # Drop the top metadata block; keep from first "##" heading onward.
         start = 0
         for i, ln in enumerate(lines):
@@ -1048,24 +1784,14 @@ def write_manuscript_draft_md(stats: Dict[str, Any]) -> None:
                 out_lines.append(ln)
         return "\n".join(out_lines).strip() + "\n"
 
-    # Inputs
-    protocol_prisma = ROOT / "protocol" / "01_prisma_protocol.md"
-    protocol_search_log = ROOT / "protocol" / "02_exact_search_strategy_log.md"
-    protocol_prisma_flow = ROOT / "protocol" / "03_prisma_flow_and_reporting_text.md"
-    protocol_corpus = ROOT / "protocol" / "04_corpus_status_and_reproducibility.md"
-    codebook = ROOT / "protocol" / "06_fulltext_screening_codebook.md"
-    extraction_schema = ROOT / "protocol" / "07_evidence_extraction_schema.md"
-    t2_cutoff = ROOT / "workflow" / "extraction" / "10_T2_context_cutoff_and_stopping_rule.md"
-
-    results_draft = OUT / "S001_results_draft.md"
-    discussion_draft = OUT / "S001_discussion_draft.md"
-
     # Pull the manuscript-ready methods/search text block from the PRISMA flow doc.
     # We keep it concise and point to the full search log as supplement.
-    prisma_flow_txt = read_text(protocol_prisma_flow)
+    if prisma_flow_text is None:
+        prisma_flow_text = PRISMA_FLOW_PATH.read_text(encoding="utf-8")
+    prisma_flow_txt = prisma_flow_text
 
     lines: List[str] = []
-    lines.append("# Manuscript Draft (S001)")
+    lines.append(f"# Manuscript Draft ({review_id})")
     lines.append("")
     lines.append("## Working Title")
     lines.append("Durability of Natural Arousal-Enhancing Protocols in Low-Arousal Adults: A Systematic Review Focused on Habituation and Sustained Vigilance")
@@ -1095,7 +1821,9 @@ def write_manuscript_draft_md(stats: Dict[str, Any]) -> None:
         ei = text.find(end, si2)
         if ei < 0:
             ei = len(text)
-        return text[si2:ei].strip()
+        # Drop the markers around blocks generated by prisma_flow.py; keep their content.
+        body = "\n".join(ln for ln in text[si2:ei].splitlines() if not ln.startswith("<!-- prisma_flow.py:"))
+        return body.strip()
 
     meth_search = extract_between(
         prisma_flow_txt,
@@ -1141,7 +1869,7 @@ def write_manuscript_draft_md(stats: Dict[str, Any]) -> None:
 
     lines.append("### Synthesis Approach")
     lines.append("")
-    lines.append("Given heterogeneous designs and endpoints, we performed a narrative synthesis oriented around repeated-use durability and habituation/tolerance signals, supplemented by evidence mapping visualizations (see `output/synthesis/`). Core conclusions are based on `T1_core` evidence; `T2_context` is used to constrain interpretation and map gaps.")
+    lines.append(f"Given heterogeneous designs and endpoints, we performed a narrative synthesis oriented around repeated-use durability and habituation/tolerance signals, supplemented by evidence mapping visualizations (see `{out_rel}/`). Core conclusions are based on `T1_core` evidence; `T2_context` is used to constrain interpretation and map gaps.")
     lines.append("")
 
     lines.append("## Results (Draft)")
@@ -1161,23 +1889,25 @@ def write_manuscript_draft_md(stats: Dict[str, Any]) -> None:
 
     lines.append("### Extracted Evidence Base")
     lines.append("")
-    lines.append(f"Across the extracted evidence set, we mapped {stats.get('n_unique_works')} works and {stats.get('n_outcome_rows')} outcome rows (see `output/synthesis/S001_evidence_map_worklevel.csv` and `output/synthesis/S001_vigilance_outcomes.csv`).")
+    lines.append(f"Across the extracted evidence set, we mapped {stats.get('n_unique_works')} works and {stats.get('n_outcome_rows')} outcome rows (see `{out_rel}/{review_id}_evidence_map_worklevel.csv` and `{out_rel}/{review_id}_vigilance_outcomes.csv`).")
     lines.append("")
 
     # Embed the results draft content, demoted by one level.
-    lines.append(md_body_demote(results_draft, demote_by=1))
+    lines.append(md_body_demote(results_md, demote_by=1))
 
     lines.append("## Discussion (Draft)")
     lines.append("")
-    lines.append(md_body_demote(discussion_draft, demote_by=1))
+    lines.append(md_body_demote(discussion_md, demote_by=1))
 
     lines.append("## Figures and Tables (Current Draft Set)")
     lines.append("")
-    lines.append("- Fig 1: `output/synthesis/S001_fig1_study_counts_by_intervention.png`")
-    lines.append("- Fig 2: `output/synthesis/S001_fig2_vigilance_durability_map.png`")
-    lines.append("- Fig 3: `output/synthesis/S001_fig3_risk_of_bias_distribution.png`")
-    lines.append("- Table (work-level evidence map): `output/synthesis/S001_evidence_map_worklevel.csv`")
-    lines.append("- Table (vigilance endpoints): `output/synthesis/S001_vigilance_outcomes.csv`")
+    lines.append(f"- Fig 1: `{out_rel}/{review_id}_fig1_study_counts_by_intervention.png`")
+    lines.append(f"- Fig 2: `{out_rel}/{review_id}_fig2_vigilance_durability_map.png`")
+    lines.append(f"- Fig 3: `{out_rel}/{review_id}_fig3_risk_of_bias_distribution.png`")
+    lines.append(f"- Fig 4: `{out_rel}/{review_id}_fig4_durability_trajectories.png`")
+    lines.append(f"- Fig 5: `{out_rel}/{review_id}_fig5_gap_heatmap.png`")
+    lines.append(f"- Table (work-level evidence map): `{out_rel}/{review_id}_evidence_map_worklevel.csv`")
+    lines.append(f"- Table (vigilance endpoints): `{out_rel}/{review_id}_vigilance_outcomes.csv`")
     lines.append("")
 
     lines.append("## Supplementary Material (Audit Trail)")
@@ -1189,30 +1919,161 @@ def write_manuscript_draft_md(stats: Dict[str, Any]) -> None:
     lines.append("- Evidence extraction schema: `protocol/07_evidence_extraction_schema.md`")
     lines.append("")
 
-    out_path.write_text("\n".join(lines).rstrip() + "\n", encoding="utf-8")
-
-
-def main() -> int:
-    OUT.mkdir(parents=True, exist_ok=True)
-
-    evidence_rows = _read_csv_dicts(EVIDENCE_PATH)
-    rob_rows = _read_csv_dicts(ROB_PATH)
-    manifest_rows = _read_csv_dicts(MANIFEST_PATH)
-
-    works, stats = build_work_level_map(evidence_rows, rob_rows, manifest_rows)
+    return "\n".join(lines).rstrip() + "\n"
+
+
+@dataclass
+class SynthesisResult:
+    """In-memory synthesis artifacts; `artifacts()` maps output file names to their contents."""
+
+    works: List[WorkRow]
+    vigilance_rows: List[Dict[str, str]]
+    trajectories: Dict[str, Any]
+    stats: Dict[str, Any]
+    tables: Dict[str, str]
+    markdown: Dict[str, str]
+    figures: Dict[str, bytes]
+    gap_cube: Optional[SparseGapCube] = None
+    # Dictionary-encoded columnar copies of the CSV tables (columnar_tables.py).
+    columnar: Dict[str, bytes] = field(default_factory=dict)
+    # Artifacts written straight to disk by `write()` rather than held in memory:
+    # file name -> writer(out_dir), called in insertion order.
+    streamed: Dict[str, Callable[[Path], None]] = field(default_factory=dict)
+
+    def artifacts(self) -> Dict[str, Union[str, bytes]]:
+        out: Dict[str, Union[str, bytes]] = {}
+        out.update(self.tables)
+        out.update(self.columnar)
+        out.update(self.markdown)
+        out.update(self.figures)
+        return out
+
+    def write(self, out_dir: Path = OUT) -> None:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for name, content in self.artifacts().items():
+            if isinstance(content, bytes):
+                (out_dir / name).write_bytes(content)
+            else:
+                _write_text(out_dir / name, content)
+        for write_streamed in self.streamed.values():
+            write_streamed(out_dir)
+
+
+def synthesize(
+    evidence: TableSource,
+    rob: TableSource,
+    manifest: TableSource,
+    locked_question: Optional[str] = None,
+    prisma_flow_text: Optional[str] = None,
+    figures: bool = True,
+    review_id: str = DEFAULT_REVIEW_ID,
+    max_rows_in_memory: Optional[int] = None,
+    out_rel: str = DEFAULT_OUT_REL,
+) -> SynthesisResult:
+    """
+    Build every synthesis artifact in memory, named and labelled `<review_id>_*`.
+
+    Tables may be paths, open text streams or parsed rows. `locked_question` and
+    `prisma_flow_text` default to the protocol files; pass strings to avoid disk reads.
+    Set `figures=False` to skip matplotlib rendering (e.g. in parameter sweeps).
+    `out_rel` is the output directory the reports cite for their own files (relative to ROOT).
+
+    With `max_rows_in_memory` set, the vigilance ledger (`vigilance_rows`, the CSV and its
+    .cols copy) is left out of memory and moved to `streamed`: `write()` produces the CSV with
+    `write_vigilance_outcomes_csv` in sorted runs of that many rows, then encodes the .cols
+    copy from the written file with `write_table_streamed` in chunks of that size. This bounds
+    the ledger only; the input tables themselves are still parsed into memory.
+    """
+    evidence_rows = _load_rows(evidence)
+    rob_rows = _load_rows(rob)
+    # A manifest path is read as snapshot + journal replay; streams and rows are taken as-is.
+    manifest_rows = read_manifest(Path(manifest)) if isinstance(manifest, (str, Path)) else _load_rows(manifest)
+
+    works, stats = build_work_level_map(evidence_rows, rob_rows, manifest_rows, locked_question=locked_question)
+    trajectories = build_durability_trajectories(evidence_rows)
+    stats["vigilance_durability_curves_by_category"] = trajectories["curves"]
+    stats["outcome_timepoint_basis_counts"] = trajectories["timepoint_basis_counts"]
+    vigilance_rows = build_vigilance_rows(works, evidence_rows) if max_rows_in_memory is None else []
+    cube = build_gap_cube(works)
+    gap_rows = build_gap_table(cube.gaps(linked_dims=GAP_LINKED_DIMENSIONS))
+    stats["gap_cube"] = gap_cube_stats(cube, gap_rows)
+
+    vigilance_csv = f"{review_id}_vigilance_outcomes.csv"
+    vigilance_cols = f"{review_id}_vigilance_outcomes.cols"
+    tables = {
+        f"{review_id}_evidence_map_worklevel.csv": render_work_map_csv(works),
+        f"{review_id}_durability_trajectories.csv": render_trajectories_csv(trajectories["trajectories"]),
+        f"{review_id}_gap_table.csv": render_gap_table_csv(gap_rows),
+        f"{review_id}_stats.json": render_json(stats),
+    }
+    columnar = {f"{review_id}_evidence_map_worklevel.cols": encode_table(WORK_MAP_FIELDS, [w.as_csv_row() for w in works])}
+    streamed: Dict[str, Callable[[Path], None]] = {}
+    if max_rows_in_memory is None:
+        tables[vigilance_csv] = render_vigilance_outcomes_csv(vigilance_rows)
+        columnar[vigilance_cols] = encode_table(VIGILANCE_FIELDS, vigilance_rows)
+    else:
+        limit = max_rows_in_memory
+        streamed[vigilance_csv] = lambda d: write_vigilance_outcomes_csv(d / vigilance_csv, works, evidence_rows, limit)
+        # The .cols copy is encoded from the written CSV, re-read per pass, in chunks of `limit` rows.
+        streamed[vigilance_cols] = lambda d: write_table_streamed(
+            d / vigilance_cols, VIGILANCE_FIELDS, lambda: _iter_run(d / vigilance_csv), limit
+        )
 
-    write_work_map_csv(OUT / "S001_evidence_map_worklevel.csv", works)
-    write_vigilance_outcomes_csv(OUT / "S001_vigilance_outcomes.csv", works, evidence_rows)
-    write_json(OUT / "S001_stats.json", stats)
+    results_md, discussion_md = render_results_and_discussion_drafts(
+        works, stats, evidence_rows, review_id=review_id, out_rel=out_rel
+    )
+    markdown = {
+        f"{review_id}_gap_map.md": render_gap_map_md(works, stats, gap_rows, review_id=review_id, out_rel=out_rel),
+        f"{review_id}_manuscript_outline.md": render_manuscript_outline_md(stats, review_id=review_id, out_rel=out_rel),
+        f"{review_id}_figure_captions.md": render_figure_captions_md(stats, review_id=review_id, out_rel=out_rel),
+        f"{review_id}_results_draft.md": results_md,
+        f"{review_id}_discussion_draft.md": discussion_md,
+        f"{review_id}_manuscript_draft.md": render_manuscript_draft_md(
+            stats, results_md, discussion_md, prisma_flow_text, review_id=review_id, out_rel=out_rel
+        ),
+        f"{review_id}_synthesis_report.md": render_report_md(
+            works, stats, evidence_rows, manifest_rows, review_id=review_id, out_rel=out_rel
+        ),
+    }
+
+    return SynthesisResult(
+        works=works,
+        vigilance_rows=vigilance_rows,
+        trajectories=trajectories,
+        stats=stats,
+        tables=tables,
+        markdown=markdown,
+        figures=render_figures(works, evidence_rows, trajectories, cube, review_id=review_id) if figures else {},
+        gap_cube=cube,
+        columnar=columnar,
+        streamed=streamed,
+    )
 
-    build_figures(works, evidence_rows)
-    write_gap_map_md(works, stats)
-    write_manuscript_outline_md(stats)
-    write_figure_captions_md(stats)
-    write_results_and_discussion_drafts(works, stats, evidence_rows)
-    write_manuscript_draft_md(stats)
-    write_report_md(works, stats, evidence_rows, manifest_rows)
 
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Build the synthesis tables, reports and figures.")
+    ap.add_argument(
+        "--max-rows-in-memory",
+        type=int,
+        default=VIGILANCE_SPILL_ROWS,
+        help="vigilance ledger rows held in memory per sorted run / .cols chunk before spilling to disk",
+    )
+    ap.add_argument(
+        "--check-vigilance-stream",
+        action="store_true",
+        help="also verify the streamed vigilance CSV and .cols are byte-identical to the in-memory renders",
+    )
+    args = ap.parse_args(argv)
+    if args.max_rows_in_memory < 1:
+        ap.error("--max-rows-in-memory must be >= 1")
+
+    result = synthesize(EVIDENCE_PATH, ROB_PATH, MANIFEST_PATH, max_rows_in_memory=args.max_rows_in_memory)
+    result.write(OUT)
+    if args.check_vigilance_stream:
+        if not check_vigilance_stream(result.works, _read_csv_dicts(EVIDENCE_PATH), args.max_rows_in_memory):
+            print("vigilance stream check FAILED: streamed CSV/.cols differ from the in-memory render")
+            return 1
+        print("vigilance stream check OK")
     return 0
 
 
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Paper 3 - Full-Text Triage (Cached)
+
+Reads:
+- data/fulltext_processing_manifest.csv  (short_id, title, doi, pdf_status, notes; local `pdf_path` if present)
+- pdfs/<short_id>.pdf                     (local-only corpus; not redistributed)
+
+Writes:
+- .cache/pages/<pdf_sha256_16>.pages      (page text, see page_store.py)
+- data/fulltext_processing_manifest.journal.jsonl (triage fields in `notes`, `last_updated_utc`; changed rows only)
+
+Page text is extracted once per PDF hash on a process pool. Scoring (title match, DOI
+presence, mismatch flag) runs only against cached text, so re-triaging after a rule change
+does not re-parse PDFs.
+
+Triage fields are the `method=...; doi=...; title_match=...` tokens already present in the
+manifest notes. When the text does not look like the record, `pdf_mismatch=suspected` is
+appended (the key curators already use for wrong PDFs; skipped if a row has one). Re-triage
+replaces the whole block, including the `conf=` score of the earlier triage pass, which no
+longer describes the current tokens.
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from manifest_journal import append_updates, maybe_compact, read_manifest
+from page_store import PAGES_DIR, PageStore, sha256_16
+from synthesize_evidence import MANIFEST_PATH, ROOT
+
+
+PDF_DIR = ROOT / "pdfs"
+
+# Title tokens are matched against the first pages only (title block, running headers).
+TITLE_PAGES = 2
+MISMATCH_TITLE_MATCH_MAX = 0.6
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {"the", "and", "for", "with", "from", "into", "over", "under", "among", "between", "during"}
+
+MISMATCH_TOKEN = "pdf_mismatch=suspected"
+_TRIAGE_TOKENS = re.compile(
+    r"(?:conf=[0-9.]+; )?method=[^;|]*; doi=[^;|]*; title_match=[0-9.]+(?:; " + re.escape(MISMATCH_TOKEN) + ")?"
+)
+
+
+@dataclass(frozen=True)
+class TriageScore:
+    short_id: str
+    sha16: str
+    method: str
+    doi_found: bool
+    title_match: float
+    mismatch: bool
+
+    def notes_fragment(self) -> str:
+        frag = f"method={self.method}; doi={'yes' if self.doi_found else 'no'}; title_match={self.title_match:.2f}"
+        return frag + (f"; {MISMATCH_TOKEN}" if self.mismatch else "")
+
+
+def _tokens(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) >= 3 and t not in _STOPWORDS]
+
+
+def _normalize_doi(doi: str) -> str:
+    return re.sub(r"^https?://(dx\.)?doi\.org/", "", doi.strip().lower())
+
+
+def _pdf_path_for(row: Dict[str, str], pdf_dir: Path) -> Path:
+    local = (row.get("pdf_path") or "").strip()
+    if local:
+        p = Path(local)
+        return p if p.is_absolute() else ROOT / p
+    return pdf_dir / f"{row['short_id']}.pdf"
+
+
+def _extract_pages(pdf_path: Path) -> Tuple[List[str], str]:
+    # Local import: only the extraction step needs pypdf; scoring works from the cache alone.
+    from pypdf import PdfReader
+
+    reader = PdfReader(str(pdf_path))
+    pages = [(p.extract_text() or "") for p in reader.pages]
+    method = "pypdf" if any(p.strip() for p in pages) else "pypdf_no_text"
+    return pages, method
+
+
+def _extract_worker(args: Tuple[str, str, Optional[str], str]) -> Tuple[str, str, str, int, int, str]:
+    """Hash (if needed) and extract one PDF into the store. Returns (sid, path, sha16, size, mtime_ns, method)."""
+    sid, path_s, known_sha16, store_root = args
+    pdf_path = Path(path_s)
+    st = pdf_path.stat()
+    sha16 = known_sha16 or sha256_16(pdf_path)
+    store = PageStore(Path(store_root))
+    method = "cached"
+    if not store.has(sha16):
+        pages, method = _extract_pages(pdf_path)
+        store.put(sha16, pages)
+    return sid, path_s, sha16, st.st_size, st.st_mtime_ns, method
+
+
+def extract_corpus(
+    manifest_rows: Sequence[Dict[str, str]],
+    store: PageStore,
+    pdf_dir: Path = PDF_DIR,
+    workers: Optional[int] = None,
+) -> Dict[str, Tuple[str, str]]:
+    """Ensure every downloaded PDF is in the page store. Returns short_id -> (sha16, method)."""
+    index = store.load_index()
+    jobs: List[Tuple[str, str, Optional[str], str]] = []
+    resolved: Dict[str, Tuple[str, str]] = {}
+    for r in manifest_rows:
+        if (r.get("pdf_status") or "").strip() != "downloaded":
+            continue
+        pdf_path = _pdf_path_for(r, pdf_dir)
+        if not pdf_path.exists():
+            continue
+        known = store.indexed_sha16(pdf_path, index)
+        if known and store.has(known):
+            resolved[r["short_id"]] = (known, "cached")
+        else:
+            jobs.append((r["short_id"], str(pdf_path), known, str(store.root)))
+
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for sid, path_s, sha16, size, mtime_ns, method in pool.map(_extract_worker, jobs, chunksize=4):
+                index[path_s] = [size, mtime_ns, sha16]
+                resolved[sid] = (sha16, method)
+        store.save_index(index)
+    return resolved
+
+
+def score_record(row: Dict[str, str], sha16: str, pages: Sequence[str], method: str) -> TriageScore:
+    head = " ".join(pages[:TITLE_PAGES])
+    title_tokens = _tokens(row.get("title") or "")
+    head_tokens = set(_tokens(head))
+    title_match = (sum(1 for t in title_tokens if t in head_tokens) / len(title_tokens)) if title_tokens else 0.0
+
+    doi = _normalize_doi(row.get("doi") or "")
+    doi_found = bool(doi) and doi in " ".join(pages).lower()
+
+    return TriageScore(
+        short_id=row["short_id"],
+        sha16=sha16,
+        method=method,
+        doi_found=doi_found,
+        title_match=title_match,
+        mismatch=title_match < MISMATCH_TITLE_MATCH_MAX and not doi_found,
+    )
+
+
+def _apply_notes(notes: str, frag: str) -> str:
+    if frag.endswith(MISMATCH_TOKEN) and "pdf_mismatch=" in _TRIAGE_TOKENS.sub("", notes):
+        # A curator already recorded the mismatch; keep theirs.
+        frag = frag[: -len(MISMATCH_TOKEN) - 2]
+    if _TRIAGE_TOKENS.search(notes):
+        return _TRIAGE_TOKENS.sub(frag, notes, count=1)
+    return f"{notes}; {frag}" if notes else frag
+
+
+def update_manifest(path: Path, rows: List[Dict[str, str]], scores: Dict[str, TriageScore]) -> int:
+    """Journal new triage tokens for rows whose notes change; returns the number of rows changed."""
+    updates: Dict[str, Dict[str, str]] = {}
+    for r in rows:
+        s = scores.get(r.get("short_id", ""))
+        if not s:
+            continue
+        notes = r.get("notes") or ""
+        new_notes = _apply_notes(notes, s.notes_fragment())
+        if new_notes != notes:
+            updates[r["short_id"]] = {"notes": new_notes}
+    append_updates(path, updates)
+    maybe_compact(path)
+    return len(updates)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Cached full-text triage over the PDF corpus.")
+    ap.add_argument("--manifest", type=Path, default=MANIFEST_PATH)
+    ap.add_argument("--pdf-dir", type=Path, default=PDF_DIR)
+    ap.add_argument("--store", type=Path, default=PAGES_DIR)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--dry-run", action="store_true", help="score and report without rewriting the manifest")
+    args = ap.parse_args(argv)
+
+    rows = read_manifest(args.manifest)
+    store = PageStore(args.store)
+    resolved = extract_corpus(rows, store, pdf_dir=args.pdf_dir, workers=args.workers)
+
+    rows_by_sid = {r["short_id"]: r for r in rows}
+    scores: Dict[str, TriageScore] = {}
+    for sid, (sha16, method) in resolved.items():
+        pages = store.get(sha16) or []
+        if method == "cached":
+            # Keep the extraction method recorded when the text was first cached.
+            m = re.search(r"method=([^;|]*)", rows_by_sid[sid].get("notes") or "")
+            method = m.group(1).strip() if m else "pypdf"
+        scores[sid] = score_record(rows_by_sid[sid], sha16, pages, method)
+
+    n_mismatch = sum(1 for s in scores.values() if s.mismatch)
+    print(f"triaged={len(scores)} parsed={sum(1 for _, m in resolved.values() if m != 'cached')} mismatch={n_mismatch}")
+    if not args.dry_run:
+        print(f"manifest rows updated: {update_manifest(args.manifest, rows, scores)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
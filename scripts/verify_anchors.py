@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Paper 3 - Evidence Anchor Verifier
+
+Reads:
+- data/evidence_table.csv            (anchors, effect_size_reported, n_total, pdf_sha256_16)
+- .cache/pages/<pdf_sha256_16>.pages (page text cache built by triage_fulltext.py)
+- output/synthesis/S001_changes.json (with --changed-only; written by diff_work_map.py)
+
+Writes (under output/qa/):
+- anchor_verification.csv         (one row per evidence row: parsed anchors, numbers found/missing, status)
+- anchor_verification_state.json  (row-hash snapshot the results correspond to)
+
+Anchors such as "Results: PDF p7 Outcomes + PDF p9 Table 3" are parsed into (page range, object)
+references. Numbers quoted in `effect_size_reported` and the leading count in `n_total` must
+appear somewhere on the cited pages for a row to count as verified.
+
+Status codes:
+- verified:       every checked number found on the cited pages
+- partial:        some but not all numbers found
+- unverified:     none found
+- no_page_anchor: anchors do not cite any PDF page (e.g. abstract-only extraction)
+- not_cached:     no page text cached for the row's pdf_sha256_16
+
+With `--changed-only`, only the rows of works listed by `diff_work_map.affected_short_ids()` are
+re-verified; the other works keep their previous results (re-indexed to the current table).
+This is used only when the change report starts from the snapshot the previous verification
+was based on, so no intermediate change is missed; otherwise every row is verified. A changed
+page cache is not tracked: run without `--changed-only` after re-triage.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import re
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from diff_work_map import CHANGES_JSON_PATH, SNAPSHOT_PATH, affected_short_ids, load_snapshot, outcome_row_hashes
+from page_store import PAGES_DIR, PageStore
+from synthesize_evidence import EVIDENCE_PATH, ROOT, _read_csv_dicts
+
+
+QA_OUT = ROOT / "output" / "qa"
+VERIFICATION_PATH = QA_OUT / "anchor_verification.csv"
+
+_PAGE_RE = re.compile(r"PDF\s+p(\d+)(?:\s*-\s*(\d+))?", re.IGNORECASE)
+_OBJECT_RE = re.compile(r"\b(Table|Fig(?:ure)?\.?)\s*(\d+[A-Za-z]?)", re.IGNORECASE)
+_NUMBER_RE = re.compile(r"(?<![\w.])[-−]?(?:\d+(?:\.\d+)?|\.\d+)")
+_N_TOTAL_RE = re.compile(r"^\s*(\d+)")
+
+OUTPUT_FIELDS = [
+    "row_index",
+    "short_id",
+    "pdf_sha256_16",
+    "outcome_measure",
+    "anchor_refs",
+    "pages_checked",
+    "numbers_checked",
+    "numbers_missing",
+    "n_total_found",
+    "status",
+]
+
+
+@dataclass(frozen=True)
+class AnchorRef:
+    first_page: int
+    last_page: int
+    obj: str
+
+    def render(self) -> str:
+        pages = f"p{self.first_page}" if self.first_page == self.last_page else f"p{self.first_page}-{self.last_page}"
+        return f"{pages} {self.obj}".strip()
+
+
+def parse_anchors(anchors: str) -> List[AnchorRef]:
+    """Split an anchors string into per-page references; the object is the nearest Table/Fig label."""
+    refs: List[AnchorRef] = []
+    for segment in re.split(r"[;+]|\.\s+(?=[A-Z])", anchors or ""):
+        pages = list(_PAGE_RE.finditer(segment))
+        if not pages:
+            continue
+        objs = [f"{m.group(1).rstrip('.').title().replace('Figure', 'Fig')} {m.group(2)}" for m in _OBJECT_RE.finditer(segment)]
+        obj = "; ".join(objs)
+        for m in pages:
+            first = int(m.group(1))
+            last = int(m.group(2)) if m.group(2) else first
+            refs.append(AnchorRef(first, max(first, last), obj))
+    return refs
+
+
+def _norm_number(tok: str) -> Optional[str]:
+    tok = tok.replace("−", "-").lstrip("-")
+    try:
+        v = float(tok)
+    except ValueError:
+        return None
+    return repr(v)
+
+
+def significant_numbers(text: str) -> Set[str]:
+    """Numbers worth checking: decimals or integers >= 10 (single digits match almost any page)."""
+    out: Set[str] = set()
+    for m in _NUMBER_RE.finditer(text or ""):
+        tok = m.group(0)
+        bare = tok.replace("−", "-").lstrip("-")
+        if "." not in bare and len(bare) < 2:
+            continue
+        n = _norm_number(tok)
+        if n is not None:
+            out.add(n)
+    return out
+
+
+def _page_numbers(pages: Dict[int, str]) -> Set[str]:
+    out: Set[str] = set()
+    for txt in pages.values():
+        for m in _NUMBER_RE.finditer(txt):
+            n = _norm_number(m.group(0))
+            if n is not None:
+                out.add(n)
+    return out
+
+
+def _verify_group(args: Tuple[str, str, List[Tuple[int, Dict[str, str]]]]) -> List[Dict[str, str]]:
+    """Verify all rows that share one PDF; the page file is mapped once per group."""
+    store_root, sha16, rows = args
+    store = PageStore(Path(store_root))
+    mapped = store.open(sha16) if sha16 else None
+    out: List[Dict[str, str]] = []
+    try:
+        for idx, r in rows:
+            refs = parse_anchors(r.get("anchors") or "")
+            wanted = sorted({p for ref in refs for p in range(ref.first_page, ref.last_page + 1)})
+            res = {
+                "row_index": str(idx),
+                "short_id": (r.get("short_id") or "").strip(),
+                "pdf_sha256_16": sha16,
+                "outcome_measure": (r.get("outcome_measure") or "").strip(),
+                "anchor_refs": "; ".join(ref.render() for ref in refs),
+                "pages_checked": "",
+                "numbers_checked": "",
+                "numbers_missing": "",
+                "n_total_found": "",
+                "status": "",
+            }
+            if not refs:
+                res["status"] = "no_page_anchor"
+            elif mapped is None:
+                res["status"] = "not_cached"
+            else:
+                pages = mapped.pages(wanted)
+                on_page = _page_numbers(pages)
+                nums = significant_numbers(r.get("effect_size_reported") or "")
+                m = _N_TOTAL_RE.match(r.get("n_total") or "")
+                n_total = repr(float(m.group(1))) if m else None
+                missing = sorted(nums - on_page, key=float)
+                n_found = n_total is None or n_total in on_page
+
+                checked = len(nums) + (1 if n_total is not None else 0)
+                found = (len(nums) - len(missing)) + (1 if (n_total is not None and n_found) else 0)
+                res["pages_checked"] = ",".join(str(p) for p in sorted(pages))
+                res["numbers_checked"] = str(checked)
+                res["numbers_missing"] = "; ".join(missing)
+                res["n_total_found"] = "" if n_total is None else ("yes" if n_found else "no")
+                res["status"] = "verified" if found == checked else ("partial" if found else "unverified")
+            out.append(res)
+    finally:
+        if mapped is not None:
+            mapped.close()
+    return out
+
+
+def verify_rows(
+    evidence_rows: Sequence[Dict[str, str]],
+    store: PageStore,
+    workers: Optional[int] = None,
+    only: Optional[Set[int]] = None,
+) -> List[Dict[str, str]]:
+    """Verify every evidence row, or only the row indices in `only`."""
+    groups: Dict[str, List[Tuple[int, Dict[str, str]]]] = defaultdict(list)
+    for idx, r in enumerate(evidence_rows):
+        if only is None or idx in only:
+            groups[(r.get("pdf_sha256_16") or "").strip()].append((idx, r))
+    jobs = [(str(store.root), sha16, rows) for sha16, rows in groups.items()]
+
+    results: List[Dict[str, str]] = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for part in pool.map(_verify_group, jobs):
+            results.extend(part)
+    results.sort(key=lambda r: int(r["row_index"]))
+    return results
+
+
+def carry_over(
+    evidence_rows: Sequence[Dict[str, str]], previous: Sequence[Dict[str, str]], affected: Set[str]
+) -> Tuple[List[Dict[str, str]], Set[int]]:
+    """
+    (previous results reused for unaffected works, row indices that must be verified).
+
+    Rows of an unaffected work are unchanged, so its previous results map onto its current rows
+    in order; a work whose row count or outcome measures no longer line up is re-verified.
+    """
+    prev_by_sid: Dict[str, List[Dict[str, str]]] = defaultdict(list)
+    for r in sorted(previous, key=lambda r: int(r["row_index"])):
+        prev_by_sid[r["short_id"]].append(r)
+    cur_by_sid: Dict[str, List[Tuple[int, Dict[str, str]]]] = defaultdict(list)
+    for idx, r in enumerate(evidence_rows):
+        cur_by_sid[(r.get("short_id") or "").strip()].append((idx, r))
+
+    kept: List[Dict[str, str]] = []
+    todo: Set[int] = set()
+    for sid, cur in cur_by_sid.items():
+        old = prev_by_sid.get(sid, [])
+        same = len(old) == len(cur) and all(
+            o["outcome_measure"] == (r.get("outcome_measure") or "").strip() for o, (_, r) in zip(old, cur)
+        )
+        if sid in affected or not same:
+            todo.update(idx for idx, _ in cur)
+        else:
+            kept.extend({**o, "row_index": str(idx)} for o, (idx, _) in zip(old, cur))
+    return kept, todo
+
+
+def write_verification_csv(path: Path, results: Sequence[Dict[str, str]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=OUTPUT_FIELDS)
+        w.writeheader()
+        w.writerows(results)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Verify evidence anchors against cached PDF page text.")
+    ap.add_argument("--evidence", type=Path, default=EVIDENCE_PATH)
+    ap.add_argument("--store", type=Path, default=PAGES_DIR)
+    ap.add_argument("--out", type=Path, default=VERIFICATION_PATH)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument(
+        "--changed-only",
+        action="store_true",
+        help="re-verify only works changed since the last verification (per diff_work_map.py's change report)",
+    )
+    args = ap.parse_args(argv)
+
+    evidence_rows = _read_csv_dicts(args.evidence)
+    state_path = args.out.with_name(args.out.stem + "_state.json")
+    changes = json.loads(CHANGES_JSON_PATH.read_text(encoding="utf-8")) if CHANGES_JSON_PATH.exists() else None
+    snapshot = load_snapshot(SNAPSHOT_PATH)
+    # The change report is usable only if its end snapshot is the evidence table as it is now.
+    if changes and not (
+        snapshot
+        and snapshot["generated_utc"] == changes["current_snapshot_utc"]
+        and snapshot["outcome_row_hashes"] == outcome_row_hashes(evidence_rows)
+    ):
+        changes = None
+    kept: List[Dict[str, str]] = []
+    only: Optional[Set[int]] = None
+    if args.changed_only:
+        state = json.loads(state_path.read_text(encoding="utf-8")) if state_path.exists() else {}
+        based_on = state.get("row_hashes_utc")
+        if changes and args.out.exists() and based_on and changes["previous_snapshot_utc"] == based_on:
+            kept, only = carry_over(evidence_rows, _read_csv_dicts(args.out), affected_short_ids(changes))
+            print(f"changed-only: re-verifying {len(only)} rows, reusing {len(kept)}")
+        else:
+            print("changed-only: no change report from the last verification to the current table; verifying every row")
+
+    results = verify_rows(evidence_rows, PageStore(args.store), workers=args.workers, only=only)
+    results = sorted(kept + results, key=lambda r: int(r["row_index"]))
+    write_verification_csv(args.out, results)
+    state = {"row_hashes_utc": changes["current_snapshot_utc"] if changes else ""}
+    state_path.write_text(json.dumps(state, indent=2), encoding="utf-8")
+
+    print(f"status: {dict(Counter(r['status'] for r in results))}")
+    for r in results:
+        if r["status"] in {"unverified", "partial"}:
+            print(f"- row {r['row_index']} {r['short_id']} [{r['anchor_refs']}]: {r['status']}; missing {r['numbers_missing'] or '(n_total)'}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())